@@ -6,33 +6,263 @@ import requests
 import time
 import json
 import os
+import asyncio
 import glob
+import hashlib
+import heapq
+import shutil
+import tempfile
 import threading
 import select
 import sys
 import subprocess  # Add this import at the top level
-from datetime import datetime
+import queue
+import random
+import re
+import sqlite3
+import wave
+import atexit
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import asdict, dataclass, replace
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit
 from gradio_client import Client  # For F5TTS
 from playsound3 import playsound   # For playing audio
 
+try:
+    import numpy as np  # For joining audio chunks with crossfades
+except ImportError:
+    np = None
+
 # Global variables for TTS
 FIRSTIME = True
 sound = None
-f5tts_client = "http://127.0.0.1:7860/"  # F5TTS server address
-f5tts_remove_silence = False  # Changed from f5tts_remore_silence and fixed the typo
-f5tts_cross_fade = 0.15  # Updated default value
-f5tts_nfe = 16  # Updated default value
-f5tts_speed = 1.0
-audio_player = "playsound"  # Options: "playsound" or "default_media_player"
 show_checking = False  # Add this line to control visibility of checking process
 monitor_by = "timestamp"  # Options: "id" or "timestamp"
-f5tts_save_audio = "nosave"  # Options: "nosave" or "save"
+f5tts_cache_mb = 500  # Size budget of the synthesized audio cache, 0 disables it
+reference_optimize = True  # Use trimmed mono 24 kHz copies of the reference clips
+reference_max_seconds = 12  # Longest reference clip sent to F5-TTS
+pcm_playback = True  # Play through one long-lived raw PCM player (aplay, paplay, sox) when available
 
 # Variables for TTS timing calculations
-tts_timing_data = []  # List to store character count and processing time pairs
 tts_processed_count = 0  # Counter for number of TTS processes performed
 
 
+class MetricsRegistry:
+    """
+    Counters, gauges and histograms rendered in the Prometheus text format.
+
+    Metrics are declared once with counter(), gauge() or histogram() and
+    updated with inc(), set() and observe(). Gauges can also read their
+    value from a callback when the metrics are rendered.
+    """
+
+    DEFAULT_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 25, 60, 120)
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._metrics = OrderedDict()
+
+    def _declare(self, name, metric_type, help_text, buckets=None, callback=None):
+        with self._lock:
+            if name not in self._metrics:
+                self._metrics[name] = {
+                    'type': metric_type,
+                    'help': help_text,
+                    'buckets': tuple(buckets or self.DEFAULT_BUCKETS),
+                    'callback': callback,
+                    'values': {},
+                }
+            elif callback is not None:
+                self._metrics[name]['callback'] = callback
+
+    def counter(self, name, help_text):
+        """Declare a counter."""
+        self._declare(name, 'counter', help_text)
+
+    def gauge(self, name, help_text, callback=None):
+        """
+        Declare a gauge.
+
+        Args:
+            callback: Optional function returning {labels dict as tuple of pairs: value}
+                or a single number, called on every render
+        """
+        self._declare(name, 'gauge', help_text, callback=callback)
+
+    def histogram(self, name, help_text, buckets=None):
+        """Declare a histogram with the given upper bucket bounds."""
+        self._declare(name, 'histogram', help_text, buckets=buckets)
+
+    def inc(self, name, amount=1, **labels):
+        """Increase a counter."""
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            values = self._metrics[name]['values']
+            values[key] = values.get(key, 0) + amount
+
+    def set(self, name, value, **labels):
+        """Set a gauge."""
+        with self._lock:
+            self._metrics[name]['values'][tuple(sorted(labels.items()))] = value
+
+    def observe(self, name, value, **labels):
+        """Add a sample to a histogram."""
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            metric = self._metrics[name]
+            entry = metric['values'].get(key)
+            if entry is None:
+                entry = metric['values'][key] = {
+                    'buckets': [0] * len(metric['buckets']), 'sum': 0.0, 'count': 0}
+            for idx, bound in enumerate(metric['buckets']):
+                if value <= bound:
+                    entry['buckets'][idx] += 1
+            entry['sum'] += value
+            entry['count'] += 1
+
+    @staticmethod
+    def _format_labels(labels):
+        if not labels:
+            return ""
+        parts = []
+        for key, value in labels:
+            value = str(value).replace('\\', '\\\\').replace(
+                '"', '\\"').replace('\n', '\\n')
+            parts.append(f'{key}="{value}"')
+        return "{" + ",".join(parts) + "}"
+
+    def render(self):
+        """Return all metrics in the Prometheus text exposition format."""
+        lines = []
+        with self._lock:
+            metrics = [(name, dict(metric, values=dict(metric['values'])))
+                       for name, metric in self._metrics.items()]
+        for name, metric in metrics:
+            values = metric['values']
+            if metric['callback'] is not None:
+                try:
+                    result = metric['callback']()
+                    values = result if isinstance(
+                        result, dict) else {(): result}
+                except Exception:
+                    continue
+            lines.append(f"# HELP {name} {metric['help']}")
+            lines.append(f"# TYPE {name} {metric['type']}")
+            for labels, value in values.items():
+                if metric['type'] != 'histogram':
+                    lines.append(
+                        f"{name}{self._format_labels(labels)} {value}")
+                    continue
+                for bound, count in zip(metric['buckets'], value['buckets']):
+                    bucket_labels = labels + (('le', bound),)
+                    lines.append(
+                        f"{name}_bucket{self._format_labels(bucket_labels)} {count}")
+                lines.append(
+                    f"{name}_bucket{self._format_labels(labels + (('le', '+Inf'),))} {value['count']}")
+                lines.append(
+                    f"{name}_sum{self._format_labels(labels)} {value['sum']}")
+                lines.append(
+                    f"{name}_count{self._format_labels(labels)} {value['count']}")
+        return "\n".join(lines) + "\n"
+
+
+class MetricsServer:
+    """Serves a MetricsRegistry at http://host:port/metrics from a background thread."""
+
+    def __init__(self, registry, host="127.0.0.1", port=9477):
+        self.registry = registry
+        self.host = host
+        self.port = port
+        self._server = None
+
+    def start(self):
+        """Start serving. Returns False if the port could not be opened."""
+        registry = self.registry
+
+        class MetricsHandler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split('?')[0] != '/metrics':
+                    self.send_error(404)
+                    return
+                body = registry.render().encode('utf-8')
+                self.send_response(200)
+                self.send_header(
+                    'Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                # Keep scrapes out of the console
+                pass
+
+        try:
+            self._server = ThreadingHTTPServer(
+                (self.host, self.port), MetricsHandler)
+        except OSError as e:
+            print(
+                f"Could not start metrics endpoint on {self.host}:{self.port}: {e}")
+            return False
+        self._server.daemon_threads = True
+        threading.Thread(target=self._server.serve_forever,
+                         daemon=True).start()
+        print(
+            f"Metrics available at http://{self.host}:{self.port}/metrics")
+        return True
+
+    def stop(self):
+        """Stop serving."""
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+
+def chars_bucket(char_count):
+    """Return the character count bucket used as a metrics label."""
+    for bound in (100, 300, 1000, 3000):
+        if char_count <= bound:
+            return f"<={bound}"
+    return ">3000"
+
+
+# Metrics shared by the whole program, served when metrics_port is set
+metrics = MetricsRegistry()
+metrics.histogram('anythingllm_poll_duration_seconds',
+                  'Time to fetch new chats from AnythingLLM')
+metrics.counter('anythingllm_polls_total',
+                'Polls of the AnythingLLM API by result')
+metrics.counter('anythingllm_api_errors_total',
+                'Failed AnythingLLM API requests by reason')
+metrics.counter('anythingllm_chats_processed_total',
+                'New AI responses found, by workspace')
+metrics.histogram('f5tts_synthesis_duration_seconds',
+                  'Duration of /basic_tts requests by backend and character count')
+metrics.counter('f5tts_synthesis_errors_total',
+                'Failed /basic_tts requests by backend')
+metrics.histogram('f5tts_time_to_first_audio_seconds',
+                  'Time from starting a response to the start of its playback')
+metrics.histogram('f5tts_audio_io_duration_seconds',
+                  'Time spent copying and joining audio files by operation',
+                  buckets=(0.001, 0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5))
+metrics.counter('f5tts_playback_starts_total', 'Audio playbacks started')
+metrics.counter('f5tts_playback_stops_total',
+                'Audio playbacks stopped before they finished')
+metrics.counter('f5tts_synthesis_cancelled_total',
+                'Synthesis requests cancelled because a newer reply arrived')
+metrics.counter('f5tts_coalesced_replies_total',
+                'Short replies rendered together with others in one request')
+metrics.counter('anythingllm_responses_dropped_total',
+                'Replies not read out because they were stale or superseded')
+metrics.counter('speech_cleanup_removed_chars_total',
+                'Characters removed from replies before synthesis')
+metrics.counter('f5tts_audio_cache_lookups_total',
+                'Audio cache lookups by result')
+
+
 def handle_file(file_path):
     """Helper function to handle file paths for TTS."""
     # Format the file data as expected by Gradio
@@ -43,6 +273,441 @@ def handle_file(file_path):
     }
 
 
+_FENCED_CODE_RE = re.compile(r'^[ \t]*(```|~~~)[ \t]*([\w+#.-]*)[^\n]*\n.*?(?:^[ \t]*\1[ \t]*$|\Z)',
+                             re.MULTILINE | re.DOTALL)
+_TABLE_RE = re.compile(r'(?:^[ \t]*\|.*\|[ \t]*(?:\n|$))+', re.MULTILINE)
+# Sentence punctuation right after a URL stays in the text
+_URL_RE = re.compile(r'\b(?:https?://|www\.)[^\s<>()\[\]]*[^\s<>()\[\].,;:!?\'"]', re.IGNORECASE)
+_CITATION_RE = re.compile(
+    r'\[\^?\d+(?:\s*[,-]\s*\d+)*\]|【[^】]*】|\[(?:source|citation|context)[^\]]*\]', re.IGNORECASE)
+
+
+def clean_text_for_speech(text, code_blocks="summarize"):
+    """
+    Turn an LLM reply into plain text that is worth speaking.
+
+    Removes or summarizes fenced code blocks and tables, drops URLs and
+    citation markers, flattens markdown (headers, lists, emphasis, links,
+    quotes) and collapses repeated punctuation, symbols, lines and whitespace.
+
+    Args:
+        text (str): The reply as returned by AnythingLLM
+        code_blocks (str): "summarize" replaces code and tables with a short
+            sentence, "remove" drops them
+
+    Returns:
+        str: Text to send to F5-TTS
+    """
+    summarize = code_blocks == "summarize"
+
+    def code_sentence(match):
+        if not summarize:
+            return "\n"
+        language = match.group(2).strip('.').lower()
+        return f"\nHere is a {language} code example.\n" if language else "\nHere is a code example.\n"
+
+    def table_sentence(match):
+        if not summarize:
+            return "\n"
+        rows = [line for line in match.group(0).splitlines()
+                if line.strip() and not re.fullmatch(r'[\s|:-]+', line)]
+        # The first row is the header
+        return f"\nHere is a table with {max(0, len(rows) - 1)} rows.\n"
+
+    text = text.replace('\r\n', '\n')
+    text = _FENCED_CODE_RE.sub(code_sentence, text)
+    text = _TABLE_RE.sub(table_sentence, text)
+    text = re.sub(r'<[^>\n]+>', ' ', text)  # HTML tags such as <br>
+    # Images and links keep their text, reference style link definitions go
+    text = re.sub(r'!\[([^\]]*)\]\([^)]*\)', r'\1', text)
+    text = re.sub(r'\[([^\]]+)\]\([^)]*\)', r'\1', text)
+    text = re.sub(r'^[ \t]*\[[^\]]+\]:[ \t]*\S+.*$', '', text, flags=re.MULTILINE)
+    text = _URL_RE.sub('', text)
+    text = _CITATION_RE.sub('', text)
+    # Short inline code is read out, long inline code is dropped
+    text = re.sub(r'`([^`\n]*)`',
+                  lambda m: m.group(1) if len(m.group(1)) <= 40 else '', text)
+
+    lines = []
+    for line in text.split('\n'):
+        line = line.strip()
+        if re.fullmatch(r'([-*_=])(\s*\1){2,}', line):
+            continue  # Horizontal rule
+        line = re.sub(r'^(?:>\s*)+', '', line)
+        heading = re.match(r'^#{1,6}\s+', line)
+        item = re.match(r'^(?:[-*+\u2022]|\d+[.)])\s+', line)
+        if heading or item:
+            line = line[(heading or item).end():]
+        line = re.sub(r'(\*\*|~~)(.+?)\1', r'\2', line)
+        line = re.sub(r'(?<!\w)(\*)(?!\s)(.+?)(?<!\s)\1(?!\w)', r'\2', line)
+        # Underscores only mark emphasis around whole words, __init__.py and snake_case stay
+        line = re.sub(r'(?<![^\s(\["\'])(__?)(?![\s_])(.+?)(?<![\s_])\1(?=[^\w\s]*(?:\s|$))', r'\2', line)
+        line = line.strip()
+        if not line:
+            continue
+        # Headers and list items get a pause after them
+        if (heading or item) and line[-1] not in '.!?:;,':
+            line += '.'
+        if lines and line == lines[-1]:
+            continue  # Repeated line
+        lines.append(line)
+    text = ' '.join(lines)
+
+    text = re.sub(r'([!?])\1+', r'\1', text)
+    text = re.sub(r'\.{4,}', '...', text)
+    text = re.sub(r'([^\w\s.!?])\1{2,}', '', text)  # Runs of symbols like ==== or ****
+    text = re.sub(r'\b(\w+)(?:\s+\1\b){2,}', r'\1', text, flags=re.IGNORECASE)  # "very very very"
+    text = re.sub(r'\s+([,.!?;:])', r'\1', text)
+    text = re.sub(r'\(\s*\)', '', text)
+    text = re.sub(r'\s{2,}', ' ', text)
+    return text.strip()
+
+
+def _split_long_text(text, max_chars):
+    """
+    Split a single sentence at clause boundaries, then at word boundaries.
+
+    Returns:
+        list: (piece, separator) pairs, the separator joins a piece to the one
+            before it: a space, or nothing where a word without spaces (a URL,
+            a hash) had to be cut
+    """
+    if len(text) <= max_chars:
+        return [(text, " ")]
+
+    pieces = []
+    remaining = text
+    separator = " "
+    while len(remaining) > max_chars:
+        window = remaining[:max_chars + 1]
+        # Prefer the last clause boundary, fall back to the last space
+        cut = -1
+        for match in re.finditer(r'[,;:\u2013\u2014)]\s', window):
+            cut = match.end()
+        if cut < max_chars // 3:
+            cut = window.rfind(' ') + 1
+        inside_word = cut <= 0
+        if inside_word:
+            cut = max_chars
+        pieces.append((remaining[:cut].strip(), separator))
+        separator = "" if inside_word else " "
+        remaining = remaining[cut:].strip()
+    if remaining:
+        pieces.append((remaining, separator))
+    return pieces
+
+
+def split_text_for_streaming(text, first_chunk_chars=120, chunk_chars=300, min_chunk_chars=20):
+    """
+    Split a reply into sentence/clause chunks for streaming synthesis.
+
+    The first chunk is kept short so audio can start quickly, the following
+    chunks are packed with whole sentences up to chunk_chars.
+
+    Args:
+        text (str): Text to split
+        first_chunk_chars (int): Maximum length of the first chunk
+        chunk_chars (int): Maximum length of the following chunks
+        min_chunk_chars (int): Chunks shorter than this are merged with the next one
+
+    Returns:
+        list: Text chunks in speaking order
+    """
+    sentences = [s.strip() for s in re.split(
+        r'(?<=[.!?\u2026])\s+|\n+', text) if s and s.strip()]
+
+    chunks = []
+    current, current_separator = "", " "
+    for sentence in sentences:
+        limit = first_chunk_chars if not chunks else chunk_chars
+        for piece, separator in _split_long_text(sentence, limit):
+            limit = first_chunk_chars if not chunks else chunk_chars
+            if not current:
+                current, current_separator = piece, separator
+            elif len(current) < min_chunk_chars or len(current) + len(separator) + len(piece) <= limit:
+                current = f"{current}{separator}{piece}"
+            else:
+                chunks.append(current)
+                current, current_separator = piece, separator
+            # Emit the first chunk as soon as it holds a full sentence
+            if not chunks and len(current) >= min_chunk_chars:
+                chunks.append(current)
+                current = ""
+    if current:
+        if chunks and len(current) < min_chunk_chars:
+            chunks[-1] = f"{chunks[-1]}{current_separator}{current}"
+        else:
+            chunks.append(current)
+    return chunks
+
+
+class SentenceAssembler:
+    """
+    Collects text that arrives token by token and hands out chunks as soon as their sentences are complete.
+
+    Text after an unclosed code fence is held back until the fence closes, so
+    speech cleanup always sees whole code blocks.
+    """
+
+    BOUNDARY = re.compile(r'[.!?\u2026](?=\s)|\n')
+
+    def __init__(self, first_chunk_chars=120, chunk_chars=300, min_chunk_chars=20, clean=None):
+        """
+        Args:
+            first_chunk_chars (int): Maximum length of the first chunk
+            chunk_chars (int): Maximum length of the following chunks
+            min_chunk_chars (int): Text shorter than this waits for the next sentence
+            clean (callable): Applied to complete text before it is split, e.g. speech cleanup
+        """
+        self.first_chunk_chars = first_chunk_chars
+        self.chunk_chars = chunk_chars
+        self.min_chunk_chars = min_chunk_chars
+        self.clean = clean
+        self.buffer = ""
+        self.text = ""  # Everything fed so far
+        self.chunk_count = 0
+
+    def feed(self, text):
+        """Add streamed text and return the chunks that are now complete."""
+        self.buffer += text
+        self.text += text
+
+        limit = len(self.buffer)
+        if self.buffer.count('```') % 2:
+            limit = self.buffer.rfind('```')
+        end = 0
+        for match in self.BOUNDARY.finditer(self.buffer, 0, limit):
+            end = match.end()
+        if end and len(self.buffer[:end].strip()) >= self.min_chunk_chars:
+            ready, self.buffer = self.buffer[:end], self.buffer[end:]
+            return self._chunks(ready)
+
+        # A very long sentence is cut at a clause boundary instead of waiting for its end
+        max_chars = self.first_chunk_chars if not self.chunk_count else self.chunk_chars
+        if limit == len(self.buffer) and len(self.buffer) > max_chars * 2:
+            pieces = _split_long_text(self.buffer.strip(), max_chars)
+            # The unfinished piece stays as it arrived: trailing space separates it from the next delta
+            end = len(self.buffer.rstrip())
+            self.buffer = self.buffer[end - len(pieces[-1][0]):]
+            ready = pieces[0][0] + "".join(separator + piece for piece, separator in pieces[1:-1])
+            return self._chunks(ready)
+        return []
+
+    def flush(self):
+        """Return the chunks of whatever is left once the stream has ended."""
+        ready, self.buffer = self.buffer, ""
+        return self._chunks(ready)
+
+    def _chunks(self, text):
+        if self.clean is not None:
+            text = self.clean(text)
+        if not text.strip():
+            return []
+        first_chunk_chars = self.first_chunk_chars if not self.chunk_count else self.chunk_chars
+        chunks = split_text_for_streaming(
+            text, first_chunk_chars, self.chunk_chars, self.min_chunk_chars)
+        self.chunk_count += len(chunks)
+        return chunks
+
+
+def _wav_data_chunk(path):
+    """Return (offset, size) of the sample data in a WAV file."""
+    with open(path, 'rb') as f:
+        header = f.read(12)
+        if header[:4] != b'RIFF' or header[8:12] != b'WAVE':
+            raise ValueError(f"{path} is not a WAV file")
+        offset = 12
+        while True:
+            chunk_header = f.read(8)
+            if len(chunk_header) < 8:
+                raise ValueError(f"{path} has no data chunk")
+            chunk_id = chunk_header[:4]
+            chunk_size = int.from_bytes(chunk_header[4:], 'little')
+            if chunk_id == b'data':
+                return offset + 8, chunk_size
+            # Chunks are padded to an even size
+            offset += 8 + chunk_size + (chunk_size & 1)
+            f.seek(offset)
+
+
+def _read_wav_float(path):
+    """
+    Read a PCM WAV file into a float32 array of shape (frames, channels) in [-1, 1].
+
+    The samples are memory-mapped rather than copied into Python objects.
+
+    Returns:
+        tuple: (samples, sample_rate, sample_width)
+    """
+    with wave.open(path, 'rb') as wav_file:
+        channels = wav_file.getnchannels()
+        width = wav_file.getsampwidth()
+        sample_rate = wav_file.getframerate()
+        frames = wav_file.getnframes()
+    offset, size = _wav_data_chunk(path)
+    size = min(size, frames * channels * width)
+    if size == 0:
+        return np.zeros((0, channels), dtype=np.float32), sample_rate, width
+
+    raw = np.memmap(path, dtype=np.uint8, mode='r', offset=offset, shape=(size,))
+    if width == 1:
+        samples = (raw.astype(np.float32) - 128.0) / 128.0
+    elif width == 2:
+        samples = raw.view('<i2').astype(np.float32) / 32768.0
+    elif width == 3:
+        # Sign-extend little-endian 24-bit samples into int32
+        triplets = raw[:size - size % 3].reshape(-1, 3).astype(np.int32)
+        values = triplets[:, 0] | (triplets[:, 1] << 8) | (triplets[:, 2] << 16)
+        samples = np.where(values >= 1 << 23, values - (1 << 24), values).astype(np.float32) / 8388608.0
+    elif width == 4:
+        samples = raw.view('<i4').astype(np.float32) / 2147483648.0
+    else:
+        raise ValueError(f"unsupported WAV sample width {width}")
+    return samples.reshape(-1, channels), sample_rate, width
+
+
+def _write_wav_float(path, samples, sample_rate, width=2):
+    """Write a float array of shape (frames, channels) as a PCM WAV file in one go."""
+    clipped = np.clip(samples, -1.0, 1.0)
+    if width == 1:
+        data = (clipped * 127.0 + 128.0).astype(np.uint8)
+    elif width == 4:
+        data = (clipped * 2147483647.0).astype('<i4')
+    else:
+        width = 2
+        data = (clipped * 32767.0).astype('<i2')
+    with wave.open(path, 'wb') as out:
+        out.setnchannels(samples.shape[1])
+        out.setsampwidth(width)
+        out.setframerate(sample_rate)
+        out.writeframes(data.tobytes())
+
+
+def join_wav_files(wav_paths, output_path, cross_fade=0.0, target_dbfs=-20.0):
+    """
+    Join WAV files with identical format into one WAV file.
+
+    With NumPy the parts are memory-mapped, overlapped with equal-power
+    crossfades of cross_fade seconds and normalized to target_dbfs RMS
+    (never above -0.1 dBFS peak), then written once. Without NumPy the
+    frames are simply concatenated.
+
+    Args:
+        wav_paths (list): Paths of the WAV files in playback order
+        output_path (str): Path of the joined file
+        cross_fade (float): Seconds each part overlaps the previous one
+        target_dbfs (float): Loudness of the result, None keeps the level
+
+    Returns:
+        str: output_path
+    """
+    if np is not None:
+        return _join_wav_files_numpy(wav_paths, output_path, cross_fade, target_dbfs)
+
+    with wave.open(output_path, 'wb') as out:
+        for idx, path in enumerate(wav_paths):
+            with wave.open(path, 'rb') as part:
+                if idx == 0:
+                    out.setparams(part.getparams())
+                out.writeframes(part.readframes(part.getnframes()))
+    return output_path
+
+
+def _join_wav_files_numpy(wav_paths, output_path, cross_fade, target_dbfs):
+    parts = [_read_wav_float(path) for path in wav_paths]
+    sample_rate, width = parts[0][1], parts[0][2]
+    if any(part[1] != sample_rate or part[0].shape[1] != parts[0][0].shape[1] for part in parts):
+        raise ValueError("WAV files to join have different formats")
+    parts = [part[0] for part in parts]
+
+    # Overlap of each part with the one before it
+    fade_frames = int(float(cross_fade or 0) * sample_rate)
+    overlaps = [0] + [min(fade_frames, len(previous), len(part))
+                      for previous, part in zip(parts, parts[1:])]
+    out = np.zeros((sum(len(part) for part in parts) - sum(overlaps), parts[0].shape[1]),
+                   dtype=np.float32)
+
+    position = 0
+    for part, overlap in zip(parts, overlaps):
+        start = position - overlap
+        if overlap:
+            ramp = np.linspace(0.0, np.pi / 2, overlap, dtype=np.float32)[:, None]
+            out[start:position] *= np.cos(ramp)
+            out[start:position] += part[:overlap] * np.sin(ramp)
+        out[position:start + len(part)] = part[overlap:]
+        position = start + len(part)
+
+    if target_dbfs is not None and len(out):
+        rms = float(np.sqrt(np.mean(np.square(out, dtype=np.float64))))
+        peak = float(np.max(np.abs(out)))
+        if rms > 0:
+            gain = min(10 ** (target_dbfs / 20.0) / rms, 10 ** (-0.1 / 20.0) / peak)
+            out *= gain
+
+    _write_wav_float(output_path, out, sample_rate, width if width in (1, 2, 4) else 2)
+    return output_path
+
+
+def split_wav_at_pauses(wav_path, weights, output_paths, window_seconds=0.02):
+    """
+    Cut a WAV file into parts at the pauses closest to where each part should end.
+
+    Used to split audio rendered for several texts in one request. The
+    expected end of each part is its share of weights (text lengths) of the
+    whole file; around it the longest run of quiet windows is searched and
+    the cut goes in its middle. If there is no pause, the quietest window is
+    used. Needs NumPy.
+
+    Args:
+        wav_path (str): The audio of all parts
+        weights (list): Relative length of every part, e.g. its character count
+        output_paths (list): Path for every part
+        window_seconds (float): Length of the windows the loudness is measured in
+
+    Returns:
+        list: output_paths
+    """
+    samples, sample_rate, width = _read_wav_float(wav_path)
+    window = max(1, int(sample_rate * window_seconds))
+    windows = len(samples) // window
+    if windows < len(weights):
+        raise ValueError(f"{wav_path} is too short to split into {len(weights)} parts")
+    loudness = np.sqrt(np.mean(np.square(
+        samples[:windows * window].mean(axis=1).reshape(windows, window)), axis=1))
+    quiet = loudness < max(float(np.percentile(loudness, 90)) * 0.1, 1e-4)
+
+    total = float(sum(weights))
+    ends = np.cumsum(weights)[:-1] / total * windows
+    cuts = [0]
+    for index, expected in enumerate(ends):
+        # Look no further than half of the shorter neighbouring part
+        reach = max(1, int(min(weights[index], weights[index + 1]) / total * windows / 2))
+        low = max(cuts[-1] + 1, int(expected) - reach)
+        high = min(windows - (len(ends) - index), int(expected) + reach)
+        best = None  # (length, -distance, middle) of the best pause so far
+        run_start = None
+        for position in range(low, high + 2):
+            if position <= high and quiet[position]:
+                if run_start is None:
+                    run_start = position
+                continue
+            if run_start is not None:
+                middle = (run_start + position) // 2
+                candidate = (position - run_start, -abs(middle - expected), middle)
+                if best is None or candidate > best:
+                    best = candidate
+                run_start = None
+        if best is not None:
+            cuts.append(best[2])
+        else:
+            cuts.append(low + int(np.argmin(loudness[low:high + 1])) if high >= low else low)
+    cuts = [cut * window for cut in cuts] + [len(samples)]
+
+    for start, end, path in zip(cuts, cuts[1:], output_paths):
+        _write_wav_float(path, samples[start:end], sample_rate, width if width in (1, 2, 4) else 2)
+    return output_paths
+
+
 def get_reference_audio_path():
     """Get the path to the reference audio directory based on OS."""
     # First, try to use a subdirectory of the current working directory
@@ -62,14 +727,344 @@ def get_reference_audio_path():
     return program_ref_dir
 
 
+class ReferenceRegistry:
+    """
+    Index of reference clips by path, mtime and content hash.
+
+    Directory listings, reference texts and file hashes are only read again
+    when the directory or file changes. Each clip is uploaded to an F5-TTS
+    server once; the returned server-side file is reused for every request
+    until the clip changes or the server connection is rebuilt.
+    """
+
+    AUDIO_EXTENSIONS = ['.wav', '.mp3', '.ogg', '.flac']
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._listings = {}  # directory -> (mtime, audio files)
+        self._texts = {}  # text path -> (mtime, size, text)
+        self._hashes = {}  # audio path -> (mtime, size, hash of the file contents)
+        self._uploads = {}  # (server url, content hash) -> server-side file data
+        self.upload_count = 0
+        self.reuse_count = 0
+
+    def list_audio_files(self, ref_dir):
+        """Return the audio files in a directory, listing it again only when it changed."""
+        try:
+            mtime = os.stat(ref_dir).st_mtime
+        except OSError:
+            return []
+        with self._lock:
+            cached = self._listings.get(ref_dir)
+            if cached and cached[0] == mtime:
+                return list(cached[1])
+        audio_files = []
+        for ext in self.AUDIO_EXTENSIONS:
+            audio_files.extend(glob.glob(os.path.join(ref_dir, f"*{ext}")))
+        with self._lock:
+            self._listings[ref_dir] = (mtime, audio_files)
+        return list(audio_files)
+
+    def read_text(self, text_path):
+        """Return the stripped contents of a reference text file, read again only when it changed."""
+        stat = os.stat(text_path)
+        with self._lock:
+            cached = self._texts.get(text_path)
+            if cached and cached[:2] == (stat.st_mtime, stat.st_size):
+                return cached[2]
+        with open(text_path, 'r', encoding='utf-8') as f:
+            text_content = f.read().strip()
+        with self._lock:
+            self._texts[text_path] = (stat.st_mtime, stat.st_size, text_content)
+        return text_content
+
+    def content_hash(self, audio_path):
+        """Return the SHA-256 of a reference clip, hashed again only when it changed."""
+        stat = os.stat(audio_path)
+        with self._lock:
+            cached = self._hashes.get(audio_path)
+            if cached and cached[:2] == (stat.st_mtime, stat.st_size):
+                return cached[2]
+        digest = hashlib.sha256()
+        with open(audio_path, 'rb') as f:
+            for block in iter(lambda: f.read(1024 * 1024), b''):
+                digest.update(block)
+        file_hash = digest.hexdigest()
+        with self._lock:
+            self._hashes[audio_path] = (stat.st_mtime, stat.st_size, file_hash)
+        return file_hash
+
+    def server_file(self, url, client, audio_path):
+        """
+        Return file data that points at a copy of the clip on the F5-TTS server.
+
+        The clip is uploaded the first time and whenever its contents change.
+        The returned dict has no FileData meta, so gradio_client passes it on
+        as it is instead of uploading the file again.
+
+        Args:
+            url (str): Server address, uploads are remembered per server
+            client: The gradio Client connected to that server
+            audio_path (str): Local reference clip
+
+        Returns:
+            dict: {"path": server path, "orig_name": file name}
+        """
+        key = (url, self.content_hash(audio_path))
+        with self._lock:
+            server_file = self._uploads.get(key)
+            if server_file is not None:
+                self.reuse_count += 1
+                return server_file
+
+        with open(audio_path, 'rb') as f:
+            response = requests.post(
+                client.upload_url, headers=getattr(client, 'headers', None),
+                files=[('files', (os.path.basename(audio_path), f))], timeout=60)
+        response.raise_for_status()
+        server_file = {"path": response.json()[0],
+                       "orig_name": os.path.basename(audio_path)}
+        with self._lock:
+            self._uploads[key] = server_file
+            self.upload_count += 1
+        print(f"Uploaded reference audio {os.path.basename(audio_path)} to {url}")
+        return server_file
+
+    def is_server_file(self, path):
+        """Check if a path is a server-side copy of a clip this registry uploaded."""
+        with self._lock:
+            return any(upload['path'] == path for upload in self._uploads.values())
+
+    def forget_server(self, url):
+        """
+        Forget the uploads to a server, e.g. after it restarted.
+
+        Returns:
+            bool: True if there was anything to forget
+        """
+        with self._lock:
+            keys = [key for key in self._uploads if key[0] == url]
+            for key in keys:
+                del self._uploads[key]
+        return bool(keys)
+
+
+# Shared by the reference menu, the audio cache and every F5-TTS connection
+reference_registry = ReferenceRegistry()
+
+REFERENCE_SAMPLE_RATE = 24000  # Sample rate of the F5-TTS model
+
+
+def _decode_audio_mono(audio_path):
+    """
+    Decode an audio file to mono 16-bit samples.
+
+    Uses ffmpeg when it is installed, otherwise only PCM WAV files can be read.
+
+    Returns:
+        tuple: (NumPy int16 array of samples, sample rate)
+    """
+    if shutil.which('ffmpeg'):
+        result = subprocess.run(
+            ['ffmpeg', '-v', 'error', '-i', audio_path, '-ac', '1',
+             '-ar', str(REFERENCE_SAMPLE_RATE), '-f', 's16le', '-'],
+            capture_output=True, check=True)
+        return np.frombuffer(result.stdout, dtype='<i2').astype(np.int16), REFERENCE_SAMPLE_RATE
+
+    if not audio_path.lower().endswith('.wav'):
+        raise ValueError("ffmpeg is needed to read this format")
+    with wave.open(audio_path, 'rb') as wav_file:
+        channels = wav_file.getnchannels()
+        width = wav_file.getsampwidth()
+        sample_rate = wav_file.getframerate()
+        data = wav_file.readframes(wav_file.getnframes())
+
+    # Convert every sample width to signed 16 bit
+    if width == 1:
+        values = (np.frombuffer(data, dtype=np.uint8).astype(np.int32) - 128) << 8
+    elif width == 2:
+        values = np.frombuffer(data, dtype='<i2').astype(np.int32)
+    elif width == 3:
+        raw = np.frombuffer(data[:len(data) - len(data) % 3], dtype=np.uint8).reshape(-1, 3).astype(np.int32)
+        # The top two bytes hold the 16 most significant bits
+        values = (raw[:, 1] | (raw[:, 2] << 8)) - ((raw[:, 2] & 0x80) << 9)
+    elif width == 4:
+        values = np.frombuffer(data, dtype='<i4') >> 16
+    else:
+        raise ValueError(f"unsupported WAV sample width {width}")
+
+    if channels > 1:
+        values = values[:len(values) - len(values) % channels].reshape(-1, channels).mean(axis=1)
+    return values.astype(np.int16), sample_rate
+
+
+def _resample(samples, from_rate, to_rate):
+    """
+    Resample with linear interpolation, good enough for a voice reference.
+
+    Before downsampling a windowed-sinc low-pass removes everything above the
+    new Nyquist frequency, so it does not fold back as aliasing.
+    """
+    if from_rate == to_rate or not len(samples):
+        return samples
+    signal = samples.astype(np.float64)
+    if to_rate < from_rate:
+        cutoff = 0.5 * to_rate / from_rate * 0.9  # In cycles per input sample, a little below Nyquist
+        half = int(8 * from_rate / to_rate)
+        taps = np.arange(-half, half + 1)
+        kernel = 2 * cutoff * np.sinc(2 * cutoff * taps) * np.blackman(len(taps))
+        signal = np.convolve(signal, kernel / kernel.sum(), mode='same')
+    out_length = int(len(samples) * to_rate / from_rate)
+    positions = np.arange(out_length) * (from_rate / to_rate)
+    out = np.interp(positions, np.arange(len(signal)), signal)
+    return np.clip(np.round(out), -32768, 32767).astype(np.int16)
+
+
+def _find_pauses(samples, sample_rate, min_seconds=0.25, window_seconds=0.02):
+    """
+    Find the pauses in speech.
+
+    A pause is a run of windows at least 20 dB quieter than the loud parts
+    of the clip, lasting at least min_seconds.
+
+    Returns:
+        tuple: (list of (start, end) sample indexes of the pauses,
+            (start, end) sample indexes of the speech as a whole)
+    """
+    window = max(1, int(sample_rate * window_seconds))
+    count = len(samples) // window
+    if not count:
+        return [], (0, len(samples))
+    frames = samples[:count * window].astype(np.float64).reshape(count, window)
+    rms = np.sqrt((frames ** 2).mean(axis=1))
+    quiet = rms < max(np.percentile(rms, 90) * 0.1, 1.0)
+
+    voiced = np.flatnonzero(~quiet)
+    if not len(voiced):
+        return [], (0, len(samples))
+    speech = (voiced[0] * window, (voiced[-1] + 1) * window)
+
+    # Runs of quiet windows between the first and last voiced window
+    edges = np.diff(np.concatenate(([0], quiet[voiced[0]:voiced[-1] + 1].astype(np.int8), [0])))
+    starts, ends = np.flatnonzero(edges == 1), np.flatnonzero(edges == -1)
+    min_windows = max(1, int(min_seconds / window_seconds))
+    pauses = [((voiced[0] + start) * window, (voiced[0] + end) * window)
+              for start, end in zip(starts, ends) if end - start >= min_windows]
+    return pauses, speech
+
+
+def _sentence_cut(samples, sample_rate, text, max_seconds):
+    """
+    Find where a clip can be cut at the end of a sentence.
+
+    The time each sentence ends is estimated from its share of the
+    transcript. A sentence end only counts when a pause in the audio lies
+    close to that estimate, so audio and text stay in step.
+
+    Returns:
+        tuple: (sample index to cut at, transcript up to there), or None
+            when no sentence end within max_seconds lines up with a pause
+    """
+    pauses, (speech_start, speech_end) = _find_pauses(samples, sample_rate)
+    middles = [(start + end) // 2 for start, end in pauses]
+    limit = max_seconds * sample_rate
+    text = text.strip()
+    # The last sentence end is the end of the clip, cutting there trims nothing
+    sentence_ends = [m.end() for m in re.finditer(r'[.!?](?=\s)', text)]
+    for end in reversed(sentence_ends):
+        estimate = speech_start + (speech_end - speech_start) * end / len(text)
+        tolerance = max(0.75 * sample_rate, 0.12 * (estimate - speech_start))
+        # Too short a reference does not carry the voice
+        close = [middle for middle in middles
+                 if abs(middle - estimate) <= tolerance and limit / 3 <= middle <= limit]
+        if close:
+            return min(close, key=lambda middle: abs(middle - estimate)), text[:end]
+    return None
+
+
+def optimize_reference_clip(audio_path, text_content, max_seconds=12):
+    """
+    Make a reference clip that F5-TTS can use without further processing.
+
+    The clip is converted to mono 16-bit WAV at the model rate. A clip longer
+    than max_seconds is cut in a pause at the end of a sentence, together
+    with its transcript (see _sentence_cut). When no sentence end lines up
+    with a pause the whole clip and transcript are kept, since text that
+    does not match the audio hurts F5-TTS more than a long reference.
+    Results are cached by the hash of the source clip, so this only runs
+    again when the clip changes. Needs NumPy.
+
+    Args:
+        audio_path (str): Reference clip in any format ffmpeg can read (only WAV without ffmpeg)
+        text_content (str): Transcript of the clip
+        max_seconds (float): Longest clip to keep
+
+    Returns:
+        dict: {'audio_path', 'text_content'} of the optimized clip, or None
+            when the original is already fine or could not be converted
+    """
+    if np is None:
+        return None
+    try:
+        with wave.open(audio_path, 'rb') as wav_file:
+            already_fine = (wav_file.getnchannels() == 1 and wav_file.getsampwidth() == 2
+                            and wav_file.getframerate() == REFERENCE_SAMPLE_RATE
+                            and wav_file.getnframes() <= max_seconds * REFERENCE_SAMPLE_RATE)
+        if already_fine:
+            return None
+    except (wave.Error, EOFError, OSError):
+        pass  # Not a PCM WAV file
+
+    try:
+        # "sentences" tells these copies from the ones cut by transcript length
+        parts = [reference_registry.content_hash(audio_path), text_content,
+                 float(max_seconds), REFERENCE_SAMPLE_RATE, "sentences"]
+        key = hashlib.sha256(json.dumps(parts).encode('utf-8')).hexdigest()[:16]
+        out_dir = os.path.join(get_app_directory("anythingllm"), "references")
+        os.makedirs(out_dir, exist_ok=True)
+        base_name = os.path.splitext(os.path.basename(audio_path))[0]
+        out_audio = os.path.join(out_dir, f"{base_name}_{key}.wav")
+        out_text = os.path.join(out_dir, f"{base_name}_{key}.txt")
+        if os.path.exists(out_audio) and os.path.exists(out_text):
+            return {'audio_path': out_audio,
+                    'text_content': reference_registry.read_text(out_text)}
+
+        start_time = time.time()
+        samples, sample_rate = _decode_audio_mono(audio_path)
+        duration = len(samples) / float(sample_rate)
+        trimmed_text = text_content
+        if duration > max_seconds:
+            cut = _sentence_cut(samples, sample_rate, text_content, max_seconds)
+            if cut is None:
+                print(f"No sentence end of {os.path.basename(audio_path)} lines up with a pause "
+                      f"before {max_seconds} seconds, keeping the whole clip.")
+            else:
+                samples, trimmed_text = samples[:cut[0]], cut[1]
+        samples = _resample(samples, sample_rate, REFERENCE_SAMPLE_RATE)
+
+        with wave.open(out_audio + ".tmp", 'wb') as wav_file:
+            wav_file.setnchannels(1)
+            wav_file.setsampwidth(2)
+            wav_file.setframerate(REFERENCE_SAMPLE_RATE)
+            wav_file.writeframes(samples.astype('<i2').tobytes())
+        os.replace(out_audio + ".tmp", out_audio)
+        atomic_write_text(out_text, trimmed_text)
+
+        print(f"Optimized reference {os.path.basename(audio_path)}: {duration:.1f}s -> "
+              f"{len(samples) / float(REFERENCE_SAMPLE_RATE):.1f}s mono {REFERENCE_SAMPLE_RATE} Hz "
+              f"in {time.time() - start_time:.1f} seconds")
+        return {'audio_path': out_audio, 'text_content': trimmed_text}
+    except Exception as e:
+        print(f"Could not optimize reference {os.path.basename(audio_path)}, using the original: {e}")
+        return None
+
+
 def scan_reference_files():
     """Scan for available reference audio/text file pairs."""
     ref_dir = get_reference_audio_path()
 
     # Get all audio files (supporting common formats)
-    audio_files = []
-    for ext in ['.wav', '.mp3', '.ogg', '.flac']:
-        audio_files.extend(glob.glob(os.path.join(ref_dir, f"*{ext}")))
+    audio_files = reference_registry.list_audio_files(ref_dir)
 
     # If no audio files found, print a helpful message
     if not audio_files:
@@ -89,17 +1084,23 @@ def scan_reference_files():
         if os.path.exists(text_file):
             audio_name = os.path.basename(audio_file)
             try:
-                with open(text_file, 'r', encoding='utf-8') as f:
-                    text_content = f.read().strip()
+                text_content = reference_registry.read_text(text_file)
 
                 # Only include if text file has content
                 if text_content:
-                    valid_pairs.append({
+                    pair = {
                         'name': audio_name,
                         'audio_path': audio_file,
                         'text_path': text_file,
                         'text_content': text_content
-                    })
+                    }
+                    # Use the trimmed mono copy in place of the original
+                    if reference_optimize:
+                        optimized = optimize_reference_clip(
+                            audio_file, text_content, reference_max_seconds)
+                        if optimized:
+                            pair.update(optimized, source_path=audio_file)
+                    valid_pairs.append(pair)
                 else:
                     files_without_text.append(
                         f"{audio_name} (empty text file)")
@@ -152,103 +1153,1993 @@ def get_app_directory(app_name):
         if not os.path.exists(app_dir):
             os.makedirs(app_dir, exist_ok=True)
 
-        return app_dir
+        return app_dir
+
+    except (PermissionError, OSError, IOError):
+        # Fall back to user directory if installation directory isn't writable
+        print(f"Note: Cannot write to installation directory: {program_dir}")
+        print("Falling back to user directory.")
+
+        # Use traditional user directories as fallback
+        home_dir = os.path.expanduser("~")
+        if os.name == 'nt':  # Windows
+            app_dir = os.path.join(os.getenv('APPDATA'), app_name)
+        elif sys.platform == 'darwin':  # macOS
+            app_dir = os.path.join(home_dir, 'Library',
+                                   'Application Support', app_name)
+        else:  # Linux and other Unix-like systems
+            app_dir = os.path.join(home_dir, f".{app_name.lower()}")
+
+        # Create the directory if it doesn't exist
+        if not os.path.exists(app_dir):
+            os.makedirs(app_dir, exist_ok=True)
+
+        return app_dir
+
+
+def open_file_with_default_app(file_path):
+    """
+    Open a file with the default application for its file type.
+
+    Args:
+        file_path (str): Path to the file to open
+    """
+    if os.name == 'nt':  # Windows
+        os.startfile(file_path)
+    elif sys.platform == 'darwin':  # macOS
+        subprocess.run(['open', file_path], check=False)
+    else:  # Linux
+        subprocess.run(['xdg-open', file_path], check=False)
+
+
+class F5TTSClientManager:
+    """
+    Keeps one long-lived gradio Client for the F5-TTS server.
+
+    Creating a Client downloads the Gradio API config and does a handshake,
+    so the client is created once and reused for every response. It is rebuilt
+    when the server URL changes or after a connection failure.
+    """
+
+    def __init__(self, url, health_check_interval=60):
+        """
+        Args:
+            url (str): F5-TTS server address
+            health_check_interval (int): Seconds a client may sit idle before it is health-checked
+        """
+        self.url = url
+        self.health_check_interval = health_check_interval
+        self._client = None
+        self._last_used = 0.0
+        self._lock = threading.Lock()
+        # Off for servers that do not take the uploaded reference, decided on every connect
+        self.server_references = True
+        self._file_meta = False
+
+        # Timing statistics
+        self.connect_count = 0
+        self.reuse_count = 0
+        self.failure_count = 0
+        self.last_connect_time = None
+        self.total_connect_time = 0.0
+        self.last_health_check_time = None
+
+    def connect(self):
+        """Create a new client for the current URL and return it."""
+        with self._lock:
+            return self._connect()
+
+    def _connect(self):
+        start_time = time.time()
+        # A new connection may mean a restarted server without our uploads
+        reference_registry.forget_server(self.url)
+        self._client = Client(self.url, verbose=False)
+        # Newer Gradio only takes files with FileData meta, which gradio_client would upload again
+        self._file_meta = not _accepts_server_files(self._client)
+        self.server_references = not self._file_meta or _reuse_server_files(self._client)
+        elapsed_time = time.time() - start_time
+
+        self.connect_count += 1
+        self.last_connect_time = elapsed_time
+        self.total_connect_time += elapsed_time
+        self._last_used = time.time()
+        print(
+            f"Connected to F5-TTS at {self.url} in {elapsed_time:.2f} seconds.")
+        if not self.server_references:
+            print("This F5-TTS server only takes files sent with the request and this gradio_client "
+                  "cannot reuse an upload, the reference audio is sent with every request.")
+        return self._client
+
+    def get_client(self):
+        """Return the shared client, connecting or reconnecting if needed."""
+        with self._lock:
+            if self._client is None:
+                return self._connect()
+
+            # A client that has been idle for a while may point at a restarted server
+            if time.time() - self._last_used > self.health_check_interval and not self.health_check():
+                print("F5-TTS health check failed, reconnecting...")
+                return self._connect()
+
+            self.reuse_count += 1
+            self._last_used = time.time()
+            return self._client
+
+    def health_check(self):
+        """Check that the server still answers. Returns True if it does."""
+        start_time = time.time()
+        try:
+            response = requests.get(
+                f"{self.url.rstrip('/')}/config", timeout=3)
+            healthy = response.status_code == 200
+        except Exception:
+            healthy = False
+        self.last_health_check_time = time.time() - start_time
+        return healthy
+
+    def set_url(self, url):
+        """Point the manager at a new server. The client is only rebuilt if the URL changed."""
+        with self._lock:
+            if url == self.url:
+                return
+            self.url = url
+            self._client = None
+
+    def invalidate(self):
+        """Drop the current client so the next request reconnects."""
+        with self._lock:
+            self._client = None
+
+    def predict(self, cancel_event=None, **kwargs):
+        """
+        Run a prediction on the shared client.
+
+        On a connection error the client is rebuilt and the request retried once.
+
+        Args:
+            cancel_event (CancelEvent): When set, the Gradio job is cancelled
+                and SynthesisCancelled is raised
+        """
+        request = kwargs
+        try:
+            client = self.get_client()
+            request = self._with_server_reference(client, kwargs)
+            return self._run(client, cancel_event, request)
+        except SynthesisCancelled:
+            raise
+        except Exception as e:
+            self.failure_count += 1
+            if _is_connection_error(e):
+                self.invalidate()
+                print(f"F5-TTS connection lost ({e}), reconnecting...")
+                client = self.get_client()
+                return self._run(client, cancel_event, self._with_server_reference(client, kwargs))
+            # Other errors come from the request itself, the connection is still good
+            problem = _reference_problem(e)
+            if request is kwargs or problem is None:
+                raise
+
+            # The server cleaned up the upload or does not take files it did not get with the request
+            reference_registry.forget_server(self.url)
+            print(f"F5-TTS request failed ({e}), sending the reference audio with the request instead...")
+            result = self._run(client, cancel_event, kwargs)
+            if problem == "rejected":
+                self.server_references = False
+                print(f"F5-TTS at {self.url} did not take the uploaded reference audio, "
+                      f"it is sent with every request until the next reconnect.")
+            return result
+
+    def _with_server_reference(self, client, kwargs):
+        """Swap the local reference audio for its uploaded copy on the server."""
+        ref_audio = kwargs.get('ref_audio_input')
+        if not self.server_references:
+            return kwargs
+        if not isinstance(ref_audio, dict) or not os.path.isfile(ref_audio.get('path', '')):
+            return kwargs
+        try:
+            server_file = reference_registry.server_file(self.url, client, ref_audio['path'])
+        except Exception as e:
+            # Fall back to letting gradio_client upload it with the request
+            print(f"Could not upload reference audio to {self.url}: {e}")
+            return kwargs
+        if self._file_meta:
+            server_file = dict(server_file, meta={"_type": "gradio.FileData"})
+        return dict(kwargs, ref_audio_input=server_file)
+
+    @staticmethod
+    def _run(client, cancel_event, kwargs):
+        if cancel_event is None:
+            return client.predict(**kwargs)
+
+        # submit() returns a Gradio job that can be cancelled while it waits or renders.
+        # Both the job finishing and a cancel wake this thread, it sleeps until then.
+        wake = threading.Event()
+        job = client.submit(**kwargs)
+        job.add_done_callback(lambda _: wake.set())
+        cancel_event.add_callback(wake.set)
+        try:
+            wake.wait()
+        finally:
+            cancel_event.remove_callback(wake.set)
+        if not job.done():
+            job.cancel()
+            raise SynthesisCancelled("Synthesis cancelled")
+        return job.result()
+
+    def stats(self):
+        """Return connection timing statistics as a dict."""
+        avg_connect_time = self.total_connect_time / \
+            self.connect_count if self.connect_count else 0.0
+        return {
+            'url': self.url,
+            'connect_count': self.connect_count,
+            'reuse_count': self.reuse_count,
+            'failure_count': self.failure_count,
+            'last_connect_time': self.last_connect_time,
+            'avg_connect_time': avg_connect_time,
+            'saved_time': avg_connect_time * self.reuse_count,
+            'last_health_check_time': self.last_health_check_time,
+        }
+
+
+class LatencyModel:
+    """
+    Persistent model of how long F5-TTS takes to synthesize a piece of text.
+
+    A linear model over character count, word count, NFE and speed is fitted
+    per backend with recursive least squares, older samples slowly fading
+    out. While a backend has few samples the model leans on a plain
+    seconds-per-character rate, and backends without samples use the model
+    fitted over all backends (key "*").
+    """
+
+    ALL_BACKENDS = "*"
+
+    def __init__(self, path, forgetting=0.98, prior_strength=1.0, min_samples=3, save_interval=30):
+        """
+        Args:
+            path (str): JSON file the model is kept in
+            forgetting (float): Weight kept by older samples on each new sample
+            prior_strength (float): Pull toward the seconds-per-character rate
+            min_samples (int): Samples a backend needs before its own model is used
+            save_interval (int): Minimum seconds between automatic saves
+        """
+        self.path = path
+        self.forgetting = forgetting
+        self.prior_strength = prior_strength
+        self.min_samples = min_samples
+        self.save_interval = save_interval
+        self.models = {}  # backend -> accumulated statistics
+        self._weights = {}  # backend -> solved weights, cleared on new samples
+        self._lock = threading.Lock()
+        self._last_save = 0.0
+        self._load()
+
+    @staticmethod
+    def features(char_count, word_count, nfe, speed):
+        """Return the feature vector of a request, scaled to similar magnitudes."""
+        return [1.0,
+                char_count / 100.0,
+                word_count / 20.0,
+                char_count * nfe / 3200.0,
+                char_count / (100.0 * max(speed, 0.1))]
+
+    def _load(self):
+        if not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, 'r') as f:
+                self.models = json.load(f).get('models', {})
+        except Exception as e:
+            print(f"Error loading TTS latency model: {e}")
+
+    def save(self):
+        """Write the model to disk."""
+        with self._lock:
+            data = json.dumps({'models': self.models})
+            self._last_save = time.time()
+        try:
+            atomic_write_text(self.path, data)
+        except Exception as e:
+            print(f"Error saving TTS latency model: {e}")
+
+    def record(self, backend, char_count, word_count, nfe, speed, elapsed_time):
+        """Add one measured synthesis to the backend model and the all-backends model."""
+        x = self.features(char_count, word_count, nfe, speed)
+        size = len(x)
+        with self._lock:
+            for key in (backend, self.ALL_BACKENDS):
+                model = self.models.setdefault(key, {
+                    'xtx': [[0.0] * size for _ in range(size)],
+                    'xty': [0.0] * size,
+                    'chars': 0.0,
+                    'seconds': 0.0,
+                    'samples': 0,
+                })
+                decay = self.forgetting
+                for i in range(size):
+                    model['xty'][i] = decay * \
+                        model['xty'][i] + x[i] * elapsed_time
+                    for j in range(size):
+                        model['xtx'][i][j] = decay * \
+                            model['xtx'][i][j] + x[i] * x[j]
+                model['chars'] = decay * model['chars'] + char_count
+                model['seconds'] = decay * model['seconds'] + elapsed_time
+                model['samples'] += 1
+                self._weights.pop(key, None)
+            save_due = time.time() - self._last_save > self.save_interval
+            if save_due:
+                # Claimed here, so only one of several threads finishing at once saves
+                self._last_save = time.time()
+        if save_due:
+            self.save()
+
+    def _solve(self, key):
+        """Solve (XtX + k*I) w = Xty + k*w0, where w0 is the seconds-per-character model."""
+        model = self.models[key]
+        size = len(model['xty'])
+        rate = model['seconds'] / max(model['chars'], 1.0)
+        prior = [0.0, rate * 100.0, 0.0, 0.0, 0.0]
+        k = self.prior_strength
+        matrix = [[model['xtx'][i][j] + (k if i == j else 0.0) for j in range(size)] + [model['xty'][i] + k * prior[i]]
+                  for i in range(size)]
+
+        # Gaussian elimination with partial pivoting
+        for col in range(size):
+            pivot = max(range(col, size), key=lambda row: abs(matrix[row][col]))
+            matrix[col], matrix[pivot] = matrix[pivot], matrix[col]
+            if abs(matrix[col][col]) < 1e-12:
+                return prior
+            for row in range(col + 1, size):
+                factor = matrix[row][col] / matrix[col][col]
+                for j in range(col, size + 1):
+                    matrix[row][j] -= factor * matrix[col][j]
+        weights = [0.0] * size
+        for row in range(size - 1, -1, -1):
+            total = matrix[row][size] - \
+                sum(matrix[row][j] * weights[j] for j in range(row + 1, size))
+            weights[row] = total / matrix[row][row]
+        return weights
+
+    def predict(self, char_count, word_count, nfe, speed, backend=None):
+        """
+        Predict the synthesis time of a request in seconds.
+
+        Args:
+            backend (str): Server URL, or None for the all-backends model
+
+        Returns:
+            float: Predicted seconds, or None without any samples yet
+        """
+        with self._lock:
+            key = backend if backend in self.models and \
+                self.models[backend]['samples'] >= self.min_samples else self.ALL_BACKENDS
+            if key not in self.models:
+                return None
+            weights = self._weights.get(key)
+            if weights is None:
+                weights = self._weights[key] = self._solve(key)
+        x = self.features(char_count, word_count, nfe, speed)
+        return max(0.05, sum(w * v for w, v in zip(weights, x)))
+
+    def predict_request(self, kwargs, backend=None):
+        """Predict the synthesis time of /basic_tts arguments."""
+        text = kwargs.get('gen_text_input', '')
+        return self.predict(len(text), len(text.split()), kwargs.get('nfe_slider', 16),
+                            kwargs.get('speed_slider', 1.0), backend)
+
+    def samples(self, backend=ALL_BACKENDS):
+        """Return the number of samples recorded for a backend."""
+        return self.models.get(backend, {}).get('samples', 0)
+
+
+class F5TTSBackendPool:
+    """
+    Dispatches synthesis requests over one or more F5-TTS servers.
+
+    Every request goes to the backend with the lowest expected finish time:
+    predicted seconds of the work already queued there plus the predicted
+    time of the new request, both from the LatencyModel. Without predictions
+    the backend with the fewest requests in flight wins. Backends that just
+    failed to connect are skipped for a while.
+
+    Waiting requests are started by priority first. Requests of the same
+    priority take turns between lanes (start-time fair queuing), so a lane
+    that queues many chunks cannot hold back the others.
+    """
+
+    def __init__(self, urls, latency_model=None, failure_cooldown=30):
+        """
+        Args:
+            urls (list): F5-TTS server addresses
+            latency_model (LatencyModel): Model used for routing, fed with every finished request
+            failure_cooldown (int): Seconds a backend is skipped after a connection failure
+        """
+        self.latency_model = latency_model
+        self.failure_cooldown = failure_cooldown
+        self._lock = threading.Lock()
+        self.backends = []
+        self._executor = None
+        self._pending = []  # Heap of (-priority, start tag, order, future, cancel_event, kwargs)
+        self._order = 0
+        self._virtual_time = 0.0  # Start tag of the request that started last
+        self._lane_finish = {}  # lane -> finish tag of its last queued request
+        self.set_urls(urls)
+
+    def set_urls(self, urls):
+        """Use a new list of servers, keeping the connections of servers that stay."""
+        with self._lock:
+            existing = {backend['url']: backend for backend in self.backends}
+            self.backends = [existing.get(url) or self._new_backend(url)
+                             for url in urls]
+            old_executor = self._executor
+            # One worker per backend, each worker picks a backend when it starts a job
+            self._executor = ThreadPoolExecutor(
+                max_workers=max(1, len(self.backends)), thread_name_prefix="f5tts")
+        if old_executor is not None:
+            old_executor.shutdown(wait=False)
+
+    def _new_backend(self, url):
+        return {
+            'url': url,
+            'manager': F5TTSClientManager(url),
+            'in_flight': 0,
+            'queued_seconds': 0.0,
+            'completed': 0,
+            'failed_until': 0.0,
+        }
+
+    def _predict(self, backend, kwargs):
+        if self.latency_model is None:
+            return None
+        return self.latency_model.predict_request(kwargs, backend['url'])
+
+    def _acquire(self, kwargs):
+        """Pick the backend with the lowest expected finish time and mark it busy."""
+        with self._lock:
+            now = time.time()
+            candidates = [
+                b for b in self.backends if b['failed_until'] <= now] or self.backends
+            predictions = {b['url']: self._predict(b, kwargs) for b in candidates}
+
+            def expected_finish(backend):
+                predicted = predictions[backend['url']] or 0.0
+                return (backend['queued_seconds'] + predicted, backend['in_flight'])
+
+            backend = min(candidates, key=expected_finish)
+            predicted = predictions[backend['url']] or 0.0
+            backend['in_flight'] += 1
+            backend['queued_seconds'] += predicted
+            return backend, predicted
+
+    def _release(self, backend, predicted, kwargs, elapsed_time, failed=False):
+        with self._lock:
+            backend['in_flight'] -= 1
+            backend['queued_seconds'] = max(
+                0.0, backend['queued_seconds'] - predicted)
+            if failed:
+                backend['failed_until'] = time.time() + self.failure_cooldown
+                return
+            backend['completed'] += 1
+
+        if self.latency_model is not None and elapsed_time > 0:
+            text = kwargs.get('gen_text_input', '')
+            self.latency_model.record(
+                backend['url'], len(text), len(text.split()),
+                kwargs.get('nfe_slider', 16), kwargs.get('speed_slider', 1.0), elapsed_time)
+
+    def predict(self, cancel_event=None, **kwargs):
+        """Run one /basic_tts request on the least loaded backend and return the result."""
+        # Cancelled while it was waiting for a worker
+        if cancel_event is not None and cancel_event.is_set():
+            raise SynthesisCancelled("Synthesis cancelled")
+
+        backend, predicted = self._acquire(kwargs)
+        start_time = time.time()
+        try:
+            result = backend['manager'].predict(cancel_event=cancel_event, **kwargs)
+        except SynthesisCancelled:
+            metrics.inc('f5tts_synthesis_cancelled_total', backend=backend['url'])
+            self._release(backend, predicted, kwargs, 0.0)
+            raise
+        except Exception as e:
+            metrics.inc('f5tts_synthesis_errors_total', backend=backend['url'])
+            self._release(backend, predicted, kwargs, 0.0,
+                          failed=_is_connection_error(e))
+            raise
+        elapsed_time = time.time() - start_time
+        metrics.observe('f5tts_synthesis_duration_seconds', elapsed_time, backend=backend['url'],
+                        chars=chars_bucket(len(kwargs.get('gen_text_input', ''))))
+        self._release(backend, predicted, kwargs, elapsed_time)
+        return result
+
+    def submit(self, cancel_event=None, priority=0, lane=None, **kwargs):
+        """
+        Queue a request and return a Future with its result. Futures complete out of order.
+
+        Args:
+            cancel_event (CancelEvent): Set to cancel the request
+            priority (int): Higher priority requests start first
+            lane (str): Requests of the same priority share the backends fairly between lanes
+        """
+        future = Future()
+        with self._lock:
+            start = max(self._virtual_time, self._lane_finish.get(lane, 0.0))
+            self._lane_finish[lane] = start + 1.0
+            self._order += 1
+            heapq.heappush(self._pending, (-priority, start, self._order,
+                                           future, cancel_event, kwargs))
+            # Every worker call starts whichever request is first in line by then
+            self._executor.submit(self._run_next)
+        return future
+
+    def _run_next(self):
+        """Run the waiting request with the highest priority and the earliest fair start."""
+        with self._lock:
+            if not self._pending:
+                return
+            _, start, _, future, cancel_event, kwargs = heapq.heappop(self._pending)
+            self._virtual_time = max(self._virtual_time, start)
+        if not future.set_running_or_notify_cancel():
+            return
+        try:
+            future.set_result(self.predict(cancel_event=cancel_event, **kwargs))
+        except BaseException as e:
+            future.set_exception(e)
+
+    def pending_count(self):
+        """Return the number of requests waiting for a backend."""
+        with self._lock:
+            return len(self._pending)
+
+    def connect_all(self):
+        """Connect every backend, reporting servers that are down."""
+        for backend in list(self.backends):
+            try:
+                backend['manager'].connect()
+            except Exception as e:
+                print(f"Could not connect to F5-TTS at {backend['url']}: {e}")
+
+    def stats(self):
+        """Return per-backend load and connection statistics."""
+        with self._lock:
+            return [dict(backend['manager'].stats(),
+                         in_flight=backend['in_flight'],
+                         completed=backend['completed'],
+                         queued_seconds=backend['queued_seconds'])
+                    for backend in self.backends]
+
+
+class TTSAudioCache:
+    """
+    Content-addressed on-disk cache of synthesized audio.
+
+    Files are named after a hash of everything that affects the output
+    (reference audio bytes, reference text, generated text and the F5-TTS
+    settings). When the cache grows over its byte budget the least recently
+    used files are deleted. File modification times keep the LRU order
+    between runs.
+    """
+
+    def __init__(self, cache_dir, max_bytes):
+        """
+        Args:
+            cache_dir (str): Directory for the cached audio files
+            max_bytes (int): Size budget in bytes, 0 disables the cache
+        """
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # key -> size, least recently used first
+        self._total_bytes = 0
+
+        os.makedirs(cache_dir, exist_ok=True)
+        self._load_index()
+
+    def _load_index(self):
+        """Rebuild the LRU order from the files already in the cache directory."""
+        files = []
+        for path in glob.glob(os.path.join(self.cache_dir, "*.wav")):
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            files.append((stat.st_mtime, os.path.basename(path)[:-4], stat.st_size))
+        for _, key, size in sorted(files):
+            self._entries[key] = size
+            self._total_bytes += size
+        self._evict()
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, f"{key}.wav")
+
+    def make_key(self, ref_audio_path, ref_text, gen_text, nfe, speed, cross_fade, remove_silence):
+        """Return the cache key for a synthesis request."""
+        parts = [reference_registry.content_hash(ref_audio_path), ref_text, gen_text,
+                 int(nfe), float(speed), float(cross_fade), bool(remove_silence)]
+        return hashlib.sha256(json.dumps(parts).encode('utf-8')).hexdigest()
+
+    def get(self, key):
+        """Return the cached file for key, or None. Counts as a hit or a miss."""
+        if self.max_bytes <= 0:
+            return None
+        with self._lock:
+            path = self._path(key)
+            if key in self._entries and os.path.exists(path):
+                self._entries.move_to_end(key)
+                self.hits += 1
+                metrics.inc('f5tts_audio_cache_lookups_total', result="hit")
+                try:
+                    os.utime(path)
+                except OSError:
+                    pass
+                return path
+            if key in self._entries:
+                # File was removed behind our back
+                self._total_bytes -= self._entries.pop(key)
+            self.misses += 1
+            metrics.inc('f5tts_audio_cache_lookups_total', result="miss")
+            return None
+
+    def put(self, key, source_path):
+        """Copy a synthesized file into the cache and return the cached path."""
+        if self.max_bytes <= 0:
+            return source_path
+        with self._lock:
+            path = self._path(key)
+            temp_path = f"{path}.tmp"
+            shutil.copyfile(source_path, temp_path)
+            os.replace(temp_path, path)
+            size = os.path.getsize(path)
+            if key in self._entries:
+                self._total_bytes -= self._entries.pop(key)
+            self._entries[key] = size
+            self._total_bytes += size
+            self._evict()
+            return path
+
+    def _evict(self):
+        """Delete least recently used files until the cache fits its budget."""
+        while self._total_bytes > self.max_bytes and self._entries:
+            key, size = self._entries.popitem(last=False)
+            self._total_bytes -= size
+            try:
+                os.remove(self._path(key))
+            except OSError:
+                pass
+
+    def stats(self):
+        """Return hit/miss counters and size as a dict."""
+        lookups = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / lookups if lookups else 0.0,
+            'entries': len(self._entries),
+            'bytes': self._total_bytes,
+            'max_bytes': self.max_bytes,
+        }
+
+
+class AudioArchive:
+    """
+    Saved replies, indexed in SQLite and stored compactly.
+
+    add() only queues the audio; a background worker hashes it, encodes it
+    (FLAC or Opus through ffmpeg, plain WAV without ffmpeg), stores
+    identical audio only once and applies the retention limits. The index
+    keeps workspace, chat ID, prompt, text hash, audio hash, duration and path
+    of every saved reply. Retention only deletes files the archive saved itself.
+    """
+
+    ENCODERS = {
+        'flac': ('.flac', ['-c:a', 'flac', '-compression_level', '8']),
+        'opus': ('.ogg', ['-c:a', 'libopus', '-b:a', '32k']),
+    }
+
+    def __init__(self, saved_dir, audio_format="flac", max_days=0, max_bytes=0):
+        """
+        Args:
+            saved_dir (str): Directory for the saved audio and the index
+            audio_format (str): "flac", "opus" or "wav"
+            max_days (float): Delete saved replies older than this, 0 keeps them
+            max_bytes (int): Delete the oldest replies above this size, 0 means no limit
+        """
+        self.saved_dir = saved_dir
+        self.audio_format = audio_format if shutil.which('ffmpeg') else "wav"
+        self.max_days = max_days
+        self.max_bytes = max_bytes
+        self.staging_dir = os.path.join(saved_dir, ".staging")
+        os.makedirs(self.staging_dir, exist_ok=True)
+        if self.audio_format != audio_format:
+            print(f"ffmpeg not found, saving replies as WAV instead of {audio_format}.")
+
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(os.path.join(saved_dir, "archive.db"), check_same_thread=False)
+        with self._lock, self._db:
+            self._db.execute("""
+                CREATE TABLE IF NOT EXISTS recordings (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    workspace TEXT,
+                    chat_id INTEGER,
+                    prompt TEXT,
+                    text_hash TEXT,
+                    audio_hash TEXT,
+                    duration REAL,
+                    path TEXT NOT NULL,
+                    bytes INTEGER,
+                    created REAL NOT NULL
+                )""")
+            self._db.execute("CREATE INDEX IF NOT EXISTS recordings_audio_hash ON recordings (audio_hash)")
+            self._db.execute("CREATE INDEX IF NOT EXISTS recordings_created ON recordings (created)")
+        self._index_existing_files()
+
+        self._jobs = queue.Queue()
+        self._worker = threading.Thread(target=self._work, daemon=True, name="audio-archive")
+        self._worker.start()
+
+    def _index_existing_files(self):
+        """
+        Add audio saved before the index existed, so the index lists it too.
+
+        These rows have no audio hash, which keeps retention away from them.
+        """
+        with self._lock:
+            known = {row[0] for row in self._db.execute("SELECT path FROM recordings")}
+        rows = []
+        for path in glob.glob(os.path.join(self.saved_dir, "*.*")):
+            if path in known or os.path.splitext(path)[1].lower() not in ('.wav', '.flac', '.ogg'):
+                continue
+            stat = os.stat(path)
+            rows.append((os.path.splitext(os.path.basename(path))[0], path, stat.st_size, stat.st_mtime))
+        if rows:
+            with self._lock, self._db:
+                self._db.executemany(
+                    "INSERT INTO recordings (prompt, path, bytes, created) VALUES (?, ?, ?, ?)", rows)
+            print(f"Indexed {len(rows)} previously saved audio files.")
+
+    def add(self, audio_path, response_content, move=False):
+        """
+        Queue a WAV file to be saved for a response.
+
+        A file that is not moved is copied to the staging directory first, the
+        audio cache or Gradio may delete it before the worker gets to it.
+
+        Args:
+            audio_path (str): The audio to save
+            response_content (dict): The response the audio belongs to
+            move (bool): audio_path is a staging file the archive may take over
+        """
+        if not move:
+            staged_path = self.staging_path()
+            shutil.copyfile(audio_path, staged_path)
+            audio_path = staged_path
+        self._jobs.put((audio_path, dict(response_content), time.time()))
+
+    def staging_path(self, suffix=".wav"):
+        """Return a unique temporary path for audio that will be handed to add(move=True)."""
+        return os.path.join(self.staging_dir, f"{os.getpid()}_{time.time_ns()}{suffix}")
+
+    def _work(self):
+        while True:
+            job = self._jobs.get()
+            if job is None:
+                break
+            try:
+                self._save(*job)
+                self._apply_retention()
+            except Exception as e:
+                print(f"Error saving audio file: {e}")
+            finally:
+                self._jobs.task_done()
+
+    def _save(self, audio_path, response_content, created):
+        """Save a staging file and index it, the staging file is deleted in any case."""
+        try:
+            self._save_staged(audio_path, response_content, created)
+        finally:
+            try:
+                os.remove(audio_path)
+            except OSError:
+                pass
+
+    def _save_staged(self, audio_path, response_content, created):
+        digest = hashlib.sha256()
+        with open(audio_path, 'rb') as f:
+            for block in iter(lambda: f.read(1024 * 1024), b''):
+                digest.update(block)
+        audio_hash = digest.hexdigest()
+        text_hash = hashlib.sha256(
+            response_content.get('content', '').encode('utf-8')).hexdigest()
+        with wave.open(audio_path, 'rb') as wav_file:
+            duration = wav_file.getnframes() / float(wav_file.getframerate())
+
+        with self._lock:
+            existing = self._db.execute(
+                "SELECT path, bytes FROM recordings WHERE audio_hash = ? ORDER BY id DESC LIMIT 1",
+                (audio_hash,)).fetchone()
+        if existing and os.path.exists(existing[0]):
+            # Same audio again, point at the stored copy
+            path, size = existing
+            print(f"Audio already saved as {os.path.basename(path)}, indexed it for this reply as well.")
+        else:
+            path = self._encode(audio_path, self._new_path(response_content))
+            size = os.path.getsize(path)
+            print(f"Saved audio file to: {path}")
+
+        with self._lock, self._db:
+            self._db.execute(
+                "INSERT INTO recordings (workspace, chat_id, prompt, text_hash, audio_hash, duration, path, bytes, created) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (response_content.get('workspace'), response_content.get('chat_id'),
+                 response_content.get('prompt'), text_hash, audio_hash, duration, path, size, created))
+
+    def _new_path(self, response_content):
+        """Name a saved file after the first 30 characters of the prompt and the current time."""
+        content_prefix = (response_content.get('prompt') or '')[:30].strip() or "ai_response"
+        content_prefix = ''.join(
+            c for c in content_prefix if c.isalnum() or c.isspace()).replace(' ', '_').lower()
+        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        extension = self.ENCODERS[self.audio_format][0] if self.audio_format in self.ENCODERS else ".wav"
+        path = os.path.join(self.saved_dir, f"{content_prefix}_{timestamp}{extension}")
+        counter = 2
+        while os.path.exists(path):
+            path = os.path.join(self.saved_dir, f"{content_prefix}_{timestamp}_{counter:02d}{extension}")
+            counter += 1
+        return path
+
+    def _encode(self, audio_path, output_path):
+        """Write audio_path to output_path in the archive format."""
+        if self.audio_format not in self.ENCODERS:
+            shutil.copy2(audio_path, output_path)
+            return output_path
+        temp_path = output_path + ".tmp" + os.path.splitext(output_path)[1]
+        subprocess.run(['ffmpeg', '-v', 'error', '-y', '-i', audio_path]
+                       + self.ENCODERS[self.audio_format][1] + [temp_path],
+                       check=True, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+        os.replace(temp_path, output_path)
+        return output_path
+
+    def _apply_retention(self):
+        """Delete the oldest saved replies that are too old or over the size limit."""
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT id, path, bytes, created FROM recordings "
+                "WHERE audio_hash IS NOT NULL ORDER BY created").fetchall()
+        expired = []
+        if self.max_days:
+            cutoff = time.time() - self.max_days * 86400
+            expired = [row for row in rows if row[3] < cutoff]
+        remaining = rows[len(expired):]
+        if self.max_bytes:
+            # Deduplicated files count once, and only free space when their last reply goes
+            sizes = {row[1]: row[2] or 0 for row in remaining}
+            uses = {}
+            for row in remaining:
+                uses[row[1]] = uses.get(row[1], 0) + 1
+            total = sum(sizes.values())
+            dropped = 0
+            while dropped < len(remaining) and total > self.max_bytes:
+                path = remaining[dropped][1]
+                dropped += 1
+                uses[path] -= 1
+                if not uses[path]:
+                    total -= sizes[path]
+            expired.extend(remaining[:dropped])
+        if not expired:
+            return
+
+        with self._lock, self._db:
+            self._db.executemany("DELETE FROM recordings WHERE id = ?", [(row[0],) for row in expired])
+            still_used = {row[0] for row in self._db.execute("SELECT DISTINCT path FROM recordings")}
+        for path in {row[1] for row in expired} - still_used:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+        print(f"Archive retention removed {len(expired)} saved replies.")
+
+    def stats(self):
+        """Return the number of saved replies, stored files and bytes."""
+        with self._lock:
+            count, files, size = self._db.execute(
+                "SELECT COUNT(*), COUNT(DISTINCT path), "
+                "(SELECT COALESCE(SUM(bytes), 0) FROM (SELECT DISTINCT path, bytes FROM recordings)) "
+                "FROM recordings").fetchone()
+        return {'replies': count, 'files': files, 'bytes': size, 'pending': self._jobs.qsize()}
+
+    def close(self, timeout=10):
+        """Finish queued saves and stop the worker, waiting at most timeout seconds."""
+        self._jobs.put(None)
+        self._worker.join(timeout)
+
+
+def _run_in_thread(func, *args):
+    """
+    Run a blocking function in a new daemon thread and return an awaitable for its result.
+
+    Unlike run_in_executor, a thread stuck in input() does not hold up the
+    shutdown of the event loop.
+    """
+    loop = asyncio.get_running_loop()
+    future = loop.create_future()
+
+    def deliver(set_outcome, value):
+        if not future.done():
+            set_outcome(value)
+
+    def work():
+        try:
+            outcome = (future.set_result, func(*args))
+        except BaseException as e:
+            outcome = (future.set_exception, e)
+        try:
+            loop.call_soon_threadsafe(deliver, *outcome)
+        except RuntimeError:
+            # The event loop has already been closed
+            pass
+
+    threading.Thread(target=work, daemon=True).start()
+    return future
+
+
+async def _await_chunk(future):
+    """
+    Wait for a chunk Future from asyncio code.
+
+    Raises:
+        SynthesisCancelled: If the chunk was cancelled before or while rendering
+    """
+    try:
+        return await asyncio.wrap_future(future)
+    except asyncio.CancelledError:
+        # Only a cancelled chunk is turned into SynthesisCancelled, a cancelled task is not
+        if future.cancelled():
+            raise SynthesisCancelled("Synthesis cancelled")
+        raise
+
+
+def _completed_future(result):
+    """Wrap an already known result in a finished Future."""
+    future = Future()
+    future.set_result(result)
+    return future
+
+
+def parse_f5tts_endpoints(value):
+    """
+    Parse the f5tts_client setting into a list of server addresses.
+
+    Args:
+        value (str): One address, or several separated by commas
+
+    Returns:
+        list: Server addresses
+    """
+    endpoints = [url.strip() for url in str(value).split(',') if url.strip()]
+    return endpoints or ["http://127.0.0.1:7860/"]
+
+
+def _parse_workspace_list(value):
+    """Parse a comma separated list of workspace slugs."""
+    return {slug.strip() for slug in str(value).split(',') if slug.strip()}
+
+
+def _parse_workspace_map(value):
+    """Parse "slug:value, slug:value" pairs into a dict. Entries without a colon are ignored."""
+    mapping = {}
+    for entry in str(value).split(','):
+        slug, sep, item = entry.partition(':')
+        if sep and slug.strip() and item.strip():
+            mapping[slug.strip()] = item.strip()
+    return mapping
+
+
+class WorkspaceRules:
+    """
+    Per-workspace routing settings.
+
+    Decides which workspaces are read out at all, which reference voice
+    each one uses and how its synthesis is ranked against the others.
+    Workspaces are named by their slug, like in the AnythingLLM URLs.
+    """
+
+    def __init__(self, allow="", deny="", voices="", priorities=""):
+        """
+        Args:
+            allow (str): Comma separated slugs to read, empty reads every workspace
+            deny (str): Comma separated slugs never read, wins over allow
+            voices (str): "slug:reference.wav" pairs, other workspaces use the selected reference
+            priorities (str): "slug:number" pairs, higher is rendered first, default 0
+        """
+        self.allow = _parse_workspace_list(allow)
+        self.deny = _parse_workspace_list(deny)
+        self.voices = _parse_workspace_map(voices)
+        self.priorities = {}
+        for slug, priority in _parse_workspace_map(priorities).items():
+            try:
+                self.priorities[slug] = int(priority)
+            except ValueError:
+                print(f"Ignoring priority '{priority}' for workspace {slug}, it is not a whole number.")
+
+    @classmethod
+    def from_config(cls, config):
+        return cls(config['workspace_allow'], config['workspace_deny'],
+                   config['workspace_voices'], config['workspace_priority'])
+
+    def is_allowed(self, slug):
+        """Check if replies from a workspace should be synthesized."""
+        if slug in self.deny:
+            return False
+        return not self.allow or slug in self.allow
+
+    def voice(self, slug):
+        """Return the reference file name for a workspace, or None for the selected reference."""
+        return self.voices.get(slug)
+
+    def priority(self, slug):
+        return self.priorities.get(slug, 0)
+
+
+@dataclass(frozen=True)
+class TTSSettings:
+    """
+    Immutable snapshot of the settings a reply is synthesized and played with.
+
+    A job takes the current snapshot when it starts and keeps it to the end.
+    Changes build a new snapshot that is swapped in as a whole, so a job never
+    sees half of a change and the menu never has to pause the pipeline.
+    """
+
+    f5tts_client: str = "http://127.0.0.1:7860/"
+    f5tts_remove_silence: bool = False
+    f5tts_cross_fade: float = 0.15
+    f5tts_nfe: int = 16
+    f5tts_speed: float = 1.0
+    audio_player: str = "playsound"
+    f5tts_save_audio: str = "nosave"
+    f5tts_stream_mode: str = "stream"
+    f5tts_first_chunk_chars: int = 120
+    f5tts_chunk_chars: int = 300
+    speech_cleanup: bool = True
+    speech_code_blocks: str = "summarize"
+    f5tts_selected_ref: str = "not chosen"
+    # Follow f5tts_selected_ref, they are looked up in the reference folder
+    f5tts_ref_audio: str = "not chosen"
+    f5tts_ref_text: str = ""
+
+    # Settings stored in config_f5tts_any.txt, the reference is stored with the tracking data
+    CONFIG_KEYS = ('f5tts_client', 'f5tts_remove_silence', 'f5tts_cross_fade', 'f5tts_nfe', 'f5tts_speed',
+                   'audio_player', 'f5tts_save_audio', 'f5tts_stream_mode', 'f5tts_first_chunk_chars',
+                   'f5tts_chunk_chars', 'speech_cleanup', 'speech_code_blocks')
+    CHOICES = {
+        'audio_player': ("playsound", "default_media_player"),
+        'f5tts_save_audio': ("nosave", "save"),
+        'f5tts_stream_mode': ("stream", "full"),
+        'speech_code_blocks': ("summarize", "remove"),
+    }
+
+    @classmethod
+    def from_config(cls, config):
+        return cls(**{key: config[key] for key in cls.CONFIG_KEYS if key in config})
+
+    @classmethod
+    def check(cls, key, value):
+        """
+        Validate one setting the same way the menu does.
+
+        Returns:
+            The value converted to the type of the setting
+
+        Raises:
+            ValueError: With a message for the user if the value is not allowed
+        """
+        if key not in cls.__dataclass_fields__:
+            raise ValueError(f"Unknown setting {key}")
+        default = cls.__dataclass_fields__[key].default
+        if isinstance(default, bool):
+            if isinstance(value, str) and value.lower() in ('true', 'false'):
+                value = value.lower() == 'true'
+            if not isinstance(value, bool):
+                raise ValueError(f"{key} must be true or false")
+            return value
+        if isinstance(default, (int, float)):
+            try:
+                value = type(default)(value)
+            except (TypeError, ValueError):
+                raise ValueError(f"{key} must be a number")
+        else:
+            value = str(value).strip()
+
+        if key == 'f5tts_nfe' and not (4 <= value <= 64 and value % 2 == 0):
+            raise ValueError("NFE must be between 4 and 64 and be an even number")
+        if key == 'f5tts_speed' and not 0.5 <= value <= 2.0:
+            raise ValueError("Speed must be between 0.5 and 2.0")
+        if key == 'f5tts_cross_fade' and not 0.0 <= value <= 1.0:
+            raise ValueError("Cross-fade must be between 0.0 and 1.0")
+        if key in ('f5tts_first_chunk_chars', 'f5tts_chunk_chars') and value < 20:
+            raise ValueError(f"{key} must be at least 20")
+        if key in cls.CHOICES and value not in cls.CHOICES[key]:
+            raise ValueError(f"{key} must be one of {', '.join(cls.CHOICES[key])}")
+        if key == 'f5tts_client' and not value:
+            raise ValueError("Server URL must not be empty")
+        return value
+
+    def to_dict(self):
+        return asdict(self)
+
+
+def _accepts_server_files(client):
+    """
+    Check if a Gradio server takes a file by its server path, without FileData meta.
+
+    Gradio 5.5 and later only take files that gradio_client sends with the request.
+    """
+    try:
+        major, minor = (int(part) for part in str(client.config.get('version', '')).split('.')[:2])
+    except (AttributeError, TypeError, ValueError):
+        return True
+    return (major, minor) < (5, 5)
+
+
+def _reuse_server_files(client):
+    """
+    Let gradio_client send an uploaded reference by its server path.
+
+    gradio_client uploads every file with FileData meta again with the
+    request. The upload step of each endpoint is wrapped so it passes on the
+    files reference_registry uploaded before.
+
+    Returns:
+        bool: False if this gradio_client has no upload step to wrap
+    """
+    endpoints = getattr(client, 'endpoints', None)
+    if not isinstance(endpoints, dict) or not all(hasattr(endpoint, '_upload_file') for endpoint in endpoints.values()):
+        return False
+
+    def wrap(upload_file):
+        def upload_or_reuse(f, data_index):
+            if reference_registry.is_server_file(f.get('path')):
+                return f
+            return upload_file(f, data_index)
+        return upload_or_reuse
+
+    for endpoint in endpoints.values():
+        endpoint._upload_file = wrap(endpoint._upload_file)
+    return True
+
+
+def _reference_problem(error):
+    """
+    Check if a failed request was about the uploaded reference audio.
+
+    Returns:
+        str: "missing" if the server no longer has the upload, "rejected" if it
+        does not take uploaded files by path, None for any other error
+    """
+    message = str(error).lower()
+    if any(hint in message for hint in ("filedata", "'meta' field", "not allowed", "allowed_paths")):
+        return "rejected"
+    if "file" in message and any(hint in message for hint in ("no such file", "not found", "does not exist")):
+        return "missing"
+    return None
+
+
+def _is_connection_error(error):
+    """Check if an exception means the server could not be reached."""
+    if isinstance(error, (ConnectionError, TimeoutError, requests.exceptions.ConnectionError)):
+        return True
+    # gradio_client talks to the server through httpx
+    return type(error).__module__.startswith('httpx') and 'Connect' in type(error).__name__
+
+
+class NonBlockingConsole:
+    """
+    Reads single key presses for the event loop, cross-platform without PyWin32.
+
+    On Linux and macOS stdin is registered with the event loop's selector, so
+    waiting for a key costs nothing until one is pressed. Windows consoles
+    cannot be selected on, there one thread blocks in getwch() instead.
+    """
+
+    def __init__(self):
+        self.fd = None
+        self.old_settings = None
+        self._key_wanted = threading.Event()  # Windows: the reader thread may take the next key
+        self._key_future = None
+        self._reader = None
+
+        # Set up terminal for Unix systems
+        if os.name != 'nt':
+            try:
+                import termios
+                # Store the terminal settings so we can restore them
+                fd = sys.stdin.fileno()
+                self.old_settings = termios.tcgetattr(fd)
+                self.fd = fd
+                # This is to ensure we can restore the terminal properly
+                atexit.register(self.cleanup)
+            except Exception:
+                # Not all Unix-like systems support termios, and stdin may not be a terminal
+                pass
+
+    @property
+    def available(self):
+        """True if key presses can be read."""
+        if os.name == 'nt':
+            try:
+                import msvcrt
+                return True
+            except ImportError:
+                return False
+        return self.fd is not None
+
+    def cleanup(self):
+        """Restore terminal settings on exit for Unix systems"""
+        if os.name != 'nt':
+            try:
+                import termios
+                termios.tcsetattr(self.fd, termios.TCSADRAIN,
+                                  self.old_settings)
+            except (ImportError, AttributeError, IOError, TypeError):
+                pass
+
+    async def next_key(self):
+        """
+        Wait for the next key press without blocking the event loop.
+
+        The terminal is only in cbreak mode while waiting, so prompts that
+        follow a key press (the settings menu) echo what is typed.
+
+        Returns:
+            str: The key, or None if stdin was closed or there is no keyboard
+        """
+        if not self.available:
+            return None
+        loop = asyncio.get_running_loop()
+        self._key_future = loop.create_future()
+        if os.name == 'nt':
+            self._start_reader(loop)
+            self._key_wanted.set()
+            return await self._key_future
+
+        import tty
+        tty.setcbreak(self.fd)
+        loop.add_reader(self.fd, self._read_key)
+        try:
+            return await self._key_future
+        finally:
+            loop.remove_reader(self.fd)
+            self.cleanup()
+
+    def _read_key(self):
+        """Selector callback: stdin is readable."""
+        # os.read, sys.stdin would buffer keys the selector then never reports
+        data = os.read(self.fd, 1)
+        if not self._key_future.done():
+            self._key_future.set_result(data.decode('utf-8', errors='ignore') if data else None)
+
+    def _start_reader(self, loop):
+        """Start the Windows key reader thread, it only reads while a key is wanted."""
+        if self._reader is not None:
+            return
+        import msvcrt
+
+        def deliver(key):
+            if self._key_future is not None and not self._key_future.done():
+                self._key_future.set_result(key)
+
+        def read_keys():
+            while True:
+                self._key_wanted.wait()
+                key = msvcrt.getwch()
+                self._key_wanted.clear()
+                loop.call_soon_threadsafe(deliver, key)
+
+        self._reader = threading.Thread(target=read_keys, daemon=True)
+        self._reader.start()
+
+
+def atomic_write_text(path, text):
+    """
+    Write a text file so that it is either fully replaced or left untouched.
+
+    The text goes to a temporary file in the same directory, is flushed to
+    disk and then renamed over the target. Every call gets its own temporary
+    file, so threads writing the same file at once cannot mix their data.
+    """
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, temp_path = tempfile.mkstemp(
+        dir=directory, prefix=f".{os.path.basename(path)}.", suffix=".tmp")
+    try:
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            f.write(text)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp_path, path)
+    except BaseException:
+        try:
+            os.remove(temp_path)
+        except OSError:
+            pass
+        raise
+
+
+class StateJournal:
+    """
+    Append-only journal of tracking updates next to an atomic JSON snapshot.
+
+    Every batch of new responses appends one JSON line to the journal. After
+    compact_every lines the full state is written as a new snapshot (via
+    atomic_write_text) and the journal starts over. A line cut off by a
+    crash is ignored when the journal is read back.
+    """
+
+    def __init__(self, snapshot_path, journal_path, compact_every=200):
+        """
+        Args:
+            snapshot_path (str): Path of the JSON snapshot
+            journal_path (str): Path of the journal file
+            compact_every (int): Journal lines before a new snapshot is written
+        """
+        self.snapshot_path = snapshot_path
+        self.journal_path = journal_path
+        self.compact_every = compact_every
+        self.entries_since_snapshot = 0
+
+    def read_entries(self):
+        """Return the journal entries written since the last snapshot."""
+        entries = []
+        if not os.path.exists(self.journal_path):
+            return entries
+        with open(self.journal_path, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    entries.append(json.loads(line))
+                except ValueError:
+                    # Partly written line from a crash, everything after it is lost too
+                    break
+        self.entries_since_snapshot = len(entries)
+        return entries
+
+    def append(self, entry):
+        """Append one entry and flush it to disk."""
+        with open(self.journal_path, 'a', encoding='utf-8') as f:
+            f.write(json.dumps(entry, separators=(',', ':')) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        self.entries_since_snapshot += 1
+
+    def needs_compaction(self):
+        """Check if enough entries piled up to write a new snapshot."""
+        return self.entries_since_snapshot >= self.compact_every
+
+    def write_snapshot(self, data):
+        """Atomically replace the snapshot and start an empty journal."""
+        atomic_write_text(self.snapshot_path, json.dumps(data))
+        # Replaying old entries over the new snapshot is harmless, so a crash
+        # between these two steps loses nothing
+        with open(self.journal_path, 'w', encoding='utf-8'):
+            pass
+        self.entries_since_snapshot = 0
+
+
+class SeenResponseStore:
+    """
+    Remembers which responses were already handled, in bounded space.
+
+    Keeps the exact "slug:id" keys of the most recent responses plus a
+    per-workspace watermark. Chat IDs only grow, so when a key is pushed out
+    of the recent window its ID becomes the workspace watermark and every
+    ID at or below it counts as seen.
+    """
+
+    def __init__(self, window_size=1000):
+        """
+        Args:
+            window_size (int): Number of recent response keys kept exactly
+        """
+        self.window_size = window_size
+        self.watermarks = {}  # workspace slug -> highest chat ID pushed out of the window
+        self._recent = OrderedDict()  # "slug:id" keys, oldest first
+
+    @staticmethod
+    def _split(response_id):
+        slug, _, chat_id = response_id.rpartition(':')
+        try:
+            return slug, int(chat_id)
+        except ValueError:
+            return slug, None
+
+    def __contains__(self, response_id):
+        if response_id in self._recent:
+            return True
+        slug, chat_id = self._split(response_id)
+        return chat_id is not None and chat_id <= self.watermarks.get(slug, 0)
+
+    def __len__(self):
+        return len(self._recent)
+
+    def add(self, response_id):
+        """Mark a response as seen."""
+        self._recent[response_id] = None
+        self._recent.move_to_end(response_id)
+        while len(self._recent) > self.window_size:
+            old_id, _ = self._recent.popitem(last=False)
+            slug, chat_id = self._split(old_id)
+            if chat_id is not None:
+                self.watermarks[slug] = max(
+                    self.watermarks.get(slug, 0), chat_id)
+
+    def clear(self):
+        """Forget all responses."""
+        self.watermarks = {}
+        self._recent = OrderedDict()
+
+    def to_dict(self):
+        """Return the store as JSON-serializable data."""
+        return {'watermarks': self.watermarks, 'recent': list(self._recent)}
+
+    @classmethod
+    def from_dict(cls, data, window_size=1000):
+        """Rebuild a store saved with to_dict."""
+        store = cls(window_size)
+        store.watermarks = {slug: int(chat_id)
+                            for slug, chat_id in data.get('watermarks', {}).items()}
+        for response_id in data.get('recent', []):
+            store.add(response_id)
+        return store
+
+    @classmethod
+    def from_response_ids(cls, response_ids, window_size=1000):
+        """Build a store from the old unbounded list of "slug:id" keys."""
+        store = cls(window_size)
+        for response_id in sorted(response_ids, key=lambda key: cls._split(key)[1] or 0):
+            store.add(response_id)
+        return store
+
+
+# Put between replies rendered in one request, so there is a pause to cut the audio at
+COALESCE_SEPARATOR = " ... "
+
+
+class SynthesisCancelled(Exception):
+    """Raised by synthesis requests that were cancelled because nobody will hear them."""
+
+
+class CancelEvent(threading.Event):
+    """A threading.Event that also runs callbacks when it is set, so code waiting for it does not poll."""
+
+    def __init__(self):
+        super().__init__()
+        self._callbacks = []
+        self._callbacks_lock = threading.Lock()
+
+    def add_callback(self, callback):
+        """Call callback() once the event is set, right away if it already is."""
+        with self._callbacks_lock:
+            if not self.is_set():
+                self._callbacks.append(callback)
+                return
+        callback()
+
+    def remove_callback(self, callback):
+        with self._callbacks_lock:
+            if callback in self._callbacks:
+                self._callbacks.remove(callback)
+
+    def set(self):
+        with self._callbacks_lock:
+            super().set()
+            callbacks, self._callbacks = self._callbacks, []
+        for callback in callbacks:
+            callback()
+
+
+class SpeechJob:
+    """One response on its way from synthesis to playback."""
+
+    def __init__(self, text, response=None):
+        """
+        Args:
+            text (str): Text to speak
+            response (dict): The response the text belongs to
+        """
+        self.text = text
+        self.response = response
+        self.number_of_words = len(text.split())
+        self.char_count = len(text)
+        self.chunks = []
+        self.futures = []  # One Future per chunk, resolving to the /basic_tts result
+        self.cached_chunks = 0
+        self.estimated_time = None
+        self.created_time = time.time()
+        self.start_time = self.created_time
+        self.sequence = 0  # Order in which jobs were created, set by the monitor
+        self.workspace = (response or {}).get('workspace')  # Synthesis lane
+        self.priority = 0
+        self.ref_audio = None  # Reference voice, set by the monitor
+        self.ref_text = ""
+        self.settings = None  # TTSSettings snapshot the job is rendered and played with
+        self.live = False  # True while the text is still streaming in from the LLM
+        self.cancel_event = CancelEvent()  # Also cancels chunks that are rendering
+
+    def cancel(self):
+        """Cancel chunks that are waiting and stop the ones that are rendering."""
+        self.cancel_event.set()
+        for future in self.futures:
+            future.cancel()
+
+    @property
+    def cancelled(self):
+        return self.cancel_event.is_set()
+
+    def is_rendered(self):
+        """Check if every chunk has finished, failed or been cancelled."""
+        return all(future.done() for future in self.futures)
+
+    async def next_future(self, index):
+        """Return the future of chunk index, or None if the job has no such chunk."""
+        return self.futures[index] if index < len(self.futures) else None
+
+    async def wait_complete(self):
+        """Wait until no more chunks will be added."""
+
+
+class LiveSpeechJob(SpeechJob):
+    """
+    A job whose text streams in from the LLM while its first chunks are already rendering.
+
+    Chunks are added from the stream proxy threads, playback waits for them in
+    the pipeline's event loop.
+    """
+
+    def __init__(self, response, loop):
+        """
+        Args:
+            response (dict): The response the text belongs to, completed when the stream ends
+            loop (asyncio.AbstractEventLoop): Event loop of the pipeline
+        """
+        super().__init__("", response)
+        self.live = True
+        self.complete = False
+        self._loop = loop
+        self._changed = asyncio.Event()
+
+    def add_chunk(self, text, future):
+        """Append a chunk that is rendering. Called from any thread."""
+        self.chunks.append(text)
+        self.futures.append(future)
+        self.text = " ".join(self.chunks)
+        self.number_of_words = len(self.text.split())
+        self.char_count = len(self.text)
+        self._loop.call_soon_threadsafe(self._changed.set)
+
+    def finish(self):
+        """Mark the text as complete. Called from any thread."""
+        self.complete = True
+        self._loop.call_soon_threadsafe(self._changed.set)
+
+    async def next_future(self, index):
+        while index >= len(self.futures) and not self.complete:
+            self._changed.clear()
+            await self._changed.wait()
+        return await super().next_future(index)
+
+    async def wait_complete(self):
+        while not self.complete:
+            self._changed.clear()
+            await self._changed.wait()
+
+
+class PlaybackArbiter:
+    """
+    Decides which workspace lane may use the speaker.
+
+    Every lane has its own playback stage, they all start their audio
+    through acquire() and hold(). Audio of the same or a higher priority
+    may cut off what is playing, as a newer reply does within a lane.
+    A job of a lower priority waits until the higher priority audio has
+    finished, so a background workspace never interrupts the interactive
+    one. Waiting jobs get the speaker highest priority first.
+    """
+
+    def __init__(self):
+        self._switch = asyncio.Lock()  # Held from acquire() until the audio has started
+        self._priority = None  # Priority of the audio that is playing, None when nothing is
+        self._holder = 0  # Incremented whenever audio starts, a finished holder only frees its own turn
+        self._waiting = []  # Heap of (-priority, order, future)
+        self._order = 0
+
+    async def acquire(self, priority):
+        """
+        Wait until audio of this priority may start.
+
+        Returns with the switch held, so the caller can stop the current sound
+        and start its own without another lane starting in between. The caller
+        must then call hold() once it stopped the current sound, or release().
+        """
+        loop = asyncio.get_running_loop()
+        while True:
+            if self._priority is not None and self._priority > priority:
+                future = loop.create_future()
+                heapq.heappush(self._waiting, (-priority, self._order, future))
+                self._order += 1
+                try:
+                    await future
+                except asyncio.CancelledError:
+                    if future.done() and not future.cancelled():
+                        self._wake_next()  # Pass on the turn this job was given
+                    future.cancel()
+                    raise
+                continue
+            await self._switch.acquire()
+            if self._priority is None or self._priority <= priority:
+                return
+            self._switch.release()
+
+    async def hold(self, priority, player):
+        """
+        Give the speaker to audio that was just started and keep it until that audio has finished.
+
+        Args:
+            priority (int): Priority of the job that started the audio
+            player: What play_audio_cross_platform or StreamingPlayback returned, None if nothing plays
+        """
+        self._holder += 1
+        holder = self._holder
+        self._priority = priority if player is not None else None
+        self._switch.release()
+        try:
+            if player is not None:
+                await _run_in_thread(wait_for_playback, player)
+        finally:
+            if self._holder == holder:
+                self._priority = None
+                self._wake_next()
+
+    def release(self):
+        """Give up a turn from acquire() without stopping or starting any audio."""
+        self._switch.release()
+        if self._priority is None:
+            self._wake_next()
+
+    def _wake_next(self):
+        """Let the waiting job with the highest priority try again."""
+        while self._waiting:
+            future = heapq.heappop(self._waiting)[2]
+            if not future.done():
+                future.set_result(None)
+                return
+
 
-    except (PermissionError, OSError, IOError):
-        # Fall back to user directory if installation directory isn't writable
-        print(f"Note: Cannot write to installation directory: {program_dir}")
-        print("Falling back to user directory.")
+class AdaptivePollScheduler:
+    """
+    Decides how long to wait before the next poll.
 
-        # Use traditional user directories as fallback
-        home_dir = os.path.expanduser("~")
-        if os.name == 'nt':  # Windows
-            app_dir = os.path.join(os.getenv('APPDATA'), app_name)
-        elif sys.platform == 'darwin':  # macOS
-            app_dir = os.path.join(home_dir, 'Library',
-                                   'Application Support', app_name)
-        else:  # Linux and other Unix-like systems
-            app_dir = os.path.join(home_dir, f".{app_name.lower()}")
+    Right after activity (a new response) it polls fast, because the next
+    reply usually follows soon. When nothing happens the interval grows
+    exponentially from the check interval toward a long idle interval.
+    After errors it waits with jittered exponential backoff.
+    """
 
-        # Create the directory if it doesn't exist
-        if not os.path.exists(app_dir):
-            os.makedirs(app_dir, exist_ok=True)
+    def __init__(self, base_interval, fast_interval=0.5, fast_period=30, idle_interval=60,
+                 backoff_factor=1.5, error_max_backoff=300):
+        """
+        Args:
+            base_interval (float): Normal check interval in seconds
+            fast_interval (float): Interval right after activity
+            fast_period (float): Seconds after activity to keep polling fast
+            idle_interval (float): Longest interval when nothing happens
+            backoff_factor (float): Growth of the interval per idle poll
+            error_max_backoff (float): Longest wait after repeated errors
+        """
+        self.base_interval = base_interval
+        self.fast_interval = fast_interval
+        self.fast_period = fast_period
+        self.idle_interval = max(idle_interval, base_interval)
+        self.backoff_factor = backoff_factor
+        self.error_max_backoff = error_max_backoff
+
+        self._last_activity = 0.0
+        self._idle_polls = 0
+        self._failures = 0
+        self._loop = None
+        self._wake_event = None
+
+    def record_activity(self):
+        """Something happened, poll fast for a while."""
+        self._last_activity = time.time()
+        self._idle_polls = 0
+
+    def record_success(self, changed):
+        """
+        Record a successful poll.
 
-        return app_dir
+        Args:
+            changed (bool): Whether the poll found new responses
+        """
+        self._failures = 0
+        if changed:
+            self.record_activity()
+        elif time.time() - self._last_activity >= self.fast_period:
+            self._idle_polls += 1
+
+    def record_failure(self):
+        """Record a failed poll."""
+        self._failures += 1
+
+    def next_delay(self):
+        """Return the number of seconds to wait before the next poll."""
+        if self._failures:
+            # Full jitter keeps several clients from retrying in lockstep
+            backoff = min(self.error_max_backoff,
+                          self.base_interval * 2 ** (self._failures - 1))
+            return random.uniform(self.base_interval, max(self.base_interval, backoff))
+
+        if time.time() - self._last_activity < self.fast_period:
+            return self.fast_interval
+
+        return min(self.idle_interval,
+                   self.base_interval * self.backoff_factor ** max(self._idle_polls - 1, 0))
+
+    async def wait(self):
+        """Sleep until the next poll is due or wake() is called. Returns the planned delay."""
+        delay = self.next_delay()
+        self._loop = asyncio.get_running_loop()
+        self._wake_event = asyncio.Event()
+        try:
+            await asyncio.wait_for(self._wake_event.wait(), delay)
+        except asyncio.TimeoutError:
+            pass
+        return delay
+
+    def wake(self):
+        """Cut the current wait short and poll fast again. Safe to call from any thread."""
+        self.record_activity()
+        if self._loop is not None and self._wake_event is not None:
+            try:
+                self._loop.call_soon_threadsafe(self._wake_event.set)
+            except RuntimeError:
+                # The event loop has already been closed
+                pass
 
 
-def open_file_with_default_app(file_path):
+class StreamChatProxy:
     """
-    Open a file with the default application for its file type.
+    Local proxy for the AnythingLLM API that reads replies aloud while the LLM is still writing them.
 
-    Args:
-        file_path (str): Path to the file to open
+    Every request is passed on to AnythingLLM and the answer is sent back
+    unchanged, chunk by chunk. Replies of the stream-chat endpoints are also
+    decoded on the way through (server-sent events) and their text is handed
+    to the listener, which turns complete sentences into speech. Point your
+    AnythingLLM API client at http://host:port/api instead of the server.
     """
-    if os.name == 'nt':  # Windows
-        os.startfile(file_path)
-    elif sys.platform == 'darwin':  # macOS
-        subprocess.run(['open', file_path], check=False)
-    else:  # Linux
-        subprocess.run(['xdg-open', file_path], check=False)
 
+    STREAM_CHAT_PATH = re.compile(r'/workspace/([^/]+)/(?:thread/[^/]+/)?stream-chat/?$')
+    # Hop-by-hop headers, and the ones requests recomputes
+    SKIP_HEADERS = {'connection', 'keep-alive', 'proxy-authenticate', 'proxy-authorization', 'te',
+                    'trailers', 'transfer-encoding', 'upgrade', 'host', 'content-length',
+                    'content-encoding', 'accept-encoding'}
 
-class NonBlockingConsole:
-    """Improved non-blocking input handler that works cross-platform without PyWin32."""
+    def __init__(self, upstream_url, listener, host="127.0.0.1", port=3002, timeout=(3, 300)):
+        """
+        Args:
+            upstream_url (str): The AnythingLLM API address (base_url), only scheme and host are used
+            listener: Object with start_live_reply, add_live_text and finish_live_reply
+            host (str): Address to listen on
+            port (int): Port to listen on
+            timeout (tuple): Connect and read timeout for AnythingLLM, the read timeout is per chunk
+        """
+        parts = urlsplit(upstream_url)
+        self.upstream = f"{parts.scheme}://{parts.netloc}"
+        self.listener = listener
+        self.host = host
+        self.port = port
+        self.timeout = timeout
+        self.session = requests.Session()
+        self._server = None
 
-    def __init__(self):
-        self.timeout = 0.1  # 100ms timeout
+    def start(self):
+        """Start serving. Returns False if the port could not be opened."""
+        proxy = self
 
-        # Set up terminal for Unix systems
-        if os.name != 'nt':
-            try:
-                import termios
-                # Store the terminal settings so we can restore them
-                self.fd = sys.stdin.fileno()
-                self.old_settings = termios.tcgetattr(self.fd)
-                # This is to ensure we can restore the terminal properly
-                import atexit
-                atexit.register(self.cleanup)
-            except (ImportError, IOError):
-                # Not all Unix-like systems support termios
-                pass
+        class ProxyHandler(BaseHTTPRequestHandler):
+            # Chunked answers reach clients piece by piece
+            protocol_version = "HTTP/1.1"
 
-    def cleanup(self):
-        """Restore terminal settings on exit for Unix systems"""
-        if os.name != 'nt':
-            try:
-                import termios
-                termios.tcsetattr(self.fd, termios.TCSADRAIN,
-                                  self.old_settings)
-            except (ImportError, AttributeError, IOError):
+            def _forward(self):
+                proxy.forward(self)
+
+            do_GET = do_POST = do_PUT = do_PATCH = do_DELETE = _forward
+
+            def log_message(self, format, *args):
                 pass
 
-    def check_input(self):
-        """Check if any key is pressed. Works on Windows, Linux and macOS."""
-        if os.name == 'nt':  # Windows
-            try:
-                import msvcrt
-                if msvcrt.kbhit():
-                    return msvcrt.getch().decode('utf-8', errors='ignore')
-                return None
-            except ImportError:
-                return None
-        else:  # Unix-like systems
+        try:
+            self._server = ThreadingHTTPServer((self.host, self.port), ProxyHandler)
+        except OSError as e:
+            print(f"Could not start stream proxy on {self.host}:{self.port}: {e}")
+            return False
+        self._server.daemon_threads = True
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        print(f"Stream proxy for {self.upstream} listening on http://{self.host}:{self.port}/api")
+        return True
+
+    def stop(self):
+        """Stop serving."""
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+    def forward(self, handler):
+        """Pass one request on to AnythingLLM and stream the answer back."""
+        body = handler.rfile.read(int(handler.headers.get('Content-Length') or 0))
+        headers = {key: value for key, value in handler.headers.items()
+                   if key.lower() not in self.SKIP_HEADERS}
+        # Uncompressed, so the events can be read as they pass
+        headers['Accept-Encoding'] = 'identity'
+        try:
+            upstream = self.session.request(
+                handler.command, self.upstream + handler.path, headers=headers,
+                data=body or None, stream=True, timeout=self.timeout)
+        except requests.exceptions.RequestException as e:
+            handler.send_error(502, f"AnythingLLM is not reachable: {e}")
+            return
+
+        with upstream:
+            handler.send_response(upstream.status_code)
+            for key, value in upstream.headers.items():
+                if key.lower() not in self.SKIP_HEADERS:
+                    handler.send_header(key, value)
+            # No length is known up front, the answer is passed on in chunks as it arrives
+            handler.send_header('Transfer-Encoding', 'chunked')
+            handler.send_header('Connection', 'close')
+            handler.end_headers()
+            handler.close_connection = True
+
+            reply = None
+            match = self.STREAM_CHAT_PATH.search(handler.path.split('?')[0])
+            if handler.command == 'POST' and match and upstream.status_code == 200:
+                try:
+                    prompt = json.loads(body or b'{}').get('message', '')
+                except (ValueError, AttributeError):
+                    prompt = ''
+                reply = self.listener.start_live_reply(match.group(1), prompt)
+
+            client_connected = True
+            pending = b""
+            chat_id = None
+            error = None
             try:
-                import termios
-                import tty
+                for data in upstream.iter_content(chunk_size=None):
+                    if client_connected and data:
+                        try:
+                            handler.wfile.write(b"%x\r\n%s\r\n" % (len(data), data))
+                            handler.wfile.flush()
+                        except OSError:
+                            # Keep reading, AnythingLLM still finishes and stores the reply
+                            client_connected = False
+                    if reply is None:
+                        continue
+                    pending += data
+                    *lines, pending = pending.split(b"\n")
+                    for line in lines:
+                        event = self._parse_event(line)
+                        if not event:
+                            continue
+                        if event.get('error') or event.get('type') == 'abort':
+                            error = event.get('error') or "aborted"
+                        if event.get('type') in ('textResponseChunk', 'textResponse') and event.get('textResponse'):
+                            self.listener.add_live_text(reply, event['textResponse'])
+                        chat_id = event.get('chatId') or chat_id
+            except requests.exceptions.RequestException as e:
+                error = str(e)
+            finally:
+                if client_connected:
+                    try:
+                        handler.wfile.write(b"0\r\n\r\n")
+                    except OSError:
+                        pass
+                if reply is not None:
+                    self.listener.finish_live_reply(reply, chat_id, error)
+
+    @staticmethod
+    def _parse_event(line):
+        """Decode one server-sent event line, or return None."""
+        line = line.strip()
+        if not line.startswith(b"data:"):
+            return None
+        try:
+            event = json.loads(line[5:])
+        except ValueError:
+            return None
+        return event if isinstance(event, dict) else None
 
-                # Change terminal settings
-                tty.setcbreak(sys.stdin.fileno())
 
-                # Check if data is available to read
-                if select.select([sys.stdin], [], [], self.timeout)[0]:
-                    key = sys.stdin.read(1)
-                    return key
-                return None
-            except (ImportError, IOError):
-                # Fallback for systems without termios
-                if select.select([sys.stdin], [], [], self.timeout)[0]:
-                    return sys.stdin.read(1)
-                return None
+class ControlServer:
+    """
+    Local endpoint to read and change the TTS settings while the monitor runs.
+
+    GET /settings returns the current settings as JSON. POST /settings with a
+    JSON object such as {"f5tts_speed": 1.2} applies it to the next reply,
+    the same way a change in the settings menu does.
+    """
+
+    def __init__(self, monitor, host="127.0.0.1", port=9478):
+        """
+        Args:
+            monitor: Object with a settings snapshot and apply_settings
+            host (str): Address to listen on
+            port (int): Port to listen on
+        """
+        self.monitor = monitor
+        self.host = host
+        self.port = port
+        self._server = None
+
+    def start(self):
+        """Start serving. Returns False if the port could not be opened."""
+        monitor = self.monitor
+
+        class ControlHandler(BaseHTTPRequestHandler):
+            def _send_json(self, status, data):
+                body = json.dumps(data, indent=2).encode('utf-8')
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def do_GET(self):
+                if self.path.split('?')[0] != '/settings':
+                    self.send_error(404)
+                    return
+                self._send_json(200, monitor.settings.to_dict())
+
+            def do_POST(self):
+                if self.path.split('?')[0] != '/settings':
+                    self.send_error(404)
+                    return
+                try:
+                    length = int(self.headers.get('Content-Length') or 0)
+                    changes = json.loads(self.rfile.read(length) or b"{}")
+                    if not isinstance(changes, dict):
+                        raise ValueError("expected a JSON object")
+                except ValueError as e:
+                    self._send_json(400, {'errors': {'body': f"Invalid JSON: {e}"}})
+                    return
+                applied, errors = monitor.apply_settings(changes, source="control endpoint")
+                status = 400 if changes and len(errors) == len(changes) else 200
+                self._send_json(status, {'applied': applied, 'errors': errors,
+                                         'settings': monitor.settings.to_dict()})
+
+            def log_message(self, format, *args):
+                pass
+
+        try:
+            self._server = ThreadingHTTPServer(
+                (self.host, self.port), ControlHandler)
+        except OSError as e:
+            print(
+                f"Could not start control endpoint on {self.host}:{self.port}: {e}")
+            return False
+        self._server.daemon_threads = True
+        threading.Thread(target=self._server.serve_forever,
+                         daemon=True).start()
+        print(
+            f"Settings can be changed at http://{self.host}:{self.port}/settings")
+        return True
+
+    def stop(self):
+        """Stop serving."""
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
 
 
 class AnythingLLMMonitor:
@@ -262,34 +3153,70 @@ class AnythingLLMMonitor:
         self.base_url = config['base_url'].rstrip('/')
         self.api_key = config['api_key']
         self.check_interval = config['check_interval']
-        self.seen_responses = set()
+        self.seen_responses = SeenResponseStore(config['seen_window_size'])
         self.highest_chat_id = 0
         self.latest_timestamp = ""
         self.data_file = "seen_responses.json"
+        self.journal = StateJournal(
+            self.data_file, "seen_responses.journal", config['journal_compact_every'])
+        # Guards the tracking fields, seen_responses and the journal, the settings
+        # menu and the fetch thread save them while the event loop updates them
+        self._tracking_lock = threading.RLock()
         self.first_run = True
         self.running = True
         self.menu_active = False
         # Make sure we're using the value from config
         self.monitor_by = config['monitor_by']  # Options: "id" or "timestamp"
-        self.f5tts_selected_ref = "not chosen"  # Selected reference audio
         self.console = NonBlockingConsole()
         self.consecutive_failures = 0  # Track connection failures
-        self.max_failures = 10  # Exit after this many consecutive failures
+        self.max_failures = 10  # Warn after this many consecutive failures
+        # Most pages of chats to walk back in one poll
+        self.max_fetch_pages = config['max_fetch_pages']
+        # Keep-alive session for the AnythingLLM API
+        self.session = self._create_session()
+        self.api_timeout = (config['api_connect_timeout'],
+                            config['api_read_timeout'])
+        self.unchanged_polls = 0
+        self._forget_newest_page()
+        # Most responses rendering on F5-TTS at the same time
+        self.synthesis_concurrency = config['synthesis_concurrency']
+        # Latest reply wins: older replies still rendering are cancelled
+        self.preempt_stale_jobs = config['preempt_stale_jobs']
+        self.coalesce_max_chars = config['coalesce_max_chars']
+        # Replies older than this many seconds are not read out, 0 reads everything
+        self.stale_response_seconds = config['stale_response_seconds']
+        # Which workspaces are read out, with which voice and priority
+        self.workspace_rules = WorkspaceRules.from_config(config)
+        self._missing_voices = set()  # Configured voices already reported as missing
+        # Replies read out through the stream proxy, so polling does not read them again
+        self._live_jobs = set()
+        self._streamed_replies = OrderedDict()
+        self._streamed_lock = threading.Lock()
+        self.stream_proxy = None
+        self.control_server = None
+        self.poll_scheduler = AdaptivePollScheduler(
+            self.check_interval,
+            fast_interval=config['poll_fast_interval'],
+            fast_period=config['poll_fast_period'],
+            idle_interval=config['poll_idle_interval'],
+            error_max_backoff=config['poll_error_max_backoff'])
         # Show checking process flag
         self.show_checking = config['show_checking']
 
         # Store the full config in this instance
         self.config = config  # This line was missing or incorrectly implemented
 
-        # Set global TTS variables from config
-        global f5tts_client, f5tts_remove_silence, f5tts_cross_fade, f5tts_nfe, f5tts_speed, audio_player, f5tts_save_audio
-        f5tts_client = config['f5tts_client']
-        f5tts_remove_silence = config['f5tts_remove_silence']
-        f5tts_cross_fade = config['f5tts_cross_fade']
-        f5tts_nfe = config['f5tts_nfe']
-        f5tts_speed = config['f5tts_speed']
-        audio_player = config['audio_player']
-        f5tts_save_audio = config['f5tts_save_audio']
+        # TTS settings live in an immutable snapshot that is swapped as a whole on every change
+        self._settings = TTSSettings.from_config(config)
+        self._settings_lock = threading.Lock()  # Only writers take it, readers just use self.settings
+        self._config_file_values = {key: config[key] for key in TTSSettings.CONFIG_KEYS}
+
+        # Set global variables that only take effect at startup from config
+        global f5tts_cache_mb, reference_optimize, reference_max_seconds, pcm_playback
+        f5tts_cache_mb = config['f5tts_cache_mb']
+        reference_optimize = config['reference_optimize']
+        reference_max_seconds = config['reference_max_seconds']
+        pcm_playback = config['pcm_playback']
 
         # Check if API key is set
         if self.api_key == "your anythingllm api key" or not self.api_key:
@@ -302,6 +3229,108 @@ class AnythingLLMMonitor:
         # Load previously seen responses if available
         self._load_seen_responses()
 
+        # Shared F5-TTS clients for all responses, one per server
+        self.latency_model = LatencyModel(os.path.join(
+            get_app_directory("anythingllm"), "tts_latency_model.json"))
+        self.f5tts_pool = F5TTSBackendPool(
+            parse_f5tts_endpoints(self.settings.f5tts_client), self.latency_model)
+
+        # Cache of synthesized audio so identical text is never rendered twice
+        self.audio_cache = TTSAudioCache(
+            os.path.join(get_app_directory("anythingllm"), "cache"),
+            int(f5tts_cache_mb * 1024 * 1024))
+
+        # Index and compact storage of saved replies, created when the first reply is saved
+        self._audio_archive = None
+        self._archive_lock = threading.Lock()
+
+    @property
+    def audio_archive(self):
+        """The saved replies archive, created on first use so "nosave" never touches the disk."""
+        with self._archive_lock:
+            if self._audio_archive is None:
+                self._audio_archive = AudioArchive(
+                    os.path.join(get_app_directory("anythingllm"), "saved"),
+                    self.config['archive_format'], self.config['archive_max_days'],
+                    int(self.config['archive_max_mb'] * 1024 * 1024))
+            return self._audio_archive
+
+    def _close_audio_archive(self):
+        """Let the archive finish queued saves, if it was ever created."""
+        with self._archive_lock:
+            archive = self._audio_archive
+        if archive is not None:
+            archive.close()
+
+    @property
+    def settings(self):
+        """The current TTSSettings snapshot. Take it once per job and keep using that one."""
+        return self._settings
+
+    @property
+    def f5tts_selected_ref(self):
+        return self._settings.f5tts_selected_ref
+
+    def apply_settings(self, changes, source="menu"):
+        """
+        Validate setting changes and swap in a new snapshot.
+
+        Jobs that already started keep the snapshot they took, the next job
+        uses the new one. Polling and synthesis never stop for a change.
+
+        Args:
+            changes (dict): Setting name -> new value, see TTSSettings
+            source (str): Where the change came from, for the console message
+
+        Returns:
+            tuple: (applied changes, errors by setting name)
+        """
+        checked, errors = {}, {}
+        for key, value in changes.items():
+            try:
+                checked[key] = TTSSettings.check(key, value)
+            except ValueError as e:
+                errors[key] = str(e)
+
+        # A reference picked by name brings its audio file and text along
+        if 'f5tts_selected_ref' in checked and 'f5tts_ref_audio' not in checked:
+            name = checked['f5tts_selected_ref']
+            if name == "not chosen":
+                checked.update(f5tts_ref_audio="not chosen", f5tts_ref_text="")
+            else:
+                ref = next((ref for ref in scan_reference_files() if ref['name'] == name), None)
+                if ref is None:
+                    errors['f5tts_selected_ref'] = f"No reference audio named {name} in {get_reference_audio_path()}"
+                    del checked['f5tts_selected_ref']
+                else:
+                    checked.update(f5tts_ref_audio=ref['audio_path'], f5tts_ref_text=ref['text_content'])
+
+        with self._settings_lock:
+            current = self._settings
+            applied = {key: value for key, value in checked.items() if getattr(current, key) != value}
+            if applied:
+                self._settings = replace(current, **applied)
+
+        if 'f5tts_client' in applied:
+            self.f5tts_pool.set_urls(parse_f5tts_endpoints(applied['f5tts_client']))
+        shown = [f"{key}={value}" for key, value in applied.items()
+                 if key not in ('f5tts_ref_audio', 'f5tts_ref_text')]
+        if shown:
+            print(f"Settings changed from {source}: {', '.join(shown)}")
+        for key, error in errors.items():
+            print(f"Setting {key} from {source} not changed: {error}")
+        return applied, errors
+
+    def reload_config_file(self):
+        """Apply the TTS settings that changed in config_f5tts_any.txt since it was last read."""
+        config = load_config()
+        values = {key: config[key] for key in TTSSettings.CONFIG_KEYS if key in config}
+        changes = {key: value for key, value in values.items()
+                   if self._config_file_values.get(key) != value}
+        self._config_file_values.update(values)
+        if changes:
+            self.apply_settings(changes, source="config file")
+
     def _get_headers(self):
         """Generate headers for API requests."""
         headers = {'Content-Type': 'application/json'}
@@ -309,37 +3338,67 @@ class AnythingLLMMonitor:
             headers['Authorization'] = f'Bearer {self.api_key}'
         return headers
 
+    def _create_session(self):
+        """
+        Create the HTTP session used for all AnythingLLM API calls.
+
+        The session keeps connections alive between polls, sends the
+        headers once and asks for compressed responses.
+        """
+        session = requests.Session()
+        adapter = requests.adapters.HTTPAdapter(
+            pool_connections=1, pool_maxsize=4)
+        session.mount('http://', adapter)
+        session.mount('https://', adapter)
+        session.headers.update(self._get_headers())
+        session.headers.update({
+            'Accept-Encoding': 'gzip, deflate',
+            'Connection': 'keep-alive',
+        })
+        return session
+
+    def _forget_newest_page(self):
+        """Make the next poll process the newest page even if it did not change."""
+        self._newest_page_etag = None
+        self._newest_page_digest = None
+        self._pending_newest_page = None
+
     def _load_seen_responses(self):
         """Load previously seen response IDs and monitoring settings from file."""
         if os.path.exists(self.data_file):
             try:
                 with open(self.data_file, 'r') as f:
                     data = json.load(f)
-                    self.seen_responses = set(data.get('responses', []))
+                    if 'seen' in data:
+                        self.seen_responses = SeenResponseStore.from_dict(
+                            data['seen'], self.seen_responses.window_size)
+                    else:
+                        # Older versions stored every response key ever seen
+                        self.seen_responses = SeenResponseStore.from_response_ids(
+                            data.get('responses', []), self.seen_responses.window_size)
                     self.highest_chat_id = data.get('highest_chat_id', 0)
                     self.latest_timestamp = data.get('latest_timestamp', "")
                     self.monitor_by = data.get('monitor_by', "id")
-                    self.f5tts_selected_ref = data.get(
-                        'f5tts_selected_ref', "not chosen")
 
                     # Load TTS settings or use defaults
-                    global f5tts_client, f5tts_remove_silence, f5tts_cross_fade, f5tts_nfe, f5tts_speed, audio_player, f5tts_save_audio
-                    f5tts_client = data.get(
-                        'f5tts_client', "http://127.0.0.1:7860/")
-                    f5tts_remove_silence = data.get(
-                        'f5tts_remove_silence', False)
-                    f5tts_cross_fade = data.get('f5tts_cross_fade', 0.15)
-                    f5tts_nfe = data.get('f5tts_nfe', 16)
-                    f5tts_speed = data.get('f5tts_speed', 1.0)
-                    audio_player = data.get('audio_player', "playsound")
-                    f5tts_save_audio = data.get('f5tts_save_audio', "nosave")
+                    self._settings = replace(
+                        self._settings,
+                        f5tts_selected_ref=data.get('f5tts_selected_ref', "not chosen"),
+                        f5tts_client=data.get('f5tts_client', "http://127.0.0.1:7860/"),
+                        f5tts_remove_silence=data.get('f5tts_remove_silence', False),
+                        f5tts_cross_fade=data.get('f5tts_cross_fade', 0.15),
+                        f5tts_nfe=data.get('f5tts_nfe', 16),
+                        f5tts_speed=data.get('f5tts_speed', 1.0),
+                        audio_player=data.get('audio_player', "playsound"),
+                        f5tts_save_audio=data.get('f5tts_save_audio', "nosave"),
+                        f5tts_stream_mode=data.get('f5tts_stream_mode', self._settings.f5tts_stream_mode))
 
                     self.max_failures = data.get('max_failures', 10)
                     # Load show_checking setting
                     self.show_checking = data.get('show_checking', False)
 
                 print(
-                    f"Loaded {len(self.seen_responses)} previously seen responses")
+                    f"Loaded {len(self.seen_responses)} recently seen responses")
                 print(
                     f"Highest chat ID from previous run: {self.highest_chat_id}")
                 if self.latest_timestamp:
@@ -350,83 +3409,219 @@ class AnythingLLMMonitor:
                 print(
                     f"Show checking process: {'On' if self.show_checking else 'Off'}")
 
-                # Update global TTS variables if a reference is selected
-                global f5tts_ref_audio, f5tts_ref_text
+                # Look up the reference audio if one is selected
                 if self.f5tts_selected_ref != "not chosen":
                     ref_files = scan_reference_files()
                     for ref in ref_files:
                         if ref['name'] == self.f5tts_selected_ref:
-                            f5tts_ref_audio = ref['audio_path']
-                            f5tts_ref_text = ref['text_content']
+                            self._settings = replace(
+                                self._settings, f5tts_ref_audio=ref['audio_path'],
+                                f5tts_ref_text=ref['text_content'])
                             break
 
             except Exception as e:
                 print(f"Error loading seen responses: {e}")
 
-    def _save_seen_responses(self):
-        """Save seen response IDs and monitoring settings to file."""
+        self._replay_journal()
+
+    def _replay_journal(self):
+        """Apply tracking updates journaled after the last snapshot."""
+        try:
+            entries = self.journal.read_entries()
+        except Exception as e:
+            print(f"Error reading tracking journal: {e}")
+            return
+
+        for entry in entries:
+            for response_id in entry.get('seen', []):
+                self.seen_responses.add(response_id)
+            self.highest_chat_id = max(
+                self.highest_chat_id, entry.get('highest_chat_id', 0))
+            self.latest_timestamp = max(
+                self.latest_timestamp, entry.get('latest_timestamp', ""))
+
+        if entries:
+            print(
+                f"Replayed {len(entries)} tracking updates from {self.journal.journal_path}")
+
+    def _record_seen(self, new_responses):
+        """
+        Journal a batch of new responses.
+
+        Writes one line instead of the whole state; the snapshot is only
+        rewritten when the journal is due for compaction.
+        """
         try:
-            with open(self.data_file, 'w') as f:
-                json.dump({
-                    'responses': list(self.seen_responses),
+            with self._tracking_lock:
+                self.journal.append({
+                    'seen': [f"{response['workspace']}:{response['chat_id']}" for response in new_responses],
                     'highest_chat_id': self.highest_chat_id,
                     'latest_timestamp': self.latest_timestamp,
-                    'monitor_by': self.monitor_by,
-                    'f5tts_selected_ref': self.f5tts_selected_ref,
-                    'f5tts_client': f5tts_client,
-                    'f5tts_remove_silence': f5tts_remove_silence,
-                    'f5tts_cross_fade': f5tts_cross_fade,
-                    'f5tts_nfe': f5tts_nfe,
-                    'f5tts_speed': f5tts_speed,
-                    'audio_player': audio_player,
-                    'show_checking': self.show_checking,
-                    'f5tts_save_audio': f5tts_save_audio,
-                    'last_updated': datetime.now().isoformat()
-                }, f)
+                })
+                if self.journal.needs_compaction():
+                    self.journal.write_snapshot(self._state_snapshot())
+        except Exception as e:
+            print(f"Error saving seen responses: {e}")
+
+    def _state_snapshot(self):
+        """Return tracking data and monitoring settings as a dict for the snapshot file."""
+        settings = self.settings
+        with self._tracking_lock:
+            seen = self.seen_responses.to_dict()
+            highest_chat_id, latest_timestamp = self.highest_chat_id, self.latest_timestamp
+        return {
+            'seen': seen,
+            'highest_chat_id': highest_chat_id,
+            'latest_timestamp': latest_timestamp,
+            'monitor_by': self.monitor_by,
+            'f5tts_selected_ref': settings.f5tts_selected_ref,
+            'f5tts_client': settings.f5tts_client,
+            'f5tts_remove_silence': settings.f5tts_remove_silence,
+            'f5tts_cross_fade': settings.f5tts_cross_fade,
+            'f5tts_nfe': settings.f5tts_nfe,
+            'f5tts_speed': settings.f5tts_speed,
+            'audio_player': settings.audio_player,
+            'show_checking': self.show_checking,
+            'f5tts_save_audio': settings.f5tts_save_audio,
+            'f5tts_stream_mode': settings.f5tts_stream_mode,
+            'last_updated': datetime.now().isoformat()
+        }
+
+    def _save_seen_responses(self):
+        """Save seen response IDs and monitoring settings to file."""
+        try:
+            with self._tracking_lock:
+                self.journal.write_snapshot(self._state_snapshot())
+            self.latency_model.save()
 
             # Also update the config file with current settings
+            settings = self.settings
             self.config.update({
                 'base_url': self.base_url,
                 'api_key': self.api_key,
                 'check_interval': self.check_interval,
                 'monitor_by': self.monitor_by,
-                'f5tts_client': f5tts_client,
-                'f5tts_remove_silence': f5tts_remove_silence,
-                'f5tts_cross_fade': f5tts_cross_fade,
-                'f5tts_nfe': f5tts_nfe,
-                'f5tts_speed': f5tts_speed,
-                'audio_player': audio_player,
                 'show_checking': self.show_checking,
-                'f5tts_save_audio': f5tts_save_audio
             })
+            self.config.update({key: getattr(settings, key) for key in TTSSettings.CONFIG_KEYS})
             save_config(self.config)
+            self._config_file_values = {key: self.config[key] for key in TTSSettings.CONFIG_KEYS}
 
         except Exception as e:
             print(f"Error saving seen responses: {e}")
 
     def _check_failure_threshold(self):
-        """Check if consecutive failures have reached the threshold to exit."""
-        if self.consecutive_failures >= self.max_failures:
+        """Warn once when consecutive failures reach the threshold. Polling goes on with backoff."""
+        if self.consecutive_failures == self.max_failures:
             print(
                 f"\nError: Connection to AnythingLLM failed {self.consecutive_failures} times in a row.")
-            print("AnythingLLM may be offline or unreachable. Exiting program.")
-            self._save_seen_responses()  # Save data before exiting
-            self.running = False  # Signal the main loop to exit
+            print(
+                "AnythingLLM may be offline or unreachable. Will keep retrying with increasing delays.")
+            self._save_seen_responses()  # Save data in case the program is closed now
 
     def fetch_responses(self):
-        """Fetch responses from the AnythingLLM API."""
+        """
+        Fetch responses from the AnythingLLM API.
+
+        The API returns chats newest first, 20 per page. Pages are fetched
+        until one reaches a chat we already know about, so a burst of more
+        than one page of chats between two polls is not missed.
+
+        Returns:
+            dict: {'chats': [...]} sorted oldest first, or None on error
+        """
+        chats_by_id = {}
+        offset = 0
+        while True:
+            data = self._fetch_chats_page(offset)
+            if data is None:
+                # Don't process a partial walk, the tracking values would skip the missing pages
+                return None
+
+            chats = data.get('chats', [])
+            for chat in chats:
+                chats_by_id[chat.get('id', 0)] = chat
+
+            # On first run, or after tracking was reset, only the newest page is wanted
+            no_baseline = self.highest_chat_id == 0 and not self.latest_timestamp
+            if self.first_run or no_baseline or not chats or not data.get('hasPages', False):
+                break
+            if self._page_reaches_known_chats(chats):
+                break
+
+            offset += 1
+            if offset >= self.max_fetch_pages:
+                print(
+                    f"Warning: more than {self.max_fetch_pages} pages of new chats, older ones are skipped.")
+                break
+
+        if self.show_checking and offset > 0:
+            print(f"Walked {offset + 1} pages of chats")
+
+        if self._pending_newest_page:
+            self._newest_page_etag, self._newest_page_digest = self._pending_newest_page
+            self._pending_newest_page = None
+
+        # New chats can shift pages while walking, the dict removes duplicates
+        return {'chats': sorted(chats_by_id.values(), key=lambda chat: chat.get('id', 0))}
+
+    def _page_reaches_known_chats(self, chats):
+        """Check if a page of chats reaches back to chats processed before."""
+        oldest_id = min(chat.get('id', 0) for chat in chats)
+        oldest_timestamp = min(chat.get('createdAt', "") for chat in chats)
+        if self.monitor_by == "id":
+            return oldest_id <= self.highest_chat_id
+        if self.monitor_by == "timestamp":
+            return oldest_timestamp <= self.latest_timestamp
+        return oldest_id <= self.highest_chat_id and oldest_timestamp <= self.latest_timestamp
+
+    def _fetch_chats_page(self, offset):
+        """
+        Fetch one page of workspace chats.
+
+        Args:
+            offset (int): Page number, 0 is the newest page
+
+        Returns:
+            dict: The API response, or None on error
+        """
         try:
             # Use the successful endpoint from your testing
             url = f"{self.base_url}/v1/admin/workspace-chats"
 
             if self.show_checking:
-                print(f"Fetching from: {url}")
+                print(f"Fetching from: {url} (page {offset})")
+
+            # The newest page is polled over and over; let the server or the
+            # body digest tell us when it has not changed since the last poll
+            headers = {}
+            if offset == 0 and self._newest_page_etag:
+                headers['If-None-Match'] = self._newest_page_etag
 
-            response = requests.post(url, headers=self._get_headers(), json={})
+            response = self.session.post(
+                url, headers=headers, json={'offset': offset}, timeout=self.api_timeout)
+
+            if response.status_code == 304:
+                self.consecutive_failures = 0
+                self.unchanged_polls += 1
+                return {'chats': [], 'unchanged': True}
 
             if response.status_code == 200:
                 # Reset the failure counter on success
                 self.consecutive_failures = 0
+
+                if offset == 0:
+                    digest = hashlib.sha1(response.content).hexdigest()
+                    if digest == self._newest_page_digest:
+                        # Same bytes as last time, skip parsing and processing
+                        self.unchanged_polls += 1
+                        if self.show_checking:
+                            print("Newest page unchanged since last check")
+                        return {'chats': [], 'unchanged': True}
+                    # Only remembered once the whole walk succeeded, see fetch_responses
+                    self._pending_newest_page = (
+                        response.headers.get('ETag'), digest)
+
                 data = response.json()
 
                 if self.show_checking:
@@ -437,6 +3632,8 @@ class AnythingLLMMonitor:
             else:
                 # Increment failure counter on error responses
                 self.consecutive_failures += 1
+                metrics.inc('anythingllm_api_errors_total',
+                            reason=f"http_{response.status_code}")
                 print(
                     f"Error fetching workspace chats: {response.status_code} - {response.text}")
                 self._check_failure_threshold()
@@ -444,6 +3641,8 @@ class AnythingLLMMonitor:
         except Exception as e:
             # Increment failure counter on exceptions
             self.consecutive_failures += 1
+            metrics.inc('anythingllm_api_errors_total',
+                        reason=type(e).__name__)
             print(f"Exception while fetching responses: {e}")
             self._check_failure_threshold()
             return None
@@ -525,297 +3724,762 @@ class AnythingLLMMonitor:
                         'timestamp': timestamp
                     })
 
-                    self.seen_responses.add(response_id)
+                    self.seen_responses.add(response_id)
+
+                    # Update tracking values if needed
+                    if chat_id > self.highest_chat_id:
+                        self.highest_chat_id = chat_id
+                    if timestamp > self.latest_timestamp:
+                        self.latest_timestamp = timestamp
+
+                except json.JSONDecodeError as e:
+                    print(
+                        f"Error parsing response JSON for chat {chat_id}: {e}")
+
+        return new_responses
+
+    def notify_new_responses(self, new_responses):
+        """Print new responses. Synthesis and playback happen in the pipeline stages."""
+        if not new_responses:
+            return
+
+        print(f"\n{'='*60}")
+        print(
+            f"Found {len(new_responses)} new AI responses at {datetime.now().isoformat()}")
+        print(f"{'='*60}")
+
+        for idx, response in enumerate(new_responses, 1):
+            print(f"\n--- Response {idx} ---")
+            ai_reply = response['content']
+            print(f"Response: {ai_reply}")
+            print("-" * 40)
+
+    def process_tts(self, ai_reply, response_content=None, settings=None):
+        """
+        Start Text-to-Speech for a response.
+
+        Looks the audio up in the cache and queues everything else on the
+        backend pool. Does not wait for synthesis; the returned job is played
+        by play_speech_job.
+
+        Args:
+            ai_reply (str): Text to speak
+            response_content (dict): The response the text belongs to
+            settings (TTSSettings): Snapshot to use for the whole job, the current one if None
+
+        Returns:
+            SpeechJob: The queued job, or None if TTS is skipped
+        """
+        if settings is None:
+            settings = self.settings
+
+        # Skip TTS if no reference audio is selected
+        workspace = (response_content or {}).get('workspace')
+        ref_audio, ref_text = self.workspace_voice(workspace, settings)
+        if ref_audio == "not chosen":
+            print("F5-TTS reference audio not selected. Skipping TTS.")
+            return None
+
+        job = SpeechJob(ai_reply, response_content)
+        job.ref_audio, job.ref_text = ref_audio, ref_text
+        job.settings = settings
+        job.priority = self.workspace_rules.priority(workspace)
+
+        # Streaming only makes sense with the in-app player, the default
+        # media player can only be handed one finished file
+        if settings.f5tts_stream_mode == "stream" and settings.audio_player == "playsound":
+            job.chunks = split_text_for_streaming(
+                ai_reply, settings.f5tts_first_chunk_chars, settings.f5tts_chunk_chars)
+        if len(job.chunks) <= 1:
+            job.chunks = [ai_reply]
+
+        # Identical text with identical settings plays straight from the cache
+        cached_futures = []
+        for chunk in job.chunks:
+            cache_key = self._cache_key(chunk, job)
+            cached_audio_path = self.audio_cache.get(
+                cache_key) if cache_key else None
+            if cached_audio_path:
+                job.cached_chunks += 1
+                cached_futures.append(_completed_future((cached_audio_path,)))
+            else:
+                cached_futures.append(cache_key)
+
+        if job.cached_chunks == len(job.chunks):
+            print("Found this reply in the audio cache, playing it right away.")
+            job.futures = cached_futures
+            return job
+
+        # Estimate processing time of the chunks that still have to be rendered
+        job.estimated_time = self.estimate_synthesis_time(
+            [chunk for chunk, entry in zip(job.chunks, cached_futures) if not isinstance(entry, Future)],
+            settings)
+        if job.estimated_time is not None:
+            print(
+                f"I have calculated that this is going to take approximately {job.estimated_time:.1f} seconds.")
+        else:
+            # First time processing
+            print("First time running F5-TTS. Timing how long it takes...")
+        if job.cached_chunks:
+            print(
+                f"{job.cached_chunks} of {len(job.chunks)} chunks came from the audio cache.")
+        if len(job.chunks) > 1:
+            print(f"Streaming reply in {len(job.chunks)} chunks.")
+
+        # All chunks are queued on the backend pool at once, so with several
+        # F5-TTS servers they render in parallel. Playback stays in text order.
+        job.start_time = time.time()
+        job.futures = [entry if isinstance(entry, Future)
+                       else self._submit_synthesis(chunk, entry, job)
+                       for chunk, entry in zip(job.chunks, cached_futures)]
+        return job
+
+    def process_tts_batch(self, batch, settings=None):
+        """
+        Start Text-to-Speech for several short responses with one F5-TTS request.
+
+        Every request costs the same fixed time for queueing and preparing the
+        reference, which is most of the time of a one-line reply. The texts are
+        joined with a pause in between, rendered together, and the audio is cut
+        back into one file per response at the pauses (split_wav_at_pauses).
+        Texts found in the audio cache are not rendered again.
+
+        Args:
+            batch (list): (text, response) pairs of one workspace in reading order
+            settings (TTSSettings): Snapshot to use for all jobs, the current one if None
+
+        Returns:
+            list: One SpeechJob per response, empty if TTS is skipped
+        """
+        if settings is None:
+            settings = self.settings
+        workspace = batch[0][1].get('workspace')
+        ref_audio, ref_text = self.workspace_voice(workspace, settings)
+        if ref_audio == "not chosen":
+            print("F5-TTS reference audio not selected. Skipping TTS.")
+            return []
+
+        jobs, to_render = [], []
+        for text, response in batch:
+            job = SpeechJob(text, response)
+            job.ref_audio, job.ref_text = ref_audio, ref_text
+            job.settings = settings
+            job.priority = self.workspace_rules.priority(workspace)
+            job.chunks = [text]
+            cache_key = self._cache_key(text, job)
+            cached_audio_path = self.audio_cache.get(cache_key) if cache_key else None
+            if cached_audio_path:
+                job.cached_chunks = 1
+                job.futures = [_completed_future((cached_audio_path,))]
+            else:
+                to_render.append((job, cache_key))
+            jobs.append(job)
+
+        if len(to_render) == 1:
+            job, cache_key = to_render[0]
+            job.futures = [self._submit_synthesis(job.text, cache_key, job)]
+        elif to_render:
+            self._submit_coalesced(to_render)
+        return jobs
+
+    def _submit_coalesced(self, to_render):
+        """Render the texts of several jobs in one request and give every job its part of the audio."""
+        texts = [job.text if job.text.rstrip()[-1:] in ".!?" else job.text.rstrip() + "."
+                 for job, _ in to_render]
+        carrier = SpeechJob(COALESCE_SEPARATOR.join(texts), None)
+        first = to_render[0][0]
+        carrier.workspace, carrier.priority, carrier.settings = first.workspace, first.priority, first.settings
+        carrier.ref_audio, carrier.ref_text = first.ref_audio, first.ref_text
+        carrier.estimated_time = self.estimate_synthesis_time([carrier.text], first.settings)
+        message = f"Reading {len(to_render)} short replies with one F5-TTS request"
+        if carrier.estimated_time is not None:
+            message += f", about {carrier.estimated_time:.1f} seconds"
+        print(message + ".")
+        metrics.inc('f5tts_coalesced_replies_total', len(to_render))
+
+        for job, _ in to_render:
+            job.start_time = carrier.start_time
+            job.futures = [Future()]
+            # The shared request only stops once nobody waits for any of its parts
+            job.cancel_event.add_callback(
+                lambda: carrier.cancel() if all(job.cancelled for job, _ in to_render) else None)
+
+        def split_result(done):
+            parts = [job.futures[0] for job, _ in to_render]
+            try:
+                audio_path = done.result()[0]
+                base = os.path.splitext(audio_path)[0]
+                paths = split_wav_at_pauses(audio_path, [len(text) + len(COALESCE_SEPARATOR) for text in texts],
+                                            [f"{base}_part{index}.wav" for index in range(len(texts))])
+            except BaseException as e:
+                for part in parts:
+                    if part.set_running_or_notify_cancel():
+                        part.set_exception(SynthesisCancelled("Synthesis cancelled") if done.cancelled() else e)
+                return
+            for (job, cache_key), part, path in zip(to_render, parts, paths):
+                self._cache_audio(cache_key, path)
+                if part.set_running_or_notify_cancel():
+                    part.set_result((path,))
+
+        self._submit_synthesis(carrier.text, None, carrier).add_done_callback(split_result)
+
+    def _can_coalesce(self, text):
+        """Check if a reply is short enough to share an F5-TTS request with other replies."""
+        return np is not None and bool(self.coalesce_max_chars) and len(text) <= self.coalesce_max_chars
+
+    async def play_speech_job(self, job):
+        """
+        Play a job as soon as its first chunk is ready.
+
+        Stops whatever is playing, unless it has a higher priority (then the
+        job waits for it, see PlaybackArbiter), then keeps feeding the remaining
+        chunks to the player in a separate task so the next job can take over.
+
+        Args:
+            job (SpeechJob): Job returned by process_tts
+        """
+        global sound, FIRSTIME
+        loop = asyncio.get_running_loop()
+
+        try:
+            first_future = await job.next_future(0)
+            if first_future is None:
+                # A streamed reply that had nothing to speak
+                return
+            first_audio_path = (await _await_chunk(first_future))[0]
+        except SynthesisCancelled:
+            print("Skipped a reply that was replaced by a newer one.")
+            return
+        except Exception as e:
+            job.cancel()
+            elapsed_time = time.time() - job.start_time
+            print(
+                f"Tried with error, lost {elapsed_time:.1f} seconds.")
+            print(
+                f"Error in TTS processing: {e}. You have to have F5-tts installed and running in the background. Skipping TTS.")
+            return
+
+        if len(job.futures) == 1 and not job.live:
+            if not job.cached_chunks:
+                self._record_tts_timing(job, time.time() - job.start_time)
+
+            if not await self._acquire_speaker(job):
+                return
+            player = None
+            try:
+                # Stop currently playing sound if needed, then copy and play the file
+                await loop.run_in_executor(None, self._stop_current_sound)
+                playback_file = await loop.run_in_executor(
+                    None, self._store_audio_file, first_audio_path, job.response, job.settings)
+                self._play_audio_file(playback_file, job.settings)
+                player = sound if playback_file and job.settings.audio_player == "playsound" else None
+            finally:
+                self._spawn(self.speaker.hold(job.priority, player))
+            metrics.observe('f5tts_time_to_first_audio_seconds',
+                            time.time() - job.created_time)
+            return
+
+        print(
+            f"First audio ready after {time.time() - job.start_time:.1f} seconds.")
+
+        if not await self._acquire_speaker(job):
+            return
+        stream = None
+        try:
+            await loop.run_in_executor(None, self._stop_current_sound)
+
+            stream = StreamingPlayback()
+            stream.add_chunk(first_audio_path)
+            stream.start()
+        finally:
+            self._spawn(self.speaker.hold(job.priority, stream))
+        sound = stream
+        FIRSTIME = False
+        metrics.inc('f5tts_playback_starts_total')
+        metrics.observe('f5tts_time_to_first_audio_seconds',
+                        time.time() - job.created_time)
 
-                    # Update tracking values if needed
-                    if chat_id > self.highest_chat_id:
-                        self.highest_chat_id = chat_id
-                    if timestamp > self.latest_timestamp:
-                        self.latest_timestamp = timestamp
+        self._spawn(self._feed_stream(job, stream, first_audio_path))
 
-                except json.JSONDecodeError as e:
-                    print(
-                        f"Error parsing response JSON for chat {chat_id}: {e}")
+    async def _acquire_speaker(self, job):
+        """
+        Wait until the job may use the speaker, see PlaybackArbiter.
 
-        return new_responses
+        Returns:
+            bool: True if the job should play now, False if a newer reply of
+            its workspace replaced it while it waited (the speaker is free again)
+        """
+        await self.speaker.acquire(job.priority)
+        lane = self._lanes.get(job.workspace)
+        if job.cancelled or (lane is not None and job.sequence < lane['preempted_below']):
+            self.speaker.release()
+            print("Skipped a reply that was replaced by a newer one.")
+            return False
+        return True
 
-    def notify_new_responses(self, new_responses):
-        """Notify about new responses and perform TTS."""
-        if not new_responses:
+    async def _feed_stream(self, job, stream, first_audio_path):
+        """Wait for chunks 2..n in order and queue them for playback."""
+        loop = asyncio.get_running_loop()
+        chunk_paths = [first_audio_path]
+        try:
+            idx = 2
+            while True:
+                # Streamed replies get more chunks while they play
+                future = await job.next_future(idx - 1)
+                if future is None:
+                    break
+                if stream.stopped:
+                    print(
+                        f"Playback was stopped, skipping the remaining {len(job.futures) - idx + 1} chunks.")
+                    job.cancel()
+                    return
+                chunk_path = (await _await_chunk(future))[0]
+                chunk_paths.append(chunk_path)
+                stream.add_chunk(chunk_path)
+                if self.show_checking:
+                    print(f"Chunk {idx}/{len(job.futures)} ready")
+                idx += 1
+        except SynthesisCancelled:
+            print(
+                f"A newer reply arrived, stopped rendering this one after {len(chunk_paths)} of {len(job.futures)} chunks.")
+            return
+        except Exception as e:
+            job.cancel()
+            print(
+                f"Error in TTS processing: {e}. Rendered {len(chunk_paths)} of {len(job.futures)} chunks.")
             return
+        finally:
+            stream.finish()
 
-        print(f"\n{'='*60}")
-        print(
-            f"Found {len(new_responses)} new AI responses at {datetime.now().isoformat()}")
-        print(f"{'='*60}")
+        if not job.cached_chunks and not job.live:
+            self._record_tts_timing(job, time.time() - job.start_time)
 
-        for idx, response in enumerate(new_responses, 1):
-            print(f"\n--- Response {idx} ---")
-            ai_reply = response['content']
-            print(f"Response: {ai_reply}")
-            print("-" * 40)
+        # Only the saved copy needs the chunks joined, playback used them directly
+        if job.settings.f5tts_save_audio == "save" and job.response:
+            await loop.run_in_executor(None, self._save_joined_chunks, chunk_paths, job.response,
+                                       job.settings.f5tts_cross_fade)
 
-            # Pass the full response to process_tts
-            self.process_tts(ai_reply, response)
+    def _save_joined_chunks(self, chunk_paths, response_content, cross_fade):
+        """Join streamed chunks with crossfades and hand the result to the archive."""
+        joined_path = None
+        try:
+            joined_path = self.audio_archive.staging_path()
+            join_start = time.time()
+            join_wav_files(chunk_paths, joined_path,
+                           cross_fade=float(cross_fade))
+            metrics.observe('f5tts_audio_io_duration_seconds',
+                            time.time() - join_start, operation="join")
+            self.audio_archive.add(joined_path, response_content, move=True)
+        except Exception as e:
+            print(f"Error saving audio file: {e}")
+            # The archive only cleans up staging files it has taken
+            if joined_path and os.path.exists(joined_path):
+                os.remove(joined_path)
 
-    def process_tts(self, ai_reply, response_content=None):
-        """Process Text-to-Speech for a response."""
-        global f5tts_client, f5tts_ref_audio, f5tts_ref_text, f5tts_remove_silence, f5tts_cross_fade, f5tts_nfe, f5tts_speed, audio_player, f5tts_save_audio
-        global tts_timing_data, tts_processed_count
+    def _submit_synthesis(self, text, cache_key, job):
+        """
+        Queue text for synthesis on the backend pool, in the lane of the job's workspace.
 
-        # Skip TTS if no reference audio is selected
-        if self.f5tts_selected_ref == "not chosen" or f5tts_ref_audio == "not chosen":
-            print("F5-TTS reference audio not selected. Skipping TTS.")
-            return
+        Returns:
+            Future: Resolves to the result of the /basic_tts call
+        """
+        future = self.f5tts_pool.submit(
+            cancel_event=job.cancel_event, priority=job.priority, lane=job.workspace,
+            **self._tts_request(text, job))
 
-        # Count words and characters for timing info
-        number_of_words = len(ai_reply.split())
-        char_count = len(ai_reply)
-
-        # Calculate estimated processing time based on historical data
-        estimated_time = None
-        if tts_timing_data:
-            # Use simple linear regression if we have enough data points
-            if len(tts_timing_data) >= 3:
-                # Calculate average time per character
-                total_chars = sum(item[0] for item in tts_timing_data)
-                total_time = sum(item[1] for item in tts_timing_data)
-                avg_time_per_char = total_time / total_chars
-                estimated_time = avg_time_per_char * char_count
-                print(
-                    f"I have calculated that this is going to take approximately {estimated_time:.1f} seconds.")
-            else:
-                # Simple estimation based on most recent processing
-                recent_time_per_char = tts_timing_data[-1][1] / \
-                    tts_timing_data[-1][0]
-                estimated_time = recent_time_per_char * char_count
-                print(
-                    f"Based on recent processing, this will take approximately {estimated_time:.1f} seconds.")
-        else:
-            # First time processing
-            print("First time running F5-TTS. Timing how long it takes...")
+        def cache_result(done):
+            if not done.cancelled() and done.exception() is None:
+                self._cache_audio(cache_key, done.result()[0])
 
-        # Recalibrate timing if the character count is between 3000-4000 or never done before
-        should_recalibrate = (
-            char_count >= 3000 and char_count <= 4000) or not tts_timing_data
-        if should_recalibrate:
-            print(
-                "Character count in calibration range. Will update timing model after processing.")
+        if cache_key:
+            future.add_done_callback(cache_result)
+        return future
 
-        start_time = time.time()
+    def _cache_key(self, text, job):
+        """Return the audio cache key for text with the voice and settings of a job, or None."""
+        settings = job.settings
+        try:
+            return self.audio_cache.make_key(
+                job.ref_audio, job.ref_text, text, settings.f5tts_nfe, settings.f5tts_speed,
+                settings.f5tts_cross_fade, settings.f5tts_remove_silence)
+        except Exception as e:
+            print(f"Audio cache lookup failed: {e}")
+            return None
 
+    def _cache_audio(self, cache_key, audio_path):
+        """Store synthesized audio in the cache. Errors are reported, not raised."""
+        if not cache_key:
+            return
         try:
-            # 5 seconds or adjust as needed
-            client = Client(f5tts_client)
-            result = client.predict(
-                ref_audio_input=handle_file(f5tts_ref_audio),
-                ref_text_input=f5tts_ref_text,
-                gen_text_input=ai_reply,
-                remove_silence=f5tts_remove_silence,
-                cross_fade_duration_slider=float(f5tts_cross_fade),
-                nfe_slider=int(f5tts_nfe),
-                speed_slider=float(f5tts_speed),
-                api_name="/basic_tts",
-            )
-            source_audio_path = result[0]
-            end_time = time.time()
-            elapsed_time = end_time - start_time
-
-            # Update timing data
-            if should_recalibrate:
-                tts_timing_data.append((char_count, elapsed_time))
-                # Keep only the last 5 timing data points to adapt to changes in system performance
-                if len(tts_timing_data) > 5:
-                    tts_timing_data.pop(0)
-
-            tts_processed_count += 1
+            self.audio_cache.put(cache_key, audio_path)
+        except Exception as e:
+            print(f"Error storing audio in cache: {e}")
 
-            print(
-                f"{number_of_words} words ({char_count} characters) took {elapsed_time:.1f} seconds.")
+    def estimate_synthesis_time(self, chunks, settings=None):
+        """
+        Estimate how long rendering text chunks will take with the latency model.
 
-            if estimated_time is not None:
-                error_percentage = abs(
-                    estimated_time - elapsed_time) / elapsed_time * 100
-                print(f"Estimation accuracy: {100 - error_percentage:.1f}%")
+        Chunks are spread over the backends, so the sum of the chunk
+        predictions is divided by the number of chunks rendering at once.
 
-            global FIRSTIME
-            global sound
+        Args:
+            chunks (list): Text chunks to render
+            settings (TTSSettings): Snapshot with the NFE and speed, the current one if None
 
-            # Stop currently playing sound if needed
-            if FIRSTIME is False:
-                if sound is not None and hasattr(sound, 'is_alive') and sound.is_alive():
-                    print(
-                        "Sound is still playing! Stopping it before playing new sound.")
-                    try:
-                        # Force stop the sound
-                        if hasattr(sound, 'stop'):
-                            sound.stop()
-
-                        # If we're using playsound on Windows, we may need a different approach
-                        if os.name == 'nt' and audio_player == "playsound":
-                            import ctypes
-                            # Try to use winmm to stop all sounds
-                            try:
-                                winmm = ctypes.WinDLL('winmm')
-                                winmm.PlaySoundW(None, 0, 0)
-                            except:
-                                pass
-
-                        # Make sure to wait for the sound to actually stop
-                        time.sleep(0.5)
+        Returns:
+            float: Estimated seconds, or None before the model has any samples
+        """
+        if not chunks:
+            return 0.0
+        if settings is None:
+            settings = self.settings
+        predictions = [self.latency_model.predict(len(chunk), len(chunk.split()),
+                                                  int(settings.f5tts_nfe), float(settings.f5tts_speed))
+                       for chunk in chunks]
+        if None in predictions:
+            return None
+        parallel = max(1, min(len(self.f5tts_pool.backends), len(chunks)))
+        return sum(predictions) / parallel
 
-                        # Set sound to None to avoid referencing stopped thread
-                        sound = None
+    def prepare_speech_text(self, ai_reply, settings=None):
+        """
+        Clean a reply for speech when speech_cleanup is on and report what it saved.
 
-                    except Exception as e:
-                        print(f"Error stopping sound: {e}")
+        Args:
+            ai_reply (str): The reply text from AnythingLLM
+            settings (TTSSettings): Snapshot to use, the current one if None
 
-            # Determine which file to use for playback
-            playback_file = None
+        Returns:
+            str: Text to synthesize
+        """
+        if settings is None:
+            settings = self.settings
+        if not settings.speech_cleanup:
+            return ai_reply
+
+        text = clean_text_for_speech(ai_reply, settings.speech_code_blocks)
+        removed_chars = len(ai_reply) - len(text)
+        if removed_chars <= 0:
+            return text
+
+        metrics.inc('speech_cleanup_removed_chars_total', removed_chars)
+        message = (f"Text cleanup removed {removed_chars} of {len(ai_reply)} characters "
+                   f"({removed_chars / len(ai_reply) * 100:.0f}%)")
+        before = self.latency_model.predict(len(ai_reply), len(ai_reply.split()),
+                                            int(settings.f5tts_nfe), float(settings.f5tts_speed))
+        after = self.latency_model.predict(len(text), len(text.split()),
+                                           int(settings.f5tts_nfe), float(settings.f5tts_speed)) if text else 0.0
+        if before is not None and after is not None:
+            message += f", saving about {max(0.0, before - after):.1f} seconds of synthesis"
+        print(message + ".")
+        return text
+
+    def _tts_request(self, text, job):
+        """Build the /basic_tts arguments for a piece of text of a job."""
+        settings = job.settings
+        return dict(
+            ref_audio_input=handle_file(job.ref_audio),
+            ref_text_input=job.ref_text,
+            gen_text_input=text,
+            remove_silence=settings.f5tts_remove_silence,
+            cross_fade_duration_slider=float(settings.f5tts_cross_fade),
+            nfe_slider=int(settings.f5tts_nfe),
+            speed_slider=float(settings.f5tts_speed),
+            api_name="/basic_tts",
+        )
+
+    def workspace_voice(self, workspace, settings=None):
+        """
+        Return the reference audio path and text for a workspace.
 
-            # CASE 1: Save mode is enabled - use saved file for both purposes
-            if f5tts_save_audio == "save" and response_content:
-                try:
-                    # Create a filename from the first 30 chars of content and current time
-                    content_prefix = response_content.get('prompt', '')[
-                        :30].strip()
-                    if not content_prefix:  # Fallback if prompt not available
-                        content_prefix = "ai_response"
+        Workspaces without a voice in workspace_voices, or whose voice file is
+        missing, use the reference selected in the settings snapshot.
 
-                    # Clean filename (remove invalid characters)
-                    content_prefix = ''.join(
-                        c for c in content_prefix if c.isalnum() or c.isspace())
-                    content_prefix = content_prefix.replace(' ', '_').lower()
+        Returns:
+            tuple: (audio path, reference text), the path is "not chosen" if there is no reference
+        """
+        if settings is None:
+            settings = self.settings
+        voice = self.workspace_rules.voice(workspace)
+        if voice:
+            for ref in scan_reference_files():
+                if voice in (ref['name'], os.path.splitext(ref['name'])[0]):
+                    return ref['audio_path'], ref['text_content']
+            if voice not in self._missing_voices:
+                self._missing_voices.add(voice)
+                print(f"Voice '{voice}' for workspace {workspace} was not found in the reference folder, "
+                      f"using {settings.f5tts_selected_ref}.")
+        if settings.f5tts_selected_ref == "not chosen":
+            return "not chosen", ""
+        return settings.f5tts_ref_audio, settings.f5tts_ref_text
+
+    def start_live_reply(self, workspace, prompt):
+        """
+        Start reading a reply that is still streaming through the stream proxy.
 
-                    # Add timestamp
-                    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        Called from a proxy thread.
 
-                    # Get the app directory
-                    app_dir = get_app_directory("anythingllm")
+        Returns:
+            LiveSpeechJob: The job the text is collected in, or None if the reply is not read out
+        """
+        response = {
+            'workspace': workspace,
+            'workspace_name': workspace,
+            'chat_id': None,
+            'prompt': prompt,
+            'content': "",
+            'timestamp': datetime.now(timezone.utc).isoformat(),
+            'found_time': time.time(),
+        }
+        job = LiveSpeechJob(response, self._loop)
+        with self._streamed_lock:
+            self._live_jobs.add(job)
+        if not self.workspace_rules.is_allowed(workspace):
+            job.cancel()
+            return job
+        settings = job.settings = self.settings
+        job.ref_audio, job.ref_text = self.workspace_voice(workspace, settings)
+        if job.ref_audio == "not chosen":
+            print("F5-TTS reference audio not selected. Skipping TTS.")
+            job.cancel()
+            return job
+        job.priority = self.workspace_rules.priority(workspace)
+        job.assembler = SentenceAssembler(
+            settings.f5tts_first_chunk_chars, settings.f5tts_chunk_chars,
+            clean=(lambda text: clean_text_for_speech(text, settings.speech_code_blocks))
+            if settings.speech_cleanup else None)
+        print(f"Reading a streamed reply in workspace {workspace} while it is written...")
+        return job
+
+    def add_live_text(self, job, text):
+        """Feed streamed text to a live job and start synthesis of every complete sentence."""
+        job.response['content'] += text
+        if job.cancelled:
+            return
+        for chunk in job.assembler.feed(text):
+            self._add_live_chunk(job, chunk)
+
+    def finish_live_reply(self, job, chat_id, error=None):
+        """Synthesize the rest of a live job once its stream has ended."""
+        if chat_id is not None:
+            job.response['chat_id'] = chat_id
+        if error:
+            print(f"Streamed reply ended with an error: {error}")
+            job.cancel()
+        elif not job.cancelled:
+            for chunk in job.assembler.flush():
+                self._add_live_chunk(job, chunk)
+        with self._streamed_lock:
+            key = chat_id if chat_id is not None else self._content_key(job.response['content'])
+            self._streamed_replies[key] = True
+            self._streamed_replies[self._content_key(job.response['content'])] = True
+            while len(self._streamed_replies) > 200:
+                self._streamed_replies.popitem(last=False)
+            self._live_jobs.discard(job)
+        job.finish()
+        if self.show_checking:
+            print(f"Streamed reply finished after {len(job.chunks)} chunks.")
+
+    def _add_live_chunk(self, job, chunk):
+        """Look a chunk of a live job up in the cache or queue it on the backend pool."""
+        cache_key = self._cache_key(chunk, job)
+        cached_audio_path = self.audio_cache.get(cache_key) if cache_key else None
+        if cached_audio_path:
+            future = _completed_future((cached_audio_path,))
+        else:
+            future = self._submit_synthesis(chunk, cache_key, job)
+        job.add_chunk(chunk, future)
+        if len(job.futures) == 1:
+            self._loop.call_soon_threadsafe(self._enqueue_live_job, job)
+
+    def _enqueue_live_job(self, job):
+        """Hand a live job to the playback stage of its workspace lane once its first chunk is queued."""
+        lane = self._lane(job.workspace)
+        if self.preempt_stale_jobs:
+            self._preempt_jobs(lane)
+        self._job_sequence += 1
+        job.sequence = self._job_sequence
+        lane['rendering'] += 1
+        self._rendering_jobs.add(job)
+        lane['playback_queue'].put_nowait(job)
+        self._spawn(self._release_when_rendered(job, lane, holds_slot=False))
+
+    @staticmethod
+    def _content_key(content):
+        return hashlib.sha256(" ".join(content.split()).encode('utf-8')).hexdigest()
+
+    def _was_streamed(self, response):
+        """Check if a polled response was already read out through the stream proxy."""
+        with self._streamed_lock:
+            if response['chat_id'] in self._streamed_replies:
+                return True
+            if self._content_key(response['content']) in self._streamed_replies:
+                return True
+            # Stored by AnythingLLM before the proxy saw the end of the stream
+            return any(job.response['workspace'] == response['workspace']
+                       and job.response['prompt'] == response['prompt']
+                       for job in self._live_jobs)
 
-                    # Create a "saved" subdirectory
-                    saved_dir = os.path.join(app_dir, "saved")
+    def _record_tts_timing(self, job, elapsed_time):
+        """Print how long synthesis of a job took. The latency model learns from every request in the pool."""
+        global tts_processed_count
 
-                    # Ensure directory exists
-                    os.makedirs(saved_dir, exist_ok=True)
+        tts_processed_count += 1
 
-                    # Create save filename
-                    save_filename = os.path.join(
-                        saved_dir, f"{content_prefix}_{timestamp}.wav")
+        print(
+            f"{job.number_of_words} words ({job.char_count} characters) took {elapsed_time:.1f} seconds.")
 
-                    # Import shutil for file operations
-                    import shutil
+        if job.estimated_time is not None:
+            error_percentage = abs(
+                job.estimated_time - elapsed_time) / elapsed_time * 100
+            print(f"Estimation accuracy: {100 - error_percentage:.1f}%")
 
-                    # Always use copy2 instead of move/replace for cross-drive compatibility
-                    try:
-                        shutil.copy2(source_audio_path, save_filename)
+        if self.show_checking:
+            cache_stats = self.audio_cache.stats()
+            print(
+                f"Audio cache: {cache_stats['hits']} hits, {cache_stats['misses']} misses, "
+                f"{cache_stats['bytes'] / 1024 / 1024:.1f} of {cache_stats['max_bytes'] / 1024 / 1024:.0f} MB used")
+            for stats in self.f5tts_pool.stats():
+                print(
+                    f"F5-TTS {stats['url']}: {stats['completed']} done, {stats['connect_count']} connects "
+                    f"(avg {stats['avg_connect_time']:.2f}s), {stats['reuse_count']} reuses, "
+                    f"~{stats['saved_time']:.1f}s handshake time saved")
 
-                        if os.path.exists(save_filename):
-                            playback_file = save_filename  # Use saved file for playback
-                            print(f"Saved audio file to: {save_filename}")
-                        else:
-                            print(
-                                f"Warning: Saved file {save_filename} was not created successfully")
-                            # Fall back to original file if save failed
-                            playback_file = source_audio_path
-
-                    except PermissionError:
-                        # Use alternative filename with _02 suffix
-                        alt_save_filename = os.path.join(
-                            saved_dir, f"{content_prefix}_{timestamp}_02.wav")
-                        print(
-                            f"Permission denied for original save file. Using alternative file name: {alt_save_filename}")
+    def _stop_current_sound(self):
+        """Stop the currently playing sound, if any, before a new one starts."""
+        global FIRSTIME
+        global sound
 
+        if FIRSTIME is False:
+            if sound is not None and hasattr(sound, 'is_alive') and sound.is_alive():
+                print(
+                    "Sound is still playing! Stopping it before playing new sound.")
+                metrics.inc('f5tts_playback_stops_total')
+                try:
+                    # Force stop the sound
+                    if hasattr(sound, 'stop'):
+                        sound.stop()
+
+                    # If we're using playsound on Windows, we may need a different approach
+                    if os.name == 'nt' and self.settings.audio_player == "playsound":
+                        import ctypes
+                        # Try to use winmm to stop all sounds
                         try:
-                            shutil.copy2(source_audio_path, alt_save_filename)
-                            if os.path.exists(alt_save_filename):
-                                playback_file = alt_save_filename  # Use alternative saved file for playback
-                                print(
-                                    f"Saved audio file to: {alt_save_filename}")
-                            else:
-                                print(
-                                    f"Warning: Alternative saved file {alt_save_filename} was not created successfully")
-                                # Fall back to original file if save failed
-                                playback_file = source_audio_path
-                        except Exception as inner_e:
-                            print(
-                                f"Error saving to alternative file: {inner_e}")
-                            playback_file = source_audio_path
+                            winmm = ctypes.WinDLL('winmm')
+                            winmm.PlaySoundW(None, 0, 0)
+                        except:
+                            pass
+
+                    # Make sure to wait for the sound to actually stop,
+                    # the PCM sink stops within a few milliseconds
+                    if get_pcm_sink() is None:
+                        time.sleep(0.5)
+
+                    # Set sound to None to avoid referencing stopped thread
+                    sound = None
 
                 except Exception as e:
-                    print(f"Error saving audio file: {e}")
-                    # Fall back to original file if save failed
-                    playback_file = source_audio_path
+                    print(f"Error stopping sound: {e}")
+
+    def _play_audio_file(self, playback_file, settings=None):
+        """Play a finished audio file with the player of a settings snapshot, the current one if None."""
+        global FIRSTIME
+        global sound
+
+        if settings is None:
+            settings = self.settings
+        if playback_file:
+            metrics.inc('f5tts_playback_starts_total')
+            if settings.audio_player == "playsound":
+                sound = play_audio_cross_platform(
+                    playback_file, block=False)
+            else:  # default_media_player
+                # Use the system's default media player
+                open_file_with_default_app(playback_file)
+                print("Playing audio with system default media player")
+        else:
+            print("No valid playback file was created - cannot play audio")
 
-            # CASE 2: Save mode is disabled - use anything_tts.wav or anything_tts02.wav
-            else:
-                try:
-                    # Get the app directory
-                    app_dir = get_app_directory("anythingllm")
-
-                    destination_filename = os.path.join(
-                        app_dir, "anything_tts.wav")
-                    os.makedirs(os.path.dirname(
-                        destination_filename), exist_ok=True)
-
-                    # Use shutil.copy2 instead of os.replace for cross-drive compatibility
-                    import shutil
-                    shutil.copy2(source_audio_path, destination_filename)
-                    playback_file = destination_filename
-                except PermissionError:
-                    # If we get permission error
-                    alt_destination_filename = os.path.join(
-                        app_dir, "anything_tts02.wav")
-                    print(
-                        f"Permission denied for playback file. Using alternative file name: {alt_destination_filename}")
+        FIRSTIME = False
 
-                    os.makedirs(os.path.dirname(
-                        alt_destination_filename), exist_ok=True)
+    def _store_audio_file(self, source_audio_path, response_content=None, settings=None):
+        """
+        Copy generated audio to its playback/save location.
 
-                    # Use shutil.copy2 instead of os.replace
-                    import shutil
-                    shutil.copy2(source_audio_path, alt_destination_filename)
-                    playback_file = alt_destination_filename
-                except Exception as e:
-                    print(f"Error copying audio file: {e}")
-                    # If all else fails, use the original file
-                    playback_file = source_audio_path
-
-            # Now play the determined file
-            if playback_file:
-                if audio_player == "playsound":
-                    sound = play_audio_cross_platform(
-                        playback_file, block=False)
-                else:  # default_media_player
-                    # Use the system's default media player
-                    open_file_with_default_app(playback_file)
-                    print("Playing audio with system default media player")
-            else:
-                print("No valid playback file was created - cannot play audio")
+        Args:
+            source_audio_path (str): Path of the audio returned by F5-TTS
+            response_content (dict): The response the audio belongs to
+            settings (TTSSettings): Snapshot with the player and save mode, the current one if None
 
-            FIRSTIME = False
-        except Exception as e:
-            end_time = time.time()
-            elapsed_time = end_time - start_time
-            print(
-                f"Tried with error, lost {elapsed_time:.1f} seconds.")
-            print(
-                f"Error in TTS processing: {e}. You have to have F5-tts installed and running in the background. Skipping TTS.")
+        Returns:
+            str: Path of the file to use for playback
+        """
+        if settings is None:
+            settings = self.settings
+        copy_start = time.time()
+        try:
+            return self._copy_audio_file(source_audio_path, response_content, settings)
+        finally:
+            metrics.observe('f5tts_audio_io_duration_seconds',
+                            time.time() - copy_start, operation="copy")
+
+    def _copy_audio_file(self, source_audio_path, response_content, settings):
+        """Hand audio to the archive and copy it to the playback file. See _store_audio_file."""
+        # Save mode: the archive stores a compact copy in the background
+        if settings.f5tts_save_audio == "save" and response_content:
+            try:
+                self.audio_archive.add(source_audio_path, response_content)
+            except Exception as e:
+                print(f"Error saving audio file: {e}")
+
+        # Determine which file to use for playback
+        playback_file = None
+
+        # CASE 1: The PCM sink reads the file once, no copy is needed
+        if settings.audio_player == "playsound" and get_pcm_sink() is not None:
+            playback_file = source_audio_path
+
+        # CASE 2: Use anything_tts.wav or anything_tts02.wav
+        else:
+            try:
+                # Get the app directory
+                app_dir = get_app_directory("anythingllm")
+
+                destination_filename = os.path.join(
+                    app_dir, "anything_tts.wav")
+                os.makedirs(os.path.dirname(
+                    destination_filename), exist_ok=True)
+
+                # Use shutil.copy2 instead of os.replace for cross-drive compatibility
+                shutil.copy2(source_audio_path, destination_filename)
+                playback_file = destination_filename
+            except PermissionError:
+                # If we get permission error
+                alt_destination_filename = os.path.join(
+                    app_dir, "anything_tts02.wav")
+                print(
+                    f"Permission denied for playback file. Using alternative file name: {alt_destination_filename}")
+
+                os.makedirs(os.path.dirname(
+                    alt_destination_filename), exist_ok=True)
+
+                # Use shutil.copy2 instead of os.replace
+                shutil.copy2(source_audio_path, alt_destination_filename)
+                playback_file = alt_destination_filename
+            except Exception as e:
+                print(f"Error copying audio file: {e}")
+                # If all else fails, use the original file
+                playback_file = source_audio_path
+
+        return playback_file
 
     def show_menu(self):
         """Display the settings menu and handle user input."""
         self.menu_active = True
 
-        # Save the original console state
-        original_console = self.console
-        # Temporarily disable the non-blocking console while in menu
-        self.console = None
-
-        # Declare all globals at the beginning of the method
-        global f5tts_client, f5tts_remove_silence, f5tts_cross_fade, f5tts_nfe, f5tts_speed, audio_player, f5tts_save_audio
-
         try:
             while self.menu_active and self.running:
+                settings = self.settings
                 os.system('cls' if os.name == 'nt' else 'clear')
                 print("\n=== AnythingLLM Monitor Settings ===")
                 print(f"1. Check Interval: {self.check_interval} seconds")
@@ -824,16 +4488,27 @@ class AnythingLLMMonitor:
                 print(f"3. F5-TTS reference audio: {self.f5tts_selected_ref}")
                 print(f"4. F5-TTS settings:")
                 print(
-                    f"   - Server URL: {f5tts_client} (default: http://127.0.0.1:7860/)")
+                    f"   - Server URL: {settings.f5tts_client} (default: http://127.0.0.1:7860/)")
+                for connection_stats in self.f5tts_pool.stats():
+                    print(
+                        f"     {connection_stats['url']}: {connection_stats['connect_count']} connects, "
+                        f"{connection_stats['reuse_count']} reuses, last handshake "
+                        f"{connection_stats['last_connect_time'] or 0:.2f}s")
+                print(
+                    f"   - Remove silence: {settings.f5tts_remove_silence} (default: False)")
+                print(f"   - Cross-fade: {settings.f5tts_cross_fade} (default: 0.15)")
+                print(f"   - NFE value: {settings.f5tts_nfe} (default: 16)")
+                print(f"   - Speed: {settings.f5tts_speed} (default: 1.0)")
+                print(
+                    f"   - Streaming mode: {settings.f5tts_stream_mode} (default: stream)")
+                cache_stats = self.audio_cache.stats()
                 print(
-                    f"   - Remove silence: {f5tts_remove_silence} (default: False)")
-                print(f"   - Cross-fade: {f5tts_cross_fade} (default: 0.15)")
-                print(f"   - NFE value: {f5tts_nfe} (default: 16)")
-                print(f"   - Speed: {f5tts_speed} (default: 1.0)")
-                print(f"5. Audio player: {audio_player}")
+                    f"   - Audio cache: {cache_stats['hits']} hits, {cache_stats['misses']} misses, "
+                    f"{cache_stats['bytes'] / 1024 / 1024:.1f} of {f5tts_cache_mb} MB used")
+                print(f"5. Audio player: {settings.audio_player}")
                 print(
                     f"6. Show checking: {'On' if self.show_checking else 'Off'}")
-                print(f"7. Save the F5-TTS audio: {f5tts_save_audio}")
+                print(f"7. Save the F5-TTS audio: {settings.f5tts_save_audio}")
                 print(f"8. Reset tracking (highest ID and latest timestamp)")
                 print(f"9. Save and exit menu")
                 print(f"10. Exit program")
@@ -917,17 +4592,16 @@ class AnythingLLMMonitor:
                             ref_choice = int(
                                 input(f"\nSelect reference audio (0-{len(ref_files)}): "))
                             if ref_choice == 0:
-                                self.f5tts_selected_ref = "not chosen"
-                                global f5tts_ref_audio, f5tts_ref_text
-                                f5tts_ref_audio = "not chosen"
-                                f5tts_ref_text = ""
+                                self.apply_settings({'f5tts_selected_ref': "not chosen"})
                                 print(
                                     "F5-TTS disabled - no reference audio selected")
                             elif 1 <= ref_choice <= len(ref_files):
                                 selected = ref_files[ref_choice-1]
-                                self.f5tts_selected_ref = selected['name']
-                                f5tts_ref_audio = selected['audio_path']
-                                f5tts_ref_text = selected['text_content']
+                                self.apply_settings({
+                                    'f5tts_selected_ref': selected['name'],
+                                    'f5tts_ref_audio': selected['audio_path'],
+                                    'f5tts_ref_text': selected['text_content'],
+                                })
                                 print(
                                     f"Selected reference audio: {selected['name']}")
                             else:
@@ -944,64 +4618,52 @@ class AnythingLLMMonitor:
                         print("3. Cross-fade duration")
                         print("4. NFE value")
                         print("5. Speed")
-                        print("6. Back to main menu")
+                        print("6. Streaming mode")
+                        print("7. Back to main menu")
 
                         setting_choice = input(
-                            "\nSelect setting to change (1-6): ")
+                            "\nSelect setting to change (1-7): ")
 
                         if setting_choice == '1':
                             new_url = input(
-                                f"Enter new F5-TTS server URL (current: {f5tts_client}): ")
+                                f"Enter new F5-TTS server URL, separate several servers with commas (current: {settings.f5tts_client}): ")
                             if new_url:
-                                f5tts_client = new_url
-                                print(f"Server URL updated to: {f5tts_client}")
+                                self.apply_settings({'f5tts_client': new_url})
 
                         elif setting_choice == '2':
                             print(
-                                f"Remove silence is currently: {f5tts_remove_silence}")
+                                f"Remove silence is currently: {settings.f5tts_remove_silence}")
                             toggle = input("Toggle (y/n)? ").lower()
                             if toggle == 'y':
-                                f5tts_remove_silence = not f5tts_remove_silence
-                                print(
-                                    f"Remove silence set to: {f5tts_remove_silence}")
+                                self.apply_settings(
+                                    {'f5tts_remove_silence': not settings.f5tts_remove_silence})
 
                         elif setting_choice == '3':
-                            try:
-                                new_fade = float(
-                                    input(f"Enter new cross-fade duration (0.0-1.0, current: {f5tts_cross_fade}): "))
-                                if 0.0 <= new_fade <= 1.0:
-                                    f5tts_cross_fade = new_fade
-                                    print(
-                                        f"Cross-fade duration set to: {f5tts_cross_fade}")
-                                else:
-                                    print("Value must be between 0.0 and 1.0")
-                            except ValueError:
-                                print("Please enter a valid number")
+                            self.apply_settings({'f5tts_cross_fade': input(
+                                f"Enter new cross-fade duration (0.0-1.0, current: {settings.f5tts_cross_fade}): ")})
 
                         elif setting_choice == '4':
-                            try:
-                                new_nfe = int(
-                                    input(f"Enter new NFE value (4-64, current: {f5tts_nfe}): "))
-                                if 4 <= new_nfe <= 64 and new_nfe % 2 == 0:
-                                    f5tts_nfe = new_nfe
-                                    print(f"NFE value set to: {f5tts_nfe}")
-                                else:
-                                    print(
-                                        "Value must be between 4 and 64 and be an even number")
-                            except ValueError:
-                                print("Please enter a valid number")
+                            self.apply_settings({'f5tts_nfe': input(
+                                f"Enter new NFE value (4-64, current: {settings.f5tts_nfe}): ")})
 
                         elif setting_choice == '5':
-                            try:
-                                new_speed = float(
-                                    input(f"Enter new speed (0.5-2.0, current: {f5tts_speed}): "))
-                                if 0.5 <= new_speed <= 2.0:
-                                    f5tts_speed = new_speed
-                                    print(f"Speed set to: {f5tts_speed}")
-                                else:
-                                    print("Value must be between 0.5 and 2.0")
-                            except ValueError:
-                                print("Please enter a valid number")
+                            self.apply_settings({'f5tts_speed': input(
+                                f"Enter new speed (0.5-2.0, current: {settings.f5tts_speed}): ")})
+
+                        elif setting_choice == '6':
+                            print("\nStreaming mode:")
+                            print(
+                                "1. Stream (start playing after the first sentence)")
+                            print("2. Full (wait for the whole reply)")
+                            stream_choice = input("Enter choice (1-2): ")
+                            if stream_choice == '1':
+                                self.apply_settings({'f5tts_stream_mode': "stream"})
+                                print("Replies will be streamed sentence by sentence")
+                            elif stream_choice == '2':
+                                self.apply_settings({'f5tts_stream_mode': "full"})
+                                print("Replies will be synthesized in one piece")
+                            else:
+                                print("Invalid choice, keeping current setting")
 
                         input("Press Enter to continue...")
 
@@ -1013,10 +4675,10 @@ class AnythingLLMMonitor:
 
                         player_choice = input("Enter choice (1-2): ")
                         if player_choice == '1':
-                            audio_player = "playsound"
+                            self.apply_settings({'audio_player': "playsound"})
                             print("Selected player: Playsound (in-app)")
                         elif player_choice == '2':
-                            audio_player = "default_media_player"
+                            self.apply_settings({'audio_player': "default_media_player"})
                             print("Selected player: System default media player")
                         else:
                             print("Invalid choice, keeping current setting")
@@ -1040,10 +4702,10 @@ class AnythingLLMMonitor:
 
                         save_choice = input("Enter choice (1-2): ")
                         if save_choice == '1':
-                            f5tts_save_audio = "nosave"
+                            self.apply_settings({'f5tts_save_audio': "nosave"})
                             print("F5-TTS audio will not be saved permanently")
                         elif save_choice == '2':
-                            f5tts_save_audio = "save"
+                            self.apply_settings({'f5tts_save_audio': "save"})
                             print("F5-TTS audio will be saved as permanent files")
                         else:
                             print("Invalid choice, keeping current setting")
@@ -1058,9 +4720,11 @@ class AnythingLLMMonitor:
                         confirm = input(
                             "Are you sure you want to reset tracking? (y/n): ").lower()
                         if confirm == 'y':
-                            self.highest_chat_id = 0
-                            self.latest_timestamp = ""
-                            self.seen_responses = set()
+                            with self._tracking_lock:
+                                self.highest_chat_id = 0
+                                self.latest_timestamp = ""
+                                self.seen_responses.clear()
+                            self._forget_newest_page()
                             print(
                                 "Tracking has been reset. Next check will establish new baselines.")
                         else:
@@ -1095,8 +4759,7 @@ class AnythingLLMMonitor:
                     traceback.print_exc()
                     input("Press Enter to continue...")
         finally:
-            # Restore the original console setup
-            self.console = original_console
+            self.menu_active = False
 
         # Clear the screen before returning to monitoring
         os.system('cls' if os.name == 'nt' else 'clear')
@@ -1113,24 +4776,368 @@ class AnythingLLMMonitor:
                 f"Showing responses with either chat ID > {self.highest_chat_id} OR created after: {self.latest_timestamp}")
         print(f"Press 's' at any time to access settings menu")
 
-    def key_listener(self):
-        """Listen for keyboard input to access the settings menu."""
+    def _connect_f5tts(self):
+        """Open the shared F5-TTS connections, reporting but not failing if a server is down."""
+        self.f5tts_pool.connect_all()
+
+    async def _key_stage(self):
+        """Wait for key presses in the event loop and open the settings menu on 's'."""
+        while self.running:
+            key = await self.console.next_key()
+            if key is None:
+                # No keyboard, or stdin was closed
+                return
+            if key.lower() == 's':
+                print("\nOpening settings menu...")
+                # The menu blocks in input(), it runs in its own thread while the pipeline goes on
+                await _run_in_thread(self.show_menu)
+                # Check right away with the new settings
+                self._forget_newest_page()
+                self.poll_scheduler.base_interval = self.check_interval
+                self.poll_scheduler.wake()
+            # Could add more key commands here
+
+    async def _run_pipeline(self, keyboard=False):
+        """
+        Run polling, parsing, synthesis and playback as separate asyncio stages.
+
+        The stages are connected by queues, so polling keeps its pace no matter
+        how long synthesis takes:
+        fetch -> poll queue -> parse/filter -> workspace lanes
+
+        Every workspace gets its own lane with a synthesis queue, synthesis
+        slots and a playback queue, so a busy workspace cannot hold up the
+        replies of another one:
+        synthesis queue -> synthesis -> playback queue -> playback
+
+        Args:
+            keyboard (bool): Also wait for key presses that open the settings menu
+        """
+        self._poll_queue = asyncio.Queue(maxsize=1)
+        self._lanes = {}  # workspace slug -> lane, created when a workspace gets its first reply
+        self._rendering_jobs = set()
+        self._job_sequence = 0
+        self._background_tasks = set()
+        self.speaker = PlaybackArbiter()  # Shared by the playback stages of all lanes
+        metrics.gauge('anythingllm_pipeline_queue_depth', 'Items waiting in each pipeline stage',
+                      callback=lambda: {(('stage', stage),): depth for stage, depth in self.queue_depths().items()})
+        metrics.gauge('anythingllm_lane_queue_depth', 'Items waiting in each workspace lane',
+                      callback=lambda: {(('stage', stage), ('workspace', workspace)): depth
+                                        for workspace, depths in self.lane_depths().items()
+                                        for stage, depth in depths.items()})
+
+        self._loop = asyncio.get_running_loop()
+        if self.config.get('stream_proxy_port'):
+            self.stream_proxy = StreamChatProxy(
+                self.base_url, self, self.config['stream_proxy_host'], self.config['stream_proxy_port'],
+                timeout=(self.api_timeout[0], 300))
+            if not self.stream_proxy.start():
+                self.stream_proxy = None
+
+        parse_stage = asyncio.create_task(self._parse_stage())
+        config_watch_stage = asyncio.create_task(self._config_watch_stage())
+        key_stage = asyncio.create_task(self._key_stage()) if keyboard else None
+        try:
+            await self._fetch_stage()
+        finally:
+            if self.stream_proxy is not None:
+                self.stream_proxy.stop()
+                self.stream_proxy = None
+            stages = [parse_stage, config_watch_stage] + ([key_stage] if key_stage else []) + [task for lane in self._lanes.values() for task in lane['tasks']]
+            for stage in stages:
+                stage.cancel()
+            await asyncio.gather(*stages, return_exceptions=True)
+
+    async def _config_watch_stage(self):
+        """Apply TTS settings edited in config_f5tts_any.txt while the monitor runs."""
+        interval = self.config.get('config_watch_interval', 0)
+        if not interval:
+            return
+        loop = asyncio.get_running_loop()
+        config_file = "config_f5tts_any.txt"
+        last_mtime = os.path.getmtime(config_file) if os.path.exists(config_file) else None
+        while True:
+            await asyncio.sleep(interval)
+            mtime = os.path.getmtime(config_file) if os.path.exists(config_file) else None
+            if mtime == last_mtime:
+                continue
+            last_mtime = mtime
+            try:
+                await loop.run_in_executor(None, self.reload_config_file)
+            except Exception as e:
+                print(f"Error reloading {config_file}: {e}")
+
+    def _lane(self, workspace):
+        """Return the lane of a workspace, starting its synthesis and playback stages the first time."""
+        lane = self._lanes.get(workspace)
+        if lane is None:
+            lane = {
+                'workspace': workspace,
+                'synthesis_queue': asyncio.Queue(),
+                'playback_queue': asyncio.Queue(),
+                'synthesis_slots': asyncio.Semaphore(self.synthesis_concurrency),
+                'rendering': 0,
+                'preempted_below': 0,  # Jobs with a lower sequence number are not played
+            }
+            lane['tasks'] = [asyncio.create_task(self._synthesis_stage(lane)),
+                             asyncio.create_task(self._playback_stage(lane))]
+            self._lanes[workspace] = lane
+            if self.show_checking:
+                print(f"Started synthesis lane for workspace {workspace} "
+                      f"(priority {self.workspace_rules.priority(workspace)})")
+        return lane
+
+    async def _fetch_stage(self):
+        """Poll AnythingLLM on the adaptive schedule and hand the results to the parse stage."""
+        loop = asyncio.get_running_loop()
         while self.running:
-            if self.menu_active:
-                # Skip checking for input if menu is already active
-                time.sleep(0.1)
+            # Polling goes on while the settings menu is open, changes apply to the next job
+            poll_start = time.time()
+            responses_data = await loop.run_in_executor(None, self.fetch_responses)
+            metrics.observe('anythingllm_poll_duration_seconds',
+                            time.time() - poll_start)
+            if responses_data is None:
+                metrics.inc('anythingllm_polls_total', result="error")
+                self.poll_scheduler.record_failure()
+            else:
+                metrics.inc('anythingllm_polls_total',
+                            result="fetched" if responses_data['chats'] else "unchanged")
+                await self._poll_queue.put(responses_data)
+                # Let the parse stage report activity before the next delay is chosen
+                await self._poll_queue.join()
+
+            if self.show_checking:
+                print(f"Queue depth: {self.queue_depths()}")
+
+            # Wait for next check, faster after activity and slower when idle
+            delay = await self.poll_scheduler.wait()
+            if self.show_checking:
+                print(f"Waited {delay:.1f} seconds before next check")
+
+    async def _parse_stage(self):
+        """Find new responses in poll results and queue them for synthesis."""
+        while True:
+            responses_data = await self._poll_queue.get()
+            try:
+                with self._tracking_lock:
+                    new_responses = self.process_new_responses(responses_data)
+                self.poll_scheduler.record_success(bool(new_responses))
+
+                # Notify if new responses found
+                if new_responses:
+                    for response in new_responses:
+                        metrics.inc('anythingllm_chats_processed_total',
+                                    workspace=response['workspace'])
+                    self.notify_new_responses(new_responses)
+                    self._record_seen(new_responses)
+                    for response in new_responses:
+                        response['found_time'] = time.time()
+                        if self._was_streamed(response):
+                            metrics.inc('anythingllm_responses_dropped_total', reason="streamed")
+                            continue
+                        if not self.workspace_rules.is_allowed(response['workspace']):
+                            print(f"Not reading reply {response['chat_id']}, workspace "
+                                  f"{response['workspace']} is filtered out.")
+                            metrics.inc('anythingllm_responses_dropped_total', reason="filtered")
+                            continue
+                        self._lane(response['workspace'])['synthesis_queue'].put_nowait(response)
+            except Exception as e:
+                print(f"Error processing responses: {e}")
+            finally:
+                self._poll_queue.task_done()
+
+    async def _synthesis_stage(self, lane):
+        """
+        Start synthesis for the new responses of one lane, with a bounded number of jobs rendering at once.
+
+        Short replies waiting together in the lane are rendered with one
+        F5-TTS request (process_tts_batch) and still played one by one. With
+        preempt_stale_jobs the batch is formed first, so it only preempts
+        the older jobs as a whole.
+        """
+        loop = asyncio.get_running_loop()
+        pending = None  # A reply taken from the queue while coalescing that did not fit the batch
+        while True:
+            if pending is not None:
+                response, pending = pending, None
+            else:
+                response = await lane['synthesis_queue'].get()
+            if self._skip_stale(response):
+                continue
+
+            # One snapshot for the whole job, a settings change applies from the next reply on
+            settings = self.settings
+            text = self.prepare_speech_text(response['content'], settings)
+            if not text:
+                print("Nothing left to speak after text cleanup. Skipping TTS.")
+                continue
+
+            batch = [(text, response)]
+            if self._can_coalesce(text):
+                pending = self._take_coalesced(lane, batch, settings)
+
+            if self.preempt_stale_jobs:
+                # A newer reply is already waiting, this batch would only be cut off
+                if pending is not None or not lane['synthesis_queue'].empty():
+                    for _, skipped in batch:
+                        print(
+                            f"Skipping reply {skipped['chat_id']}, a newer reply is waiting.")
+                        metrics.inc('anythingllm_responses_dropped_total', reason="superseded")
+                    continue
+                self._preempt_jobs(lane)
+
+            await lane['synthesis_slots'].acquire()
+            try:
+                if len(batch) > 1:
+                    jobs = await loop.run_in_executor(None, self.process_tts_batch, batch, settings)
+                else:
+                    job = await loop.run_in_executor(None, self.process_tts, text, response, settings)
+                    jobs = [job] if job is not None else []
+            except Exception as e:
+                print(f"Error starting TTS: {e}")
+                jobs = []
+            if not jobs:
+                lane['synthesis_slots'].release()
+                continue
+
+            for job in jobs:
+                self._job_sequence += 1
+                job.sequence = self._job_sequence
+                lane['rendering'] += 1
+                self._rendering_jobs.add(job)
+                lane['playback_queue'].put_nowait(job)
+                self._spawn(self._release_when_rendered(job, lane, holds_slot=len(jobs) == 1))
+            if len(jobs) > 1:
+                # The jobs of a batch share the slot, it is free once all of them are rendered
+                self._spawn(self._release_batch_slot(jobs, lane))
+
+    def _take_coalesced(self, lane, batch, settings):
+        """
+        Move short replies waiting in a lane's synthesis queue into a batch.
+
+        The batch grows until it would get longer than f5tts_chunk_chars.
+
+        Returns:
+            dict: A response taken that did not fit, or None
+        """
+        size = len(batch[0][0])
+        while not lane['synthesis_queue'].empty():
+            response = lane['synthesis_queue'].get_nowait()
+            if self._skip_stale(response):
+                continue
+            text = self.prepare_speech_text(response['content'], settings)
+            if not text:
+                print("Nothing left to speak after text cleanup. Skipping TTS.")
                 continue
+            if not self._can_coalesce(text) or size + len(text) > settings.f5tts_chunk_chars:
+                return response
+            batch.append((text, response))
+            size += len(text)
+        return None
+
+    def _skip_stale(self, response):
+        """Report and count a response that is too old to read. Returns True if it is."""
+        if not self._is_stale(response):
+            return False
+        print(
+            f"Skipping reply {response['chat_id']}, it is older than {self.stale_response_seconds} seconds.")
+        metrics.inc('anythingllm_responses_dropped_total', reason="stale")
+        return True
+
+    @staticmethod
+    async def _wait_rendered(job):
+        """Wait until all chunks of a job are done, whether they succeeded or not."""
+        await job.wait_complete()
+        await asyncio.gather(*(asyncio.wrap_future(future) for future in job.futures),
+                             return_exceptions=True)
+
+    async def _release_when_rendered(self, job, lane, holds_slot=True):
+        """Free the synthesis slot of a job once all of its chunks are done."""
+        try:
+            await self._wait_rendered(job)
+        finally:
+            self._rendering_jobs.discard(job)
+            lane['rendering'] -= 1
+            if holds_slot:
+                lane['synthesis_slots'].release()
+
+    async def _release_batch_slot(self, jobs, lane):
+        """Free the synthesis slot of a batch once every job in it is rendered."""
+        try:
+            await asyncio.gather(*(self._wait_rendered(job) for job in jobs))
+        finally:
+            lane['synthesis_slots'].release()
+
+    def _preempt_jobs(self, lane):
+        """Cancel the older jobs of a lane before a newer reply starts, so F5-TTS only renders audio that will be heard."""
+        lane['preempted_below'] = self._job_sequence + 1
+        for job in list(self._rendering_jobs):
+            if job.workspace == lane['workspace'] and not job.cancelled:
+                print("Cancelling synthesis of an older reply, a newer one arrived.")
+                job.cancel()
+
+    def _is_stale(self, response):
+        """Check if a response is older than stale_response_seconds."""
+        if not self.stale_response_seconds:
+            return False
+        return self._response_age(response) > self.stale_response_seconds
 
-            # Check for key presses using our non-blocking console
-            key = self.console.check_input()
-            if key:
-                if key.lower() == 's':
-                    print("\nOpening settings menu...")
-                    self.show_menu()
-                # Could add more key commands here
+    @staticmethod
+    def _response_age(response):
+        """
+        Seconds since AnythingLLM stored a response.
 
-            # Small sleep to prevent high CPU usage
-            time.sleep(0.1)
+        Uses createdAt when it carries a timezone, otherwise the time the
+        monitor found the response, so a server in another timezone cannot
+        make every reply look stale.
+        """
+        try:
+            created = datetime.fromisoformat(
+                str(response.get('timestamp', '')).replace('Z', '+00:00'))
+            if created.tzinfo is not None:
+                return max(0.0, (datetime.now(timezone.utc) - created).total_seconds())
+        except ValueError:
+            pass
+        return time.time() - response.get('found_time', time.time())
+
+    async def _playback_stage(self, lane):
+        """Play the jobs of one lane in the order their responses arrived."""
+        while True:
+            job = await lane['playback_queue'].get()
+            if job.sequence < lane['preempted_below']:
+                # Replaced by a newer reply before it could play
+                job.cancel()
+                continue
+            try:
+                await self.play_speech_job(job)
+            except Exception as e:
+                print(f"Error playing TTS audio: {e}")
+
+    def _spawn(self, coro):
+        """Start a background task and keep a reference so it is not garbage collected."""
+        task = asyncio.get_running_loop().create_task(coro)
+        self._background_tasks.add(task)
+        task.add_done_callback(self._background_tasks.discard)
+        return task
+
+    def queue_depths(self):
+        """Return the number of items waiting in each pipeline stage, summed over the lanes."""
+        depths = {'poll': self._poll_queue.qsize(), 'synthesis': 0, 'rendering': 0, 'playback': 0}
+        for lane_depths in self.lane_depths().values():
+            for stage, depth in lane_depths.items():
+                depths[stage] += depth
+        return depths
+
+    def lane_depths(self):
+        """Return the number of items waiting in each stage of every workspace lane."""
+        return {
+            workspace: {
+                'synthesis': lane['synthesis_queue'].qsize(),
+                'rendering': lane['rendering'],
+                'playback': lane['playback_queue'].qsize(),
+            }
+            for workspace, lane in list(self._lanes.items())
+        }
 
     def run(self):
         """Main method to start monitoring."""
@@ -1138,33 +5145,36 @@ class AnythingLLMMonitor:
             f"Starting AnythingLLM Monitor with check interval: {self.check_interval} seconds")
         print(f"Checking for new messages by: {self.monitor_by.upper()}")
         print(f"F5-TTS reference audio: {self.f5tts_selected_ref}")
+        rules = self.workspace_rules
+        if rules.allow or rules.deny or rules.voices or rules.priorities:
+            print(f"Workspace rules: allow {sorted(rules.allow) or 'all'}, deny {sorted(rules.deny) or 'none'}, "
+                  f"voices {rules.voices or 'default'}, priorities {rules.priorities or 'equal'}")
         print(f"Press 's' at any time to access settings menu")
 
-        # Start keyboard listener in a separate thread
-        listener_thread = threading.Thread(
-            target=self.key_listener, daemon=True)
-        listener_thread.start()
+        # Local Prometheus endpoint, off unless metrics_port is set
+        if self.config.get('metrics_port'):
+            self.metrics_server = MetricsServer(
+                metrics, self.config['metrics_host'], self.config['metrics_port'])
+            self.metrics_server.start()
 
-        try:
-            while self.running:
-                # Skip API calls if menu is active
-                if not self.menu_active:
-                    # Fetch and process responses
-                    responses_data = self.fetch_responses()
-                    new_responses = self.process_new_responses(responses_data)
+        # Local settings endpoint, off unless control_port is set
+        if self.config.get('control_port'):
+            self.control_server = ControlServer(
+                self, self.config['control_host'], self.config['control_port'])
+            self.control_server.start()
 
-                    # Notify if new responses found
-                    if new_responses:
-                        self.notify_new_responses(new_responses)
-                        self._save_seen_responses()
+        # Connect to F5-TTS once at startup, in the background so monitoring starts right away
+        threading.Thread(target=self._connect_f5tts, daemon=True).start()
 
-                # Wait for next check
-                time.sleep(self.check_interval)
+        try:
+            asyncio.run(self._run_pipeline(keyboard=True))
+            self._close_audio_archive()
 
         except KeyboardInterrupt:
             print("\nMonitor stopped by user.")
             self.running = False
             self._save_seen_responses()
+            self._close_audio_archive()
         except Exception as e:
             print(f"Error in monitor: {e}")
             import traceback
@@ -1187,7 +5197,43 @@ def load_config():
         'audio_player': "playsound",
         'show_checking': False,
         'monitor_by': "timestamp",
-        'f5tts_save_audio': "nosave"  # Add default value
+        'max_fetch_pages': 10,
+        'api_connect_timeout': 3,  # Seconds to wait for a connection to AnythingLLM
+        'api_read_timeout': 15,  # Seconds to wait for AnythingLLM to answer
+        'poll_fast_interval': 0.5,  # Seconds between checks right after a new response
+        'poll_fast_period': 30,  # How long to keep checking fast after a new response
+        'poll_idle_interval': 60,  # Longest time between checks when nothing happens
+        'poll_error_max_backoff': 300,  # Longest wait after repeated connection errors
+        'synthesis_concurrency': 2,  # Responses rendering at the same time
+        'preempt_stale_jobs': True,  # A new reply cancels synthesis of older ones
+        'coalesce_max_chars': 100,  # Waiting replies up to this length share one F5-TTS request, 0 turns it off
+        'stale_response_seconds': 300,  # Replies older than this are skipped, 0 reads everything
+        'workspace_allow': "",  # Comma separated workspace slugs to read, empty reads all
+        'workspace_deny': "",  # Comma separated workspace slugs never read
+        'workspace_voices': "",  # Voice per workspace, e.g. "coding:calm.wav, chat:alice.mp3"
+        'workspace_priority': "",  # Rendering priority per workspace, e.g. "chat:10, research:-1"
+        'seen_window_size': 1000,  # Recent response IDs remembered exactly
+        'metrics_host': "127.0.0.1",
+        'metrics_port': 0,  # Port for the Prometheus /metrics endpoint, 0 turns it off
+        'stream_proxy_host': "127.0.0.1",
+        'stream_proxy_port': 0,  # Port of the streaming chat proxy, 0 turns it off
+        'control_host': "127.0.0.1",
+        'control_port': 0,  # Port of the /settings endpoint for changing settings while running, 0 turns it off
+        'config_watch_interval': 0,  # Seconds between checks for edits of this file, 0 turns it off
+        'journal_compact_every': 200,  # Tracking journal lines before a new snapshot is written
+        'f5tts_save_audio': "nosave",  # Add default value
+        'f5tts_stream_mode': "stream",  # "stream" starts playback after the first sentence
+        'f5tts_first_chunk_chars': 120,
+        'f5tts_chunk_chars': 300,
+        'f5tts_cache_mb': 500,  # Audio cache size budget, 0 disables the cache
+        'speech_cleanup': True,  # Remove markdown, code, URLs and citations before synthesis
+        'speech_code_blocks': "summarize",  # "summarize" mentions code blocks and tables, "remove" drops them
+        'reference_optimize': True,  # Send F5-TTS a trimmed mono 24 kHz copy of the reference clip
+        'reference_max_seconds': 12,  # Longest reference clip, F5-TTS works best with 10-12 seconds
+        'pcm_playback': True,  # Keep one audio player running and stream audio into it (Linux/macOS)
+        'archive_format': "flac",  # Saved replies: "flac", "opus" (smallest) or "wav", needs ffmpeg
+        'archive_max_days': 0,  # Delete saved replies older than this, 0 keeps them forever
+        'archive_max_mb': 0  # Delete the oldest saved replies above this size, 0 means no limit
     }
 
     config_file = "config_f5tts_any.txt"
@@ -1236,17 +5282,179 @@ def load_config():
 
 
 def save_config(config):
-    """Save configuration to config file."""
+    """Save configuration to config file. The file is only rewritten if a setting changed."""
     config_file = "config_f5tts_any.txt"
     try:
-        with open(config_file, 'w') as f:
-            for key, value in config.items():
-                f.write(f"{key}={value}\n")
+        text = "".join(f"{key}={value}\n" for key, value in config.items())
+        if os.path.exists(config_file):
+            with open(config_file, 'r') as f:
+                if f.read() == text:
+                    return
+        atomic_write_text(config_file, text)
         print(f"Configuration saved to {config_file}")
     except Exception as e:
         print(f"Error saving configuration: {e}")
 
 
+class PCMClip:
+    """A WAV file queued on the PCMAudioSink. Has the same stop()/is_alive() interface as the other players."""
+
+    def __init__(self, file_path):
+        self.file_path = file_path
+        self.stopped = False
+        self.written = threading.Event()  # Set once all frames are in the sink or the clip was dropped
+        self.end_time = None  # When the last written frame will have been heard
+
+    def stop(self):
+        """Stop writing the clip. Audio already in the sink plays out within PCMAudioSink.LEAD_SECONDS."""
+        self.stopped = True
+
+    def is_alive(self):
+        if self.stopped:
+            return False
+        if not self.written.is_set():
+            return True
+        return self.end_time is not None and time.time() < self.end_time
+
+    def join(self, timeout=None):
+        """Wait until the clip has been written to the sink."""
+        self.written.wait(timeout)
+
+
+class PCMAudioSink:
+    """
+    One long-lived audio player process that WAV frames are written into.
+
+    The player (aplay, paplay or sox play) reads raw PCM from stdin, so a clip
+    starts without spawning a process and clips queued back to back play
+    without a gap. Frames are written in small blocks and kept at most
+    LEAD_SECONDS ahead of what is being heard, so stopping a clip takes
+    effect right away. The player is restarted when the audio format changes.
+    """
+
+    LEAD_SECONDS = 0.15
+    BLOCK_SECONDS = 0.02
+
+    def __init__(self, command_factory):
+        """
+        Args:
+            command_factory: Function (channels, sample_width, sample_rate) -> player command
+        """
+        self.command_factory = command_factory
+        self.failed = False
+        self._clips = queue.Queue()
+        self._process = None
+        self._params = None
+        self._play_clock = 0.0  # When everything written so far will have been heard
+        self._writer = threading.Thread(target=self._write_clips, daemon=True)
+        self._writer.start()
+
+    @staticmethod
+    def find_player():
+        """Return a command factory for the first raw PCM player found, or None."""
+        formats = {1: ('U8', 'u8', 'unsigned-integer'), 2: ('S16_LE', 's16le', 'signed-integer'),
+                   3: ('S24_3LE', 's24le', 'signed-integer'), 4: ('S32_LE', 's32le', 'signed-integer')}
+        if os.name == 'nt':
+            return None
+        if sys.platform != 'darwin' and shutil.which('aplay'):
+            return lambda channels, width, rate: [
+                'aplay', '-q', '-t', 'raw', '-f', formats[width][0], '-c', str(channels),
+                '-r', str(rate), '--buffer-time=100000', '-']
+        if sys.platform != 'darwin' and shutil.which('paplay'):
+            return lambda channels, width, rate: [
+                'paplay', '--raw', f'--format={formats[width][1]}', f'--channels={channels}',
+                f'--rate={rate}', '--latency-msec=100']
+        if shutil.which('play'):
+            return lambda channels, width, rate: [
+                'play', '-q', '-t', 'raw', '-e', formats[width][2], '-b', str(width * 8),
+                '-c', str(channels), '-r', str(rate), '-']
+        return None
+
+    def play(self, file_path):
+        """Queue a WAV file after the clips already queued and return its PCMClip."""
+        clip = PCMClip(file_path)
+        self._clips.put(clip)
+        return clip
+
+    def _start_process(self, params):
+        """Start the player for a format, letting the previous one play out first."""
+        self._close_process()
+        self._process = subprocess.Popen(
+            self.command_factory(*params), stdin=subprocess.PIPE,
+            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, bufsize=0)
+        self._params = params
+
+    def _close_process(self):
+        if self._process is None:
+            return
+        try:
+            self._process.stdin.close()
+            self._process.wait(timeout=max(1.0, self._play_clock - time.time() + 1.0))
+        except Exception:
+            self._process.kill()
+        self._process = None
+        self._params = None
+
+    def _write_clips(self):
+        while True:
+            clip = self._clips.get()
+            try:
+                if not clip.stopped:
+                    self._write_clip(clip)
+            except (BrokenPipeError, OSError, wave.Error, EOFError) as e:
+                if isinstance(e, OSError) and (self._process is None or self._process.poll() is not None):
+                    # The player died, possibly at start up: use one player per clip from now on
+                    print(f"Audio player stopped ({e}), falling back to one player per clip.")
+                    self.failed = True
+                    self._process = None
+                else:
+                    print(f"Error playing audio: {e}")
+            finally:
+                clip.end_time = max(self._play_clock, time.time())
+                clip.written.set()
+
+    def _write_clip(self, clip):
+        with wave.open(clip.file_path, 'rb') as wav_file:
+            params = (wav_file.getnchannels(), wav_file.getsampwidth(), wav_file.getframerate())
+            if self._process is None or self._process.poll() is not None or params != self._params:
+                self._start_process(params)
+            bytes_per_second = float(params[0] * params[1] * params[2])
+            frames_per_block = max(1, int(params[2] * self.BLOCK_SECONDS))
+            while not clip.stopped:
+                data = wav_file.readframes(frames_per_block)
+                if not data:
+                    break
+                # Stay just ahead of the speaker so stop() is heard immediately
+                ahead = self._play_clock - time.time()
+                if ahead > self.LEAD_SECONDS:
+                    time.sleep(ahead - self.LEAD_SECONDS)
+                self._process.stdin.write(data)
+                self._play_clock = max(self._play_clock, time.time()) + len(data) / bytes_per_second
+
+    def close(self):
+        """Stop the player process."""
+        if self._process is not None:
+            self._process.kill()
+            self._process = None
+
+
+_pcm_sink = None
+
+
+def get_pcm_sink():
+    """Return the shared PCMAudioSink, or None when raw PCM playback is off or not available."""
+    global _pcm_sink
+    if not pcm_playback:
+        return None
+    if _pcm_sink is None:
+        command_factory = PCMAudioSink.find_player()
+        if command_factory is None:
+            return None
+        _pcm_sink = PCMAudioSink(command_factory)
+        atexit.register(_pcm_sink.close)
+    return None if _pcm_sink.failed else _pcm_sink
+
+
 def play_audio_cross_platform(file_path, block=False):
     """Cross-platform audio playback function that doesn't rely on PyWin32"""
     import subprocess
@@ -1260,6 +5468,25 @@ def play_audio_cross_platform(file_path, block=False):
     if not '_audio_players' in globals() or _audio_players is None:
         _audio_players = []
 
+    # Write WAV files into the long-lived player when there is one
+    sink = get_pcm_sink() if file_path.lower().endswith('.wav') else None
+    if sink is not None:
+        for player in list(_audio_players):
+            try:
+                player.stop()
+            except Exception:
+                pass
+        clip = sink.play(file_path)
+        _audio_players[:] = [clip]
+        if not block:
+            return clip
+        # Returns once the clip is in the sink, so the next clip follows without a gap
+        clip.join()
+        if not sink.failed:
+            return clip
+        # The player broke on this clip, play it the old way below
+        _audio_players.clear()
+
     class AudioPlayer(threading.Thread):
         def __init__(self, file_path):
             super().__init__(daemon=True)
@@ -1308,22 +5535,30 @@ def play_audio_cross_platform(file_path, block=False):
                 if hasattr(signal, 'SIGTERM'):
                     try:
                         self.process.send_signal(signal.SIGTERM)
-                        # Give it a moment to terminate
-                        time.sleep(0.1)
                     except:
                         pass
+                    # Give it a moment to terminate, returns as soon as it has
+                    if self._wait_process(0.1):
+                        return
 
                 # If it's still running, terminate it
-                if self.process.poll() is None:
-                    self.process.terminate()
-                    time.sleep(0.1)
+                self.process.terminate()
+                if self._wait_process(0.1):
+                    return
 
                 # If still running, force kill
-                if self.process.poll() is None:
-                    self._force_kill_process()
+                self._force_kill_process()
             except Exception as e:
                 print(f"Error terminating audio process: {e}")
 
+        def _wait_process(self, timeout):
+            """Wait at most timeout seconds for the process to exit. Returns True if it has."""
+            try:
+                self.process.wait(timeout=timeout)
+                return True
+            except subprocess.TimeoutExpired:
+                return False
+
         def _force_kill_process(self):
             """Helper method to forcibly kill the process"""
             if os.name == 'nt':
@@ -1370,8 +5605,11 @@ def play_audio_cross_platform(file_path, block=False):
                 # First try with winsound if available
                 try:
                     import winsound
-                    winsound.PlaySound(
-                        self.file_path, winsound.SND_FILENAME | winsound.SND_ASYNC)
+                    # Only play asynchronously when the caller doesn't wait for the end
+                    flags = winsound.SND_FILENAME
+                    if not block:
+                        flags |= winsound.SND_ASYNC
+                    winsound.PlaySound(self.file_path, flags)
                 except ImportError:
                     # If winsound is not available, use playsound
                     try:
@@ -1419,6 +5657,72 @@ def play_audio_cross_platform(file_path, block=False):
     return player
 
 
+def wait_for_playback(player):
+    """Block until a player returned by play_audio_cross_platform, or a StreamingPlayback, has finished."""
+    if isinstance(player, PCMClip):
+        player.written.wait()
+        if not player.stopped and player.end_time is not None:
+            time.sleep(max(0.0, player.end_time - time.time()))
+        return
+    if isinstance(player, threading.Thread):
+        player.join()
+    process = getattr(player, 'process', None)
+    if process is not None:
+        process.wait()
+    elif not isinstance(player, threading.Thread) and hasattr(player, 'wait'):
+        player.wait()  # playsound3
+
+
+class StreamingPlayback(threading.Thread):
+    """
+    Plays streamed audio chunks back to back while later chunks are still rendering.
+
+    Chunks are queued with add_chunk() and played in order. finish() marks the
+    end of the stream; stop() cancels playback and tells the renderer to stop.
+    """
+
+    def __init__(self):
+        super().__init__(daemon=True)
+        self._chunks = queue.Queue()
+        self.stopped = False
+
+    def add_chunk(self, audio_path):
+        """Queue an audio file for playback."""
+        self._chunks.put(audio_path)
+
+    def finish(self):
+        """Mark that no more chunks will be added."""
+        self._chunks.put(None)
+
+    def stop(self):
+        """Stop playback and discard queued chunks."""
+        self.stopped = True
+        self._chunks.put(None)
+        # The chunk being played is the registered audio player
+        for player in list(globals().get('_audio_players') or []):
+            try:
+                player.stop()
+            except Exception as e:
+                print(f"Error stopping audio chunk: {e}")
+
+    def is_alive(self):
+        # Playing, or still waiting for chunks that are being rendered
+        if self.stopped:
+            return False
+        return super().is_alive()
+
+    def run(self):
+        """Play queued chunks until the stream is finished or stopped."""
+        while not self.stopped:
+            audio_path = self._chunks.get()
+            if audio_path is None or self.stopped:
+                break
+            try:
+                play_audio_cross_platform(audio_path, block=True)
+            except Exception as e:
+                print(f"Error playing audio chunk: {e}")
+
+
 def create_sample_reference_files():
     """Create a sample reference audio/text pair if none exist."""
     ref_dir = get_reference_audio_path()
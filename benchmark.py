@@ -0,0 +1,724 @@
+"""
+Benchmark for anythingllm_messages.py that needs no GPU and no AnythingLLM install.
+
+It starts a stand-in AnythingLLM API that writes new chats at a steady rate
+and one or more stand-in F5-TTS Gradio apps whose /basic_tts returns silent
+WAV files after a configurable delay. AnythingLLMMonitor then runs against
+them exactly as it would against the real servers, and the benchmark reports
+throughput, time to first audio, poll overhead and missed messages.
+
+With --stream-chat the prompts are sent through the monitor's stream proxy
+to the stand-in stream-chat endpoint, which writes the reply token by token.
+Time to first audio then counts from the moment the prompt was sent, so it
+includes the time the stand-in LLM spends writing.
+
+Usage:
+    python benchmark.py
+    python benchmark.py --chats 40 --rate 1 --tts-servers 2
+    python benchmark.py --save-baseline baseline.json
+    python benchmark.py --baseline baseline.json --set f5tts_stream_mode=full
+    python benchmark.py --stream-chat --token-delay 0.05
+
+The stand-in F5-TTS app needs gradio (pip install gradio). Everything the
+monitor writes (tracking, cache, latency model, audio) goes to a temporary
+directory, so the real settings and state are never touched.
+"""
+
+import argparse
+import json
+import os
+import random
+import shutil
+import sys
+import tempfile
+import threading
+import time
+import wave
+import asyncio
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import requests
+
+import anythingllm_messages
+
+# Polled copies of replies already read out through the stream proxy are dropped too, they are not lost
+STREAMED = (('reason', 'streamed'),)
+
+REPLY_WORDS = ("the quick brown fox jumps over a lazy dog while seven wizards "
+               "quietly box and judge every vexing jigsaw puzzle by the river").split()
+
+
+def write_silent_wav(path, seconds, sample_rate=24000):
+    """Write a mono 16-bit WAV file of silence."""
+    with wave.open(path, 'wb') as wav_file:
+        wav_file.setnchannels(1)
+        wav_file.setsampwidth(2)
+        wav_file.setframerate(sample_rate)
+        wav_file.writeframes(b'\x00\x00' * int(seconds * sample_rate))
+    return path
+
+
+def wav_duration(path):
+    """Return the length of a WAV file in seconds, 0 if it cannot be read."""
+    try:
+        with wave.open(path, 'rb') as wav_file:
+            return wav_file.getnframes() / float(wav_file.getframerate())
+    except (wave.Error, OSError, EOFError):
+        return 0.0
+
+
+def make_reply(rng, mean_words):
+    """Build a reply of a few sentences with roughly mean_words words."""
+    word_count = max(3, int(rng.expovariate(1.0 / mean_words)))
+    words = [rng.choice(REPLY_WORDS) for _ in range(word_count)]
+    sentences = []
+    while words:
+        length = rng.randint(6, 16)
+        sentences.append(" ".join(words[:length]).capitalize() + ".")
+        words = words[length:]
+    return " ".join(sentences)
+
+
+class FakeAnythingLLM:
+    """
+    Stand-in for the AnythingLLM workspace-chats API.
+
+    Serves POST /v1/admin/workspace-chats with 20 chats per page, newest first,
+    and adds new chats from a background thread at the configured rate.
+    POST /v1/workspace/<slug>/stream-chat answers with a reply streamed as
+    server-sent events, one word every token_delay seconds, and stores the
+    chat when the stream ends, like AnythingLLM does.
+    """
+
+    PAGE_SIZE = 20
+
+    def __init__(self, host="127.0.0.1", port=0, workspaces=2, seed=0, token_delay=0.05):
+        self.host = host
+        self.port = port
+        self.workspaces = [f"bench-{i + 1}" for i in range(workspaces)]
+        self.rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self._chats = []  # Newest last
+        self.created_times = {}  # chat id -> time.time() when it was written, or its prompt sent
+        self.prompt_ids = {}  # prompt -> chat id
+        self.token_delay = token_delay
+        self.mean_words = 40
+        self.requests = 0
+        self.bytes_sent = 0
+        self._server = None
+        self._traffic_thread = None
+        self._stop = threading.Event()
+
+    @property
+    def base_url(self):
+        return f"http://{self.host}:{self._server.server_address[1]}/api"
+
+    def add_chat(self, text, workspace=None, prompt=None, created=None):
+        """Write a new chat and return its ID."""
+        with self._lock:
+            chat_id = len(self._chats) + 1
+            now = time.time()
+            workspace = workspace or self.workspaces[chat_id % len(self.workspaces)]
+            prompt = prompt or f"Benchmark prompt {chat_id}"
+            self._chats.append({
+                'id': chat_id,
+                'createdAt': time.strftime('%Y-%m-%dT%H:%M:%S', time.gmtime(now))
+                + f".{int(now * 1000) % 1000:03d}Z",
+                'prompt': prompt,
+                'workspace': {'slug': workspace, 'name': workspace.title()},
+                'response': json.dumps({'text': text}),
+            })
+            self.created_times[chat_id] = created or now
+            self.prompt_ids[prompt] = chat_id
+        return chat_id
+
+    def _stream_chat(self, handler, workspace, prompt):
+        """Answer a stream-chat request token by token, then store the chat."""
+        started = time.time()
+        with self._lock:
+            text = make_reply(self.rng, self.mean_words)
+        handler.send_response(200)
+        handler.send_header('Content-Type', 'text/event-stream')
+        handler.send_header('Transfer-Encoding', 'chunked')
+        handler.end_headers()
+
+        def send(event):
+            data = f"data: {json.dumps(event)}\n\n".encode('utf-8')
+            handler.wfile.write(f"{len(data):x}\r\n".encode('ascii') + data + b"\r\n")
+            handler.wfile.flush()
+
+        words = text.split(" ")
+        for i, word in enumerate(words):
+            time.sleep(self.token_delay)
+            send({'uuid': str(started), 'type': 'textResponseChunk', 'sources': [],
+                  'textResponse': word if i == len(words) - 1 else word + " ",
+                  'close': False, 'error': False})
+        chat_id = self.add_chat(text, workspace, prompt, created=started)
+        send({'uuid': str(started), 'type': 'finalizeResponseStream', 'close': True,
+              'error': False, 'chatId': chat_id})
+        handler.wfile.write(b"0\r\n\r\n")
+
+    def _page(self, offset):
+        with self._lock:
+            newest_first = self._chats[::-1]
+        start = offset * self.PAGE_SIZE
+        return {
+            'chats': newest_first[start:start + self.PAGE_SIZE],
+            'hasPages': start + self.PAGE_SIZE < len(newest_first),
+        }
+
+    def start(self):
+        """Start serving the API from a background thread."""
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_POST(self):
+                length = int(self.headers.get('Content-Length') or 0)
+                try:
+                    request = json.loads(self.rfile.read(length) or b'{}')
+                    offset = int(request.get('offset', 0))
+                except (ValueError, AttributeError):
+                    request, offset = {}, 0
+                path = self.path.split('?')[0].rstrip('/')
+                if path.startswith('/api/v1/workspace/') and path.endswith('/stream-chat'):
+                    fake._stream_chat(self, path.split('/')[4], request.get('message', ''))
+                    return
+                if path != '/api/v1/admin/workspace-chats':
+                    self.send_error(404)
+                    return
+                body = json.dumps(fake._page(offset)).encode('utf-8')
+                with fake._lock:
+                    fake.requests += 1
+                    fake.bytes_sent += len(body)
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self._server = ThreadingHTTPServer((self.host, self.port), Handler)
+        self._server.daemon_threads = True
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+
+    def start_traffic(self, chats, rate, mean_words, stream_url=None):
+        """
+        Write chats new chats at rate chats per second (Poisson arrivals).
+
+        With stream_url the chats are asked for on that stream-chat proxy
+        instead, each one answered while the next one can already start.
+        """
+        self.mean_words = mean_words
+
+        def ask(number):
+            workspace = self.workspaces[number % len(self.workspaces)]
+            try:
+                with requests.post(f"{stream_url}/v1/workspace/{workspace}/stream-chat",
+                                   json={'message': f"Streamed prompt {number}"},
+                                   headers={'Authorization': "Bearer benchmark"},
+                                   stream=True, timeout=60) as response:
+                    for _ in response.iter_content(chunk_size=None):
+                        pass
+            except requests.exceptions.RequestException as e:
+                print(f"Stream chat {number} failed: {e}")
+
+        def generate():
+            askers = []
+            for number in range(chats):
+                if self._stop.wait(self.rng.expovariate(rate)):
+                    return
+                if stream_url:
+                    asker = threading.Thread(target=ask, args=(number + 1,), daemon=True)
+                    asker.start()
+                    askers.append(asker)
+                else:
+                    self.add_chat(make_reply(self.rng, mean_words))
+            for asker in askers:
+                asker.join()
+
+        self._traffic_thread = threading.Thread(target=generate, daemon=True)
+        self._traffic_thread.start()
+
+    def traffic_done(self):
+        return self._traffic_thread is not None and not self._traffic_thread.is_alive()
+
+    def stop(self):
+        self._stop.set()
+        if self._server:
+            self._server.shutdown()
+            self._server.server_close()
+
+
+def start_fake_f5tts(port, base_latency, seconds_per_char, audio_seconds_per_char,
+                     concurrency, out_dir, host="127.0.0.1"):
+    """
+    Start a stand-in F5-TTS Gradio app with a /basic_tts endpoint.
+
+    The endpoint takes the same arguments as the real F5-TTS app, waits
+    base_latency plus seconds_per_char for each character (scaled with the
+    NFE steps, 32 being the reference) and returns a silent WAV file.
+
+    Returns:
+        The launched gradio Blocks app
+    """
+    try:
+        import gradio as gr
+    except ImportError:
+        sys.exit("The stand-in F5-TTS server needs gradio: pip install gradio")
+
+    counter = [0]
+    counter_lock = threading.Lock()
+
+    def basic_tts(ref_audio_input, ref_text_input, gen_text_input, remove_silence,
+                  cross_fade_duration_slider, nfe_slider, speed_slider):
+        steps = float(nfe_slider or 32) / 32.0
+        time.sleep((base_latency + seconds_per_char * len(gen_text_input)) * steps)
+        with counter_lock:
+            counter[0] += 1
+            path = os.path.join(out_dir, f"fake_{port}_{counter[0]}.wav")
+        seconds = max(0.2, audio_seconds_per_char * len(gen_text_input) / float(speed_slider or 1.0))
+        write_silent_wav(path, seconds)
+        return path, ref_text_input
+
+    with gr.Blocks() as app:
+        ref_audio_input = gr.Audio(type="filepath")
+        ref_text_input = gr.Textbox()
+        gen_text_input = gr.Textbox()
+        remove_silence = gr.Checkbox()
+        cross_fade_duration_slider = gr.Slider(0, 1)
+        nfe_slider = gr.Slider(4, 64, step=2)
+        speed_slider = gr.Slider(0.3, 2.0)
+        audio_output = gr.Audio(type="filepath")
+        ref_text_output = gr.Textbox()
+        gr.Button().click(
+            basic_tts,
+            inputs=[ref_audio_input, ref_text_input, gen_text_input, remove_silence,
+                    cross_fade_duration_slider, nfe_slider, speed_slider],
+            outputs=[audio_output, ref_text_output],
+            api_name="basic_tts",
+            concurrency_limit=concurrency,
+        )
+    app.launch(server_name=host, server_port=port, prevent_thread_lock=True,
+               quiet=True, allowed_paths=[out_dir])
+    return app
+
+
+class SilentPlayback:
+    """
+    Replaces the sound output: "plays" a WAV by waiting for its length.
+
+    Records when each job's first audio starts so time to first audio can be
+    measured from the moment AnythingLLM stored the chat.
+    """
+
+    def __init__(self):
+        self.current_chat_id = None
+        self.first_audio = {}  # chat id -> time.time() of the first audio
+        self._lock = threading.Lock()
+
+    def play(self, file_path, block=False):
+        with self._lock:
+            if self.current_chat_id is not None and self.current_chat_id not in self.first_audio:
+                self.first_audio[self.current_chat_id] = time.time()
+        player = _SilentPlayer(wav_duration(file_path))
+        player.start()
+        if block:
+            player.join()
+        return player
+
+
+class _SilentPlayer(threading.Thread):
+    def __init__(self, seconds):
+        super().__init__(daemon=True)
+        self.seconds = seconds
+        self._stop_event = threading.Event()
+
+    def stop(self):
+        self._stop_event.set()
+
+    def run(self):
+        self._stop_event.wait(self.seconds)
+
+
+def percentile(values, fraction):
+    """Return the value at the given fraction (0-1) of the sorted values, None if empty."""
+    if not values:
+        return None
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, int(round(fraction * (len(ordered) - 1)))))
+    return ordered[index]
+
+
+def summarize(values):
+    """Return mean, p50, p95 and max of a list of seconds."""
+    if not values:
+        return {'count': 0, 'mean': None, 'p50': None, 'p95': None, 'max': None}
+    return {
+        'count': len(values),
+        'mean': sum(values) / len(values),
+        'p50': percentile(values, 0.5),
+        'p95': percentile(values, 0.95),
+        'max': max(values),
+    }
+
+
+def run_benchmark(args):
+    """
+    Run the monitor against the stand-in servers and collect the results.
+
+    Returns:
+        dict: Benchmark results
+    """
+    work_dir = tempfile.mkdtemp(prefix="anythingllm_bench_")
+    original_dir = os.getcwd()
+    os.chdir(work_dir)
+    # Keep the latency model, cache and saved audio of the benchmark away from the real ones
+    anythingllm_messages.get_app_directory = lambda app_name: os.makedirs(
+        os.path.join(work_dir, app_name), exist_ok=True) or os.path.join(work_dir, app_name)
+
+    fake_api = FakeAnythingLLM(workspaces=args.workspaces, seed=args.seed, token_delay=args.token_delay)
+    tts_apps = []
+    try:
+        fake_api.start()
+        # A few chats from before the monitor started, these must not be read out
+        for i in range(3):
+            fake_api.add_chat(f"Old reply number {i + 1}.")
+
+        audio_dir = os.path.join(work_dir, "fake_f5tts")
+        os.makedirs(audio_dir, exist_ok=True)
+        tts_urls = []
+        for i in range(args.tts_servers):
+            port = args.tts_port + i
+            tts_apps.append(start_fake_f5tts(
+                port, args.tts_latency, args.tts_seconds_per_char, args.audio_seconds_per_char,
+                args.tts_concurrency, audio_dir))
+            tts_urls.append(f"http://127.0.0.1:{port}/")
+
+        config = anythingllm_messages.load_config()
+        config.update({
+            'base_url': fake_api.base_url,
+            'api_key': "benchmark",
+            'f5tts_client': ",".join(tts_urls),
+            'audio_player': "playsound",
+            'f5tts_save_audio': "nosave",
+            'stream_proxy_port': args.proxy_port if args.stream_chat else 0,
+        })
+        for override in args.set:
+            key, _, value = override.partition('=')
+            config[key.strip()] = _parse_value(value.strip())
+
+        playback = SilentPlayback()
+        anythingllm_messages.play_audio_cross_platform = playback.play
+
+        monitor = anythingllm_messages.AnythingLLMMonitor(config)
+        ref_audio = write_silent_wav(os.path.join(work_dir, "reference.wav"), 3.0)
+        monitor.apply_settings({
+            'f5tts_selected_ref': "reference.wav",
+            'f5tts_ref_audio': ref_audio,
+            'f5tts_ref_text': "This is the reference voice.",
+        }, source="benchmark")
+
+        detected = {}  # chat id -> time.time() the monitor reported it
+        rendered = {}  # chat id -> time.time() all of its audio was synthesized
+
+        original_notify = monitor.notify_new_responses
+        original_process_tts = monitor.process_tts
+        original_process_tts_batch = monitor.process_tts_batch
+        original_play_speech_job = monitor.play_speech_job
+        original_start_live_reply = monitor.start_live_reply
+        original_finish_live_reply = monitor.finish_live_reply
+        live_started = {}  # prompt -> time.time() the proxy saw the stream start
+
+        def notify_new_responses(new_responses):
+            now = time.time()
+            for response in new_responses:
+                detected.setdefault(response['chat_id'], now)
+            if args.verbose:
+                original_notify(new_responses)
+
+        def track_rendered(chat_id, futures):
+            # Rendered once every chunk has finished, failed or been cancelled
+            if not futures:
+                rendered[chat_id] = time.time()
+                return
+            remaining = [len(futures)]
+            remaining_lock = threading.Lock()
+
+            def chunk_done(_future):
+                with remaining_lock:
+                    remaining[0] -= 1
+                    if remaining[0] == 0:
+                        rendered[chat_id] = time.time()
+            for future in futures:
+                future.add_done_callback(chunk_done)
+
+        def process_tts(text, response_content=None, settings=None):
+            job = original_process_tts(text, response_content, settings)
+            if job is not None and response_content is not None:
+                track_rendered(response_content['chat_id'], job.futures)
+            return job
+
+        def process_tts_batch(batch, settings=None):
+            jobs = original_process_tts_batch(batch, settings)
+            for job in jobs:
+                track_rendered(job.response['chat_id'], job.futures)
+            return jobs
+
+        def start_live_reply(workspace, prompt):
+            live_started[prompt] = time.time()
+            return original_start_live_reply(workspace, prompt)
+
+        def finish_live_reply(job, chat_id, error=None):
+            original_finish_live_reply(job, chat_id, error)
+            if chat_id is None:
+                return
+            detected[chat_id] = live_started.get(job.response['prompt'], time.time())
+            track_rendered(chat_id, job.futures)
+
+        async def play_speech_job(job):
+            # Streamed replies only get their chat id when the stream ends, until then the prompt stands in
+            playback.current_chat_id = None
+            if job.response:
+                playback.current_chat_id = job.response.get('chat_id') or job.response.get('prompt')
+            await original_play_speech_job(job)
+
+        monitor.notify_new_responses = notify_new_responses
+        monitor.process_tts = process_tts
+        monitor.process_tts_batch = process_tts_batch
+        monitor.play_speech_job = play_speech_job
+        monitor.start_live_reply = start_live_reply
+        monitor.finish_live_reply = finish_live_reply
+
+        connect_start = time.time()
+        monitor._connect_f5tts()
+        connect_time = time.time() - connect_start
+
+        def drive():
+            # Wait for the first poll, it only records where the history ends
+            deadline = time.time() + 30
+            while monitor.first_run and time.time() < deadline:
+                time.sleep(0.05)
+            run_start[0] = time.time()
+            fake_api.start_traffic(args.chats, args.rate, args.reply_words,
+                                   stream_url=f"http://127.0.0.1:{args.proxy_port}/api" if args.stream_chat else None)
+            deadline = run_start[0] + args.chats / args.rate * 3 + args.timeout
+            while time.time() < deadline:
+                expected = set(fake_api.created_times) - old_ids
+                # Replies a newer one superseded are dropped without rendering
+                settled = len(expected & set(rendered)) + _counter_total('anythingllm_responses_dropped_total', STREAMED)
+                if fake_api.traffic_done() and expected and settled >= len(expected):
+                    break
+                time.sleep(0.1)
+            # Let the last reply start playing
+            time.sleep(args.drain)
+            run_end[0] = time.time()
+            monitor.running = False
+            monitor.poll_scheduler.wake()
+
+        old_ids = set(fake_api.created_times)
+        run_start = [None]
+        run_end = [None]
+        threading.Thread(target=drive, daemon=True).start()
+        asyncio.run(monitor._run_pipeline())
+
+        for key in list(playback.first_audio):
+            if key in fake_api.prompt_ids:
+                playback.first_audio.setdefault(fake_api.prompt_ids[key], playback.first_audio.pop(key))
+        new_ids = sorted(set(fake_api.created_times) - old_ids)
+        duration = run_end[0] - run_start[0]
+        detection = [detected[i] - fake_api.created_times[i] for i in new_ids if i in detected]
+        first_audio = [playback.first_audio[i] - fake_api.created_times[i]
+                       for i in new_ids if i in playback.first_audio]
+        chars_rendered = sum(len(json.loads(chat['response'])['text'])
+                             for chat in fake_api._chats if chat['id'] in rendered)
+        poll_durations = _histogram_totals('anythingllm_poll_duration_seconds')
+
+        return {
+            'settings': {key: value for key, value in vars(args).items()
+                         if key not in ('baseline', 'save_baseline', 'json', 'verbose')},
+            'duration_seconds': duration,
+            'connect_seconds': connect_time,
+            'chats_written': len(new_ids),
+            'chats_detected': len([i for i in new_ids if i in detected]),
+            'chats_rendered': len([i for i in new_ids if i in rendered]),
+            'chats_played': len(first_audio),
+            'chats_dropped': _counter_total('anythingllm_responses_dropped_total', STREAMED),
+            'missed_messages': len([i for i in new_ids if i not in detected]),
+            'false_detections': len([i for i in detected if i in old_ids]),
+            'throughput_replies_per_minute': len([i for i in new_ids if i in rendered]) / duration * 60,
+            'throughput_chars_per_second': chars_rendered / duration,
+            'detection_latency': summarize(detection),
+            'time_to_first_audio': summarize(first_audio),
+            'polls': fake_api.requests,
+            'polls_per_minute': fake_api.requests / duration * 60,
+            'poll_bytes': fake_api.bytes_sent,
+            'poll_seconds_mean': (poll_durations['sum'] / poll_durations['count']
+                                  if poll_durations['count'] else None),
+            'unchanged_polls': monitor.unchanged_polls,
+            'cache': monitor.audio_cache.stats() if monitor.audio_cache else None,
+        }
+    finally:
+        fake_api.stop()
+        for app in tts_apps:
+            try:
+                app.close()
+            except Exception:
+                pass
+        os.chdir(original_dir)
+        if not args.keep:
+            shutil.rmtree(work_dir, ignore_errors=True)
+        else:
+            print(f"Benchmark files kept in {work_dir}")
+
+
+def _histogram_totals(name):
+    """Return the summed count and sum of all label sets of a histogram in the metrics registry."""
+    totals = {'count': 0, 'sum': 0.0}
+    with anythingllm_messages.metrics._lock:
+        for entry in anythingllm_messages.metrics._metrics[name]['values'].values():
+            totals['count'] += entry['count']
+            totals['sum'] += entry['sum']
+    return totals
+
+
+def _counter_total(name, skip_labels=()):
+    """Return the sum of the label sets of a counter in the metrics registry, leaving out skip_labels pairs."""
+    with anythingllm_messages.metrics._lock:
+        return sum(value for labels, value in anythingllm_messages.metrics._metrics[name]['values'].items()
+                   if not set(labels) & set(skip_labels))
+
+
+def _parse_value(value):
+    """Convert a --set value the same way load_config does."""
+    if value.lower() in ('true', 'false'):
+        return value.lower() == 'true'
+    try:
+        return int(value)
+    except ValueError:
+        pass
+    try:
+        return float(value)
+    except ValueError:
+        return value
+
+
+def _format_seconds(value):
+    return "-" if value is None else f"{value:.2f}s"
+
+
+def print_report(results, baseline=None):
+    """Print the results, with the change against a baseline when one is given."""
+    def compare(key, value, lower_is_better=True):
+        if baseline is None or value is None:
+            return ""
+        old = _lookup(baseline, key)
+        if old in (None, 0):
+            return ""
+        change = (value - old) / old * 100
+        if abs(change) < 0.5:
+            return "  (same as baseline)"
+        better = change < 0 if lower_is_better else change > 0
+        return f"  ({change:+.0f}% vs baseline, {'better' if better else 'worse'})"
+
+    print("\n" + "=" * 60)
+    print("Benchmark results")
+    print("=" * 60)
+    print(f"Run time:            {results['duration_seconds']:.1f}s "
+          f"(F5-TTS connect {results['connect_seconds']:.2f}s)")
+    print(f"Chats written:       {results['chats_written']}")
+    print(f"Detected / rendered / played: {results['chats_detected']} / "
+          f"{results['chats_rendered']} / {results['chats_played']}")
+    if results.get('chats_dropped'):
+        print(f"Dropped:             {results['chats_dropped']} (superseded by a newer reply or stale)")
+    print(f"Missed messages:     {results['missed_messages']}"
+          f"{compare('missed_messages', results['missed_messages'])}")
+    if results['false_detections']:
+        print(f"Old chats read out:  {results['false_detections']}")
+    print(f"Throughput:          {results['throughput_replies_per_minute']:.1f} replies/min, "
+          f"{results['throughput_chars_per_second']:.0f} chars/s"
+          f"{compare('throughput_chars_per_second', results['throughput_chars_per_second'], False)}")
+    for key, label in (('detection_latency', "Detection latency"),
+                       ('time_to_first_audio', "Time to first audio")):
+        stats = results[key]
+        print(f"{label + ':':<21}mean {_format_seconds(stats['mean'])}, p50 {_format_seconds(stats['p50'])}, "
+              f"p95 {_format_seconds(stats['p95'])}, max {_format_seconds(stats['max'])}"
+              f"{compare(key + '.p95', stats['p95'])}")
+    print(f"Poll overhead:       {results['polls']} requests ({results['polls_per_minute']:.0f}/min), "
+          f"{results['poll_bytes'] / 1024:.0f} KiB, mean {_format_seconds(results['poll_seconds_mean'])} per poll, "
+          f"{results['unchanged_polls']} unchanged"
+          f"{compare('polls_per_minute', results['polls_per_minute'])}")
+    if results['cache']:
+        print(f"Audio cache:         {results['cache']['hits']} hits, {results['cache']['misses']} misses")
+    print("=" * 60)
+
+
+def _lookup(results, dotted_key):
+    value = results
+    for part in dotted_key.split('.'):
+        if not isinstance(value, dict):
+            return None
+        value = value.get(part)
+    return value
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Benchmark AnythingLLM-F5tts against stand-in AnythingLLM and F5-TTS servers.")
+    parser.add_argument('--chats', type=int, default=20, help="New chats to write (default 20)")
+    parser.add_argument('--rate', type=float, default=0.5, help="New chats per second (default 0.5)")
+    parser.add_argument('--reply-words', type=int, default=40, help="Mean words per reply (default 40)")
+    parser.add_argument('--workspaces', type=int, default=2, help="Workspaces the chats are spread over")
+    parser.add_argument('--tts-servers', type=int, default=1, help="Stand-in F5-TTS servers to start")
+    parser.add_argument('--tts-port', type=int, default=7960, help="Port of the first F5-TTS server")
+    parser.add_argument('--tts-latency', type=float, default=0.3, help="Fixed seconds per /basic_tts call")
+    parser.add_argument('--tts-seconds-per-char', type=float, default=0.004,
+                        help="Extra synthesis seconds per character")
+    parser.add_argument('--audio-seconds-per-char', type=float, default=0.06,
+                        help="Length of the returned audio per character")
+    parser.add_argument('--tts-concurrency', type=int, default=1,
+                        help="Requests each F5-TTS server handles at once (1 is like a single GPU)")
+    parser.add_argument('--stream-chat', action='store_true',
+                        help="Ask for the replies through the stream proxy instead of writing finished chats")
+    parser.add_argument('--token-delay', type=float, default=0.05,
+                        help="Seconds between streamed words of the stand-in LLM (default 0.05)")
+    parser.add_argument('--proxy-port', type=int, default=3102, help="Port of the stream proxy with --stream-chat")
+    parser.add_argument('--timeout', type=float, default=60, help="Extra seconds to wait for the last replies")
+    parser.add_argument('--drain', type=float, default=1.0, help="Seconds to keep running after the last reply")
+    parser.add_argument('--seed', type=int, default=0, help="Random seed for the chat traffic")
+    parser.add_argument('--set', action='append', default=[], metavar="KEY=VALUE",
+                        help="Override a config_f5tts_any.txt setting, can be repeated")
+    parser.add_argument('--baseline', help="Compare against results saved with --save-baseline")
+    parser.add_argument('--save-baseline', help="Save the results as JSON to this file")
+    parser.add_argument('--json', action='store_true', help="Print the results as JSON")
+    parser.add_argument('--keep', action='store_true', help="Keep the temporary benchmark directory")
+    parser.add_argument('--verbose', action='store_true', help="Show the monitor's normal output for new replies")
+    args = parser.parse_args()
+
+    # Paths given on the command line are relative to where the benchmark was started
+    for attr in ('baseline', 'save_baseline'):
+        if getattr(args, attr):
+            setattr(args, attr, os.path.abspath(getattr(args, attr)))
+
+    baseline = None
+    if args.baseline:
+        with open(args.baseline, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)
+
+    results = run_benchmark(args)
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+    else:
+        print_report(results, baseline)
+
+    if args.save_baseline:
+        anythingllm_messages.atomic_write_text(args.save_baseline, json.dumps(results, indent=2))
+        print(f"Saved results to {args.save_baseline}")
+
+
+if __name__ == "__main__":
+    main()